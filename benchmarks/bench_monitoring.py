@@ -0,0 +1,90 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+# Monitoring: wait_for_tasks_to_complete for a whole job and wait_for_one_task_from_multi_pool for the
+# completion-order loop of fetch/fetchreduce. The overhead is the wall time after the last simulated task 
+# has completed, i.e. the time it takes to notice completions.
+
+import time
+from common import azureclusterlesshpc, create_tasks, setup_local_service, teardown_local_services, Timer
+
+
+def polling_policy(options):
+    return azureclusterlesshpc.PollingPolicy(min_interval=options.get("poll_min_interval", 1.0),
+        max_interval=options.get("poll_max_interval", 30.0))
+
+
+def last_completion(service, job_ids):
+    with service.lock:
+        return max(task["end_time"] for job_id in job_ids for task in service.jobs[job_id]["tasks"].values()
+            if task["end_time"] is not None)
+
+
+def run_wait_for_tasks(num_tasks, options, poll_options):
+
+    clients, service = setup_local_service(options)
+    try:
+        azureclusterlesshpc.submit_tasks(clients['batch_client'], 'BenchmarkJob', create_tasks(clients, num_tasks),
+            verbose=False)
+        service.reset_stats()
+
+        with Timer() as timer:
+            result = azureclusterlesshpc.wait_for_tasks_to_complete(clients['batch_client'], 'BenchmarkJob', 
+                verbose=False, polling_policy=polling_policy(poll_options))
+        overhead = time.time() - last_completion(service, ['BenchmarkJob'])
+        stats = service.stats()
+    finally:
+        teardown_local_services()
+
+    return {
+        "benchmark": "wait_for_tasks_to_complete",
+        "tasks": num_tasks,
+        "completed": result is True,
+        "wall_seconds": timer.seconds,
+        "overhead_seconds": overhead,
+        "api_calls": stats["calls"],
+        "total_api_calls": sum(stats["calls"].values())
+    }
+
+
+# Fetch loop as in fetch(batch_controller): wait for one task of the remaining tasks (on two pools/jobs), 
+# remove it and repeat. Stops after max_fetch completions.
+def run_wait_for_one_task(num_tasks, options, poll_options, max_fetch=2000):
+
+    job_ids = ['BenchmarkJob_1', 'BenchmarkJob_2']
+    clients, service = setup_local_service(options, job_ids=job_ids)
+    try:
+        remaining = []
+        for (pool, job_id) in enumerate(job_ids, start=1):
+            tasks = create_tasks(clients, num_tasks // len(job_ids), prefix='task_{}'.format(pool))
+            azureclusterlesshpc.submit_tasks(clients['batch_client'], job_id, tasks, verbose=False)
+            remaining += [{"taskname": task.id, "pool": pool} for task in tasks]
+        service.reset_stats()
+
+        num_fetch = min(max_fetch, len(remaining))
+        latencies = []
+        with Timer() as timer:
+            for _ in range(num_fetch):
+                tstart = time.perf_counter()
+                task_name, pool_no, success = azureclusterlesshpc.wait_for_one_task_from_multi_pool(
+                    [clients['batch_client']] * len(job_ids), job_ids, remaining, verbose=False,
+                    polling_policy=polling_policy(poll_options))
+                latencies.append(time.perf_counter() - tstart)
+                remaining = [task for task in remaining if task["taskname"] != task_name]
+        stats = service.stats()
+    finally:
+        teardown_local_services()
+
+    latencies.sort()
+    return {
+        "benchmark": "wait_for_one_task_from_multi_pool",
+        "tasks": num_tasks,
+        "fetched": num_fetch,
+        "wall_seconds": timer.seconds,
+        "median_call_seconds": latencies[len(latencies) // 2],
+        "max_call_seconds": latencies[-1],
+        "api_calls": stats["calls"],
+        "total_api_calls": sum(stats["calls"].values())
+    }
@@ -0,0 +1,37 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+# Task creation (create_batch_task) and submission (submit_tasks -> task.add_collection)
+
+from common import azureclusterlesshpc, create_tasks, rate, setup_local_service, teardown_local_services, Timer
+
+
+def run(num_tasks, options, max_workers=8):
+
+    clients, service = setup_local_service(options)
+    try:
+        with Timer() as create_timer:
+            tasks = create_tasks(clients, num_tasks)
+        service.reset_stats()
+
+        with Timer() as submit_timer:
+            report = azureclusterlesshpc.submit_tasks(clients['batch_client'], 'BenchmarkJob', tasks, 
+                max_workers=max_workers, verbose=False)
+        stats = service.stats()
+    finally:
+        teardown_local_services()
+
+    num_added = sum(1 for task_report in report.values() if task_report["status"] == "success")
+    return {
+        "benchmark": "submission",
+        "tasks": num_tasks,
+        "tasks_added": num_added,
+        "create_seconds": create_timer.seconds,
+        "create_tasks_per_second": rate(num_tasks, create_timer.seconds),
+        "submit_seconds": submit_timer.seconds,
+        "submit_tasks_per_second": rate(num_added, submit_timer.seconds),
+        "api_calls": stats["calls"],
+        "throttled": stats["throttled"]
+    }
@@ -0,0 +1,53 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+# Upload/download throughput of upload_files_to_blob, upload_bytes_to_container and download_blobs
+
+import os, shutil, tempfile
+from common import azureclusterlesshpc, rate, setup_local_service, teardown_local_services, Timer
+
+
+def run(num_files, file_size, options):
+
+    clients, service = setup_local_service(options)
+    blob_client = clients['blob_client']
+    tmpdir = tempfile.mkdtemp()
+    try:
+        file_paths = []
+        for i in range(num_files):
+            file_paths.append(os.path.join(tmpdir, 'file_{}.bin'.format(i)))
+            with open(file_paths[-1], 'wb') as fid:
+                fid.write(os.urandom(file_size))
+
+        with Timer() as upload_files_timer:
+            blob_names = azureclusterlesshpc.upload_files_to_blob(blob_client, 'benchmark', file_paths, verbose=False,
+                use_cache=False)
+
+        payload = bytearray(os.urandom(file_size))
+        with Timer() as upload_bytes_timer:
+            for i in range(num_files):
+                azureclusterlesshpc.upload_bytes_to_container(blob_client, 'benchmark', 'bytes_{}.bin'.format(i), 
+                    payload, verbose=False, use_cache=False)
+
+        with Timer() as download_timer:
+            azureclusterlesshpc.download_blobs(blob_client, 'benchmark', blob_names)
+        stats = service.stats()
+    finally:
+        shutil.rmtree(tmpdir)
+        teardown_local_services()
+
+    num_bytes = num_files * file_size
+    return {
+        "benchmark": "transfer",
+        "files": num_files,
+        "file_bytes": file_size,
+        "upload_files_seconds": upload_files_timer.seconds,
+        "upload_files_bytes_per_second": rate(num_bytes, upload_files_timer.seconds),
+        "upload_bytes_seconds": upload_bytes_timer.seconds,
+        "upload_bytes_bytes_per_second": rate(num_bytes, upload_bytes_timer.seconds),
+        "download_seconds": download_timer.seconds,
+        "download_bytes_per_second": rate(num_bytes, download_timer.seconds),
+        "api_calls": stats["calls"]
+    }
@@ -0,0 +1,71 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+# Shared setup of the benchmarks: every benchmark runs against its own local stand-in of the Batch and Blob 
+# services (see azureclusterlesshpc_local), so API call counts are not mixed between benchmarks.
+
+import os, sys, time, uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'pyinterface'))
+import azureclusterlesshpc
+import azureclusterlesshpc_local
+
+
+# Create clients, container, pool and job on a new local service. Returns the clients and the service. Throttling
+# is only enabled after the setup.
+def setup_local_service(options, container_name='benchmark', pool_id='BenchmarkPool', job_ids=('BenchmarkJob',)):
+
+    throttle_rate = options.get('throttle_rate', 0.0)
+    options = dict(options, name='benchmark-{}'.format(uuid.uuid4().hex[:8]), throttle_rate=0.0)
+    clients = azureclusterlesshpc.create_clients({'_LOCAL_SERVICE': options, '_STORAGE_ACCOUNT_NAME': 'benchmark'},
+        batch=True, blob=True)
+    service = azureclusterlesshpc_local.get_local_service(options)
+
+    azureclusterlesshpc.create_blob_containers(clients['blob_client'], [container_name])
+    azureclusterlesshpc.create_pool(clients['batch_client'], pool_id, 'Standard_E2s_v3', 1, 'canonical', 
+        'ubuntuserver', '18.04')
+    for job_id in job_ids:
+        azureclusterlesshpc.create_batch_job(clients['batch_client'], job_id, pool_id, verbose=False)
+    service.options['throttle_rate'] = throttle_rate
+    service.reset_stats()
+    return clients, service
+
+
+def teardown_local_services():
+    azureclusterlesshpc.clear_task_state_trackers()
+    azureclusterlesshpc_local.clear_local_services()
+
+
+# Tasks similar to the ones created by @batchexec (one resource file, one wildcard output file)
+def create_tasks(clients, num_tasks, container_name='benchmark', prefix='task'):
+
+    azureclusterlesshpc.upload_bytes_to_container(clients['blob_client'], container_name, 'batch_runtime.jl', 
+        b'# runtime', verbose=False, use_cache=False)
+    resource_file = azureclusterlesshpc.create_batch_resource_from_blob(clients['blob_client'], container_name,
+        'batch_runtime.jl')
+    builder = azureclusterlesshpc.create_output_file_builder(clients['blob_client'], 'benchmark', container_name)
+    tasks = []
+    for i in range(num_tasks):
+        taskname = '{}_{}'.format(prefix, i)
+        tasks.append(azureclusterlesshpc.create_batch_task(
+            resource_files=resource_file,
+            application_cmd='/bin/bash -c "julia application-cmd"',
+            output_files=builder.output_file_pattern('{}_'.format(taskname)),
+            taskname=taskname))
+    return tasks
+
+
+class Timer(object):
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.seconds = time.perf_counter() - self.start
+
+
+def rate(count, seconds):
+    return count / seconds if seconds > 0 else None
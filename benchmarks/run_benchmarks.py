@@ -0,0 +1,73 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+# Run all benchmarks against the local stand-in of the Batch and Blob services and write the results to JSON.
+#
+# Example:
+#   python benchmarks/run_benchmarks.py --sizes 1000 10000 100000 --output results.json
+
+import argparse, datetime, json, platform, sys
+
+import bench_monitoring, bench_submission, bench_transfer
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="AzureClusterlessHPC benchmarks (local stand-in)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Number of tasks")
+    parser.add_argument("--benchmarks", nargs="+", default=["submission", "monitoring", "multi_pool", "transfer"],
+        choices=["submission", "monitoring", "multi_pool", "transfer"])
+    parser.add_argument("--output", default="benchmark_results.json", help="Path of the JSON results file")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated latency per API call [s]")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of throttled API calls")
+    parser.add_argument("--task-runtime", type=float, nargs=2, default=[0.5, 2.0], help="Min/max task runtime [s]")
+    parser.add_argument("--slots", type=int, default=None, help="Number of task slots of the pool (default: unlimited)")
+    parser.add_argument("--poll-min-interval", type=float, default=0.1, help="Minimum polling interval [s]")
+    parser.add_argument("--poll-max-interval", type=float, default=2.0, help="Maximum polling interval [s]")
+    parser.add_argument("--max-fetch", type=int, default=2000, 
+        help="Maximum number of completions collected via wait_for_one_task_from_multi_pool")
+    parser.add_argument("--num-files", type=int, default=16, help="Number of files for the transfer benchmark")
+    parser.add_argument("--file-size", type=int, default=4*1024*1024, help="File size [bytes] of the transfer benchmark")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(args)
+
+
+def run(args):
+
+    options = {"latency": args.latency, "throttle_rate": args.throttle_rate, "task_runtime": args.task_runtime,
+        "slots": args.slots, "seed": args.seed}
+    poll_options = {"poll_min_interval": args.poll_min_interval, "poll_max_interval": args.poll_max_interval}
+    results = {name: [] for name in args.benchmarks}
+
+    for num_tasks in args.sizes:
+        if "submission" in args.benchmarks:
+            results["submission"].append(bench_submission.run(num_tasks, options))
+        if "monitoring" in args.benchmarks:
+            results["monitoring"].append(bench_monitoring.run_wait_for_tasks(num_tasks, options, poll_options))
+        if "multi_pool" in args.benchmarks:
+            results["multi_pool"].append(bench_monitoring.run_wait_for_one_task(num_tasks, options, poll_options,
+                max_fetch=args.max_fetch))
+        for name in args.benchmarks:
+            if name != "transfer":
+                print("{} tasks {}: {}".format(num_tasks, name, json.dumps(results[name][-1])))
+
+    if "transfer" in args.benchmarks:
+        results["transfer"].append(bench_transfer.run(args.num_files, args.file_size, dict(options, throttle_rate=0.0)))
+        print("transfer: {}".format(json.dumps(results["transfer"][-1])))
+
+    return {
+        "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "options": vars(args),
+        "results": results
+    }
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run(args)
+    with open(args.output, "w") as fid:
+        json.dump(report, fid, indent=2)
+    print("Results written to {}".format(args.output))
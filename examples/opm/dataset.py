@@ -3,19 +3,479 @@
 #  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
 #  ------------------------------------------------------------------------------------------
 
-import h5py, zarr, os
+import zarr, os, glob, json, time, itertools, multiprocessing, sqlite3, threading
 import numpy as np 
 import torch
-from torch.utils.data import Dataset 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from torch.utils.data import Dataset, Sampler, get_worker_info
+
+
+# Channels of a sample (arrays <channel>_<sample id>) and file with the normalization statistics of the dataset
+CHANNELS = ('permz', 'tops', 'saturation')
+NORMALIZATION_STATS = 'normalization.json'
+
+
+class ZarrReader:
+    ''' Concurrent reader for zarr arrays in an Azure blob container
+    All arrays of a sample are read concurrently: first the metadata of all arrays, then all of their chunks (one
+    get per chunk, max_workers at a time). Up to lookahead samples are read ahead in the background. Each process
+    (i.e. each DataLoader worker) creates its own threads and HTTP session on first use. In the consolidated layout
+    (see convert_to_consolidated), rows of the arrays are read from the chunks that contain them, of which the last
+    chunk_cache chunks are kept in memory.
+    '''
+
+    def __init__(self, client=None, container=None, prefix=None, max_workers=16, lookahead=4, chunk_cache=16):
+        self.client = client
+        self.container = container
+        self.prefix = prefix
+        self.max_workers = max_workers
+        self.lookahead = lookahead
+        self.chunk_cache = chunk_cache
+        self.metadata = None
+        self._stats = multiprocessing.Array('d', 5)     # I/O wait, compute, bytes, samples, prefetched samples (shared by all workers)
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('store', '_io', '_prefetch', '_pending', '_chunks', '_lock'):
+            state.pop(key, None)
+        state['_pid'] = None
+        return state
+
+    def _init_process(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.store = zarr.ABSStore(container=self.container, prefix=self.prefix, client=self._process_client())
+        self._io = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._prefetch = ThreadPoolExecutor(max_workers=max(self.lookahead, 1))
+        self._pending = OrderedDict()
+        self._chunks = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Container client with one HTTP session per process (and one connection per I/O thread)
+    def _process_client(self):
+        try:
+            import requests
+            from azure.core.pipeline.transport import RequestsTransport
+            from azure.storage.blob import ContainerClient
+        except ImportError:
+            return self.client
+        if not isinstance(self.client, ContainerClient):
+            return self.client
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return ContainerClient.from_container_url(self.client.url, credential=self.client.credential,
+            transport=RequestsTransport(session=session))
+
+    def _get(self, key):
+        try:
+            return self.store[key]
+        except KeyError:
+            return None     # missing chunk (fill value)
+
+    @staticmethod
+    def _chunk_keys(path, meta):
+        separator = meta.get('dimension_separator') or '.'
+        grid = [range(-(-n // c)) for (n, c) in zip(meta['shape'], meta['chunks'])]
+        return [path + '/' + separator.join(str(j) for j in idx) for idx in itertools.product(*grid)]
+
+    def _read(self, paths):
+        metas = list(self._io.map(self._get, [path + '/.zarray' for path in paths]))
+        keys = [self._chunk_keys(path, json.loads(meta)) for (path, meta) in zip(paths, metas)]
+        chunks = list(self._io.map(self._get, [key for path_keys in keys for key in path_keys]))
+        self.add_stats(bytes=sum(len(meta) for meta in metas) + sum(len(c) for c in chunks if c is not None))
+
+        # Decode from memory
+        arrays = []
+        chunks = iter(chunks)
+        for (path, meta, path_keys) in zip(paths, metas, keys):
+            local = {path + '/.zarray': meta}
+            for key in path_keys:
+                chunk = next(chunks)
+                if chunk is not None:
+                    local[key] = chunk
+            arrays.append(zarr.core.Array(local, path=path, read_only=True)[...])
+        return arrays
+
+    def read(self, paths):
+        ''' Read arrays (list of paths) and return them as numpy arrays
+        '''
+        self._init_process()
+        tstart = time.time()
+        future = self._pending.pop(tuple(paths), None)
+        if future is not None:
+            self.add_stats(prefetched=1)
+            arrays = future.result()
+        else:
+            arrays = self._read(paths)
+        self.add_stats(io_wait=time.time() - tstart, samples=1)
+        return arrays
+
+    def read_json(self, key):
+        self._init_process()
+        return json.loads(self.store[key])
+
+    def write_json(self, key, value):
+        self._init_process()
+        self.store[key] = json.dumps(value, indent=4).encode()
+
+    def prefetch(self, paths):
+        ''' Read arrays in the background (the oldest read is dropped if lookahead reads are pending)
+        '''
+        self._init_process()
+        if self.lookahead < 1 or tuple(paths) in self._pending:
+            return
+        if len(self._pending) >= self.lookahead:
+            self._pending.popitem(last=False)[1].cancel()
+        self._pending[tuple(paths)] = self._prefetch.submit(self._read, list(paths))
+
+    def read_metadata(self):
+        ''' Consolidated metadata of all arrays (one request)
+        '''
+        if self.metadata is None:
+            self.metadata = self.read_json('.zmetadata')['metadata']
+        return self.metadata
+
+    def _row_chunk_keys(self, path, rows):
+        meta = self.read_metadata()[path + '/.zarray']
+        separator = meta.get('dimension_separator') or '.'
+        grid = [sorted(set(row // meta['chunks'][0] for row in rows))]
+        grid += [range(-(-n // c)) for (n, c) in zip(meta['shape'][1:], meta['chunks'][1:])]
+        return [path + '/' + separator.join(str(j) for j in idx) for idx in itertools.product(*grid)]
+
+    def _fetch_chunk(self, key):
+        chunk = self._get(key)
+        self.add_stats(bytes=0 if chunk is None else len(chunk))
+        return chunk
+
+    # Get chunks concurrently (returns futures). Recently used and pending chunks are shared between calls.
+    def _get_chunks(self, keys):
+        self._init_process()
+        futures = []
+        with self._lock:
+            for key in keys:
+                if key in self._chunks:
+                    self._chunks.move_to_end(key)
+                else:
+                    self._chunks[key] = self._io.submit(self._fetch_chunk, key)
+                futures.append(self._chunks[key])
+            while len(self._chunks) > max(self.chunk_cache, len(keys)):
+                self._chunks.popitem(last=False)
+        return futures
+
+    def read_rows(self, paths, rows):
+        ''' Read rows (samples) of arrays in the consolidated layout and return them as numpy arrays
+        '''
+        tstart = time.time()
+        keys = [self._row_chunk_keys(path, rows) for path in paths]
+        futures = iter(self._get_chunks([key for path_keys in keys for key in path_keys]))
+        arrays = []
+        for (path, path_keys) in zip(paths, keys):
+            local = {path + '/.zarray': json.dumps(self.read_metadata()[path + '/.zarray']).encode()}
+            for key in path_keys:
+                chunk = next(futures).result()
+                if chunk is not None:
+                    local[key] = chunk
+            arrays.append(zarr.core.Array(local, path=path, read_only=True).oindex[np.asarray(rows)])
+        self.add_stats(io_wait=time.time() - tstart, samples=len(rows))
+        return arrays
+
+    def prefetch_rows(self, paths, rows):
+        ''' Read the chunks of rows in the background
+        '''
+        if len(rows) > 0:
+            self._get_chunks([key for path in paths for key in self._row_chunk_keys(path, rows)])
+
+    def add_stats(self, io_wait=0.0, compute=0.0, bytes=0, samples=0, prefetched=0):
+        with self._stats.get_lock():
+            for (j, value) in enumerate((io_wait, compute, bytes, samples, prefetched)):
+                self._stats[j] += value
+
+    def stats(self):
+        ''' I/O statistics of all processes
+        '''
+        io_wait, compute, num_bytes, samples, prefetched = self._stats[:]
+        return {'samples': int(samples), 'prefetched': int(prefetched), 'bytes': int(num_bytes), 'io_wait': io_wait,
+            'compute': compute, 'io_fraction': io_wait / (io_wait + compute) if io_wait + compute > 0 else 0.0}
+
+    def reset_stats(self):
+        with self._stats.get_lock():
+            self._stats[:] = [0.0] * len(self._stats)
+
+
+def compute_normalization_stats(index=None, client=None, container=None, path=None, max_workers=16, lookahead=4,
+    verbose=True):
+    ''' Compute min, max, mean and standard deviation of each channel over all samples (index) of the dataset and
+    store them next to the data (NORMALIZATION_STATS), from where SleipnerDataset4D(normalize='minmax' or
+    'standard') reads them.
+    '''
+    reader = ZarrReader(client=client, container=container, prefix=path, max_workers=max_workers, lookahead=lookahead)
+    samples = [int(i) for i in index]
+    lo = np.full(len(CHANNELS), np.inf); hi = np.full(len(CHANNELS), -np.inf)
+    total = np.zeros(len(CHANNELS)); total_sq = np.zeros(len(CHANNELS)); count = np.zeros(len(CHANNELS))
+
+    for (k, i) in enumerate(samples):
+        for j in samples[k+1:k+1+lookahead]:
+            reader.prefetch([channel + '_' + str(j) for channel in CHANNELS])
+        for (c, array) in enumerate(reader.read([channel + '_' + str(i) for channel in CHANNELS])):
+            array = np.asarray(array, dtype=np.float64)
+            lo[c] = min(lo[c], array.min()); hi[c] = max(hi[c], array.max())
+            total[c] += array.sum(); total_sq[c] += np.square(array).sum(); count[c] += array.size
+        if verbose and (k + 1) % 100 == 0:
+            print('Processed {} of {} samples.'.format(k + 1, len(samples)))
+
+    mean = total / count
+    std = np.sqrt(np.maximum(total_sq / count - np.square(mean), 0))
+    stats = {channel: {'min': lo[c], 'max': hi[c], 'mean': mean[c], 'std': std[c]} for (c, channel) in enumerate(CHANNELS)}
+    stats = {channel: {key: float(value) for (key, value) in values.items()} for (channel, values) in stats.items()}
+    stats['samples'] = len(samples)
+    reader.write_json(NORMALIZATION_STATS, stats)
+    return stats
+
+
+def convert_to_consolidated(index=None, client=None, container=None, path=None, dest_path=None, samples_per_chunk=4,
+    max_workers=16, verbose=True):
+    ''' Convert samples (index) from the per-sample layout (one array per channel and sample in path) to the
+    consolidated layout in dest_path: one array per channel with a leading sample dimension, chunked by
+    samples_per_chunk samples, with the sample ids in the group attributes and consolidated metadata (.zmetadata).
+    Normalization statistics are copied if they exist. Read with SleipnerDataset4D(consolidated=True).
+    '''
+    source = ZarrReader(client=client, container=container, prefix=path, max_workers=max_workers,
+        lookahead=2*samples_per_chunk)
+    dest = ZarrReader(client=client, container=container, prefix=dest_path, max_workers=max_workers)
+    dest._init_process()
+    samples = [int(i) for i in index]
+    group = zarr.group(store=dest.store, overwrite=True)
+    arrays = None
+
+    # One block of samples per chunk (the next block is read ahead)
+    for start in range(0, len(samples), samples_per_chunk):
+        block = samples[start:start+samples_per_chunk]
+        for i in samples[start:start+2*samples_per_chunk]:
+            source.prefetch([channel + '_' + str(i) for channel in CHANNELS])
+        data = [source.read([channel + '_' + str(i) for channel in CHANNELS]) for i in block]
+        if arrays is None:
+            arrays = [group.create_dataset(channel, shape=(len(samples),) + array.shape,
+                chunks=(samples_per_chunk,) + array.shape, dtype=array.dtype) for (channel, array) in zip(CHANNELS, data[0])]
+
+        def write(c):
+            arrays[c][start:start+len(block)] = np.stack([sample[c] for sample in data])
+        list(dest._io.map(write, range(len(CHANNELS))))
+        if verbose:
+            print('Converted {} of {} samples.'.format(start + len(block), len(samples)))
+
+    group.attrs['sample_ids'] = samples
+    group.attrs['samples_per_chunk'] = samples_per_chunk
+    try:
+        dest.write_json(NORMALIZATION_STATS, source.read_json(NORMALIZATION_STATS))
+    except KeyError:
+        pass
+    zarr.consolidate_metadata(dest.store)
+
+
+class SampleCache:
+    ''' Local cache of processed samples
+    Each sample is stored as .npy files and indexed in an sqlite database in the same directory, which makes the
+    cache safe to share between DataLoader workers (and sessions). If max_bytes is set, the least recently used
+    samples are evicted. Cached samples are returned as tensors backed by copy-on-write memory maps (no copy).
+    '''
+
+    def __init__(self, path, name='sample', max_bytes=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.name = name
+        self.max_bytes = max_bytes
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_db', None)
+        state['_pid'] = None
+        return state
+
+    # One connection per process (autocommit, transactions are explicit)
+    def _connect(self):
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(os.path.join(self.path, self.name + '.sqlite'), timeout=60, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS samples (id INTEGER PRIMARY KEY, bytes INTEGER, access REAL)')
+            self._pid = os.getpid()
+        return self._db
+
+    def _files(self, i):
+        return [os.path.join(self.path, '{}_{}_{}.npy'.format(self.name, i, key)) for key in ('x', 'y')]
+
+    def __contains__(self, i):
+        return self._connect().execute('SELECT 1 FROM samples WHERE id = ?', (i,)).fetchone() is not None
+
+    def size(self):
+        ''' Size of all cached samples in bytes
+        '''
+        return self._connect().execute('SELECT COALESCE(SUM(bytes), 0) FROM samples').fetchone()[0]
+
+    def get(self, i):
+        ''' Return the cached tensors (x, y) of sample i or None
+        '''
+        if self._connect().execute('UPDATE samples SET access = ? WHERE id = ?', (time.time(), i)).rowcount == 0:
+            return None
+        try:
+            return tuple(torch.from_numpy(np.load(file, mmap_mode='c')) for file in self._files(i))
+        except FileNotFoundError:
+            return None     # evicted by another worker in the meantime
+
+    def put(self, i, x, y):
+        ''' Add sample i and evict the least recently used samples if the cache exceeds max_bytes
+        '''
+        arrays = [x.contiguous().numpy(), y.contiguous().numpy()]
+        size = sum(array.nbytes for array in arrays)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        for (file, array) in zip(self._files(i), arrays):
+            tmp = '{}.{}.tmp'.format(file, os.getpid())
+            np.save(tmp, array)
+            os.replace(tmp + '.npy', file)
+
+        db = self._connect()
+        evicted = []
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('INSERT OR REPLACE INTO samples VALUES (?, ?, ?)', (i, size, time.time()))
+            if self.max_bytes is not None:
+                total = db.execute('SELECT SUM(bytes) FROM samples').fetchone()[0]
+                for (j, nbytes) in db.execute('SELECT id, bytes FROM samples WHERE id != ? ORDER BY access', (i,)):
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append(j)
+                    total -= nbytes
+                db.executemany('DELETE FROM samples WHERE id = ?', [(j,) for j in evicted])
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+
+        # Open memory maps of other workers stay valid
+        for j in evicted:
+            for file in self._files(j):
+                try:
+                    os.remove(file)
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        ''' Delete all cached samples and the index
+        '''
+        if self._pid == os.getpid():
+            self._db.close()
+            self._pid = None
+        for file in glob.glob(os.path.join(glob.escape(self.path), glob.escape(self.name) + '_*.npy')) + \
+            glob.glob(os.path.join(glob.escape(self.path), glob.escape(self.name) + '.sqlite*')):
+            os.remove(file)
+
+
+class PrefetchSampler(Sampler):
+    ''' Sampler that passes its order to the dataset, so that DataLoader workers read their next samples ahead
+    Wraps another sampler (e.g. RandomSampler) and must be passed to the DataLoader with the same batch size.
+    '''
+
+    def __init__(self, dataset, sampler=None, batch_size=1):
+        self.dataset = dataset
+        self.sampler = range(len(dataset)) if sampler is None else sampler
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        order = list(self.sampler)
+        self.dataset.set_order(order, batch_size=self.batch_size)
+        return iter(order)
+
+    def __len__(self):
+        return len(self.sampler)
+
+
+class ChunkBatchSampler(Sampler):
+    ''' Batch sampler for the consolidated layout: batches contain the samples of as few chunks as possible
+    Chunks are visited in random order, as are the samples of each chunk (if shuffle is True). Pass it to the
+    DataLoader as batch_sampler. Like PrefetchSampler, it passes its order to the dataset.
+    '''
+
+    def __init__(self, dataset, batch_size, shuffle=True, drop_last=False):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __iter__(self):
+        chunks = OrderedDict()
+        for index in range(len(self.dataset)):
+            chunks.setdefault(self.dataset.chunk_of(index), []).append(index)
+        chunks = list(chunks.values())
+        if self.shuffle:
+            chunks = [[chunk[j] for j in torch.randperm(len(chunk)).tolist()] for chunk in
+                [chunks[k] for k in torch.randperm(len(chunks)).tolist()]]
+        order = [index for chunk in chunks for index in chunk]
+        self.dataset.set_order(order, batch_size=self.batch_size)
+        batches = [order[k:k+self.batch_size] for k in range(0, len(order), self.batch_size)]
+        if self.drop_last and len(batches) > 0 and len(batches[-1]) < self.batch_size:
+            batches.pop()
+        return iter(batches)
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.dataset) // self.batch_size
+        return -(-len(self.dataset) // self.batch_size)
+
+
+# Stack the samples of a batch. Inputs of samples returned with time_broadcast='expand' or 'static' are stacked
+# without their time axis and broadcast along time as a view of the batch (or copied if materialize=True).
+def collate_time_broadcast(batch, materialize=False):
+    x = torch.stack([x[:, :, :, :1, :] for x, _ in batch])    # B X Y Z T=1 C
+    y = torch.stack([y for _, y in batch])                      # B X Y Z T C=1
+    x = x.expand(-1, -1, -1, -1, y.shape[4], -1)                # B X Y Z T C
+    if materialize:
+        x = x.contiguous()
+    return x, y
+
+
+# Scale and shift (float32 tensors) that map [lo, hi] to [0, 1] per channel
+def affine_transform(lo, hi):
+    lo = torch.tensor([float(value) for value in lo], dtype=torch.float64)
+    hi = torch.tensor([float(value) for value in hi], dtype=torch.float64)
+    scale = 1 / torch.where(hi > lo, hi - lo, torch.ones_like(hi))
+    return scale.float(), (-lo * scale).float()
+
 
 class SleipnerDataset4D(Dataset):
     ''' Dataset class for flow data generated with OPM 
     This dataset class repeats 3D models in the temporal dimension
     '''
 
-    def __init__(self, index=None, client=None, container=None, path=None, shape=None, nt=None, normalize=True, padding=None, savepath=None, filename=None, keep_data=False):
+    def __init__(self, index=None, client=None, container=None, path=None, shape=None, nt=None, normalize=True, padding=None, savepath=None, filename=None, keep_data=False, time_broadcast='repeat', max_workers=16, lookahead=4, cache_size=None, consolidated=False):
         """ Pytorch dataset class for Sleipner data set.
+
+        normalize: Scale each channel to [0, 1] with the min/max of the sample (True or 'sample'), of the dataset
+        ('minmax') or to zero mean and unit variance over the dataset ('standard'). Dataset statistics are computed
+        once with compute_normalization_stats.
+
+        time_broadcast: How the static inputs are repeated along time. 'repeat' returns a copy per time step,
+        'expand' returns a broadcast view of shape X Y Z T C (read-only, no copy) and 'static' returns the inputs
+        with a time axis of length 1 (X Y Z 1 C). Use collate_time_broadcast to batch 'expand' or 'static' samples.
+
+        max_workers: Number of concurrent blob requests per DataLoader worker.
+
+        lookahead: Number of samples read ahead per DataLoader worker (requires the order of a PrefetchSampler).
+
+        savepath, filename, cache_size: Directory, name and maximum size (in bytes) of the local sample cache.
+
+        consolidated: Read the data from the consolidated layout (see convert_to_consolidated). Use ChunkBatchSampler
+        to read the samples of a batch from as few chunks as possible.
         """
+        if time_broadcast not in ('repeat', 'expand', 'static'):
+            raise ValueError("time_broadcast must be 'repeat', 'expand' or 'static'")
+        if normalize not in (True, False, 'sample', 'minmax', 'standard'):
+            raise ValueError("normalize must be True, False, 'sample', 'minmax' or 'standard'")
 
         self.samples = index
         self.client = client
@@ -28,96 +488,186 @@ class SleipnerDataset4D(Dataset):
         self.savepath = savepath
         self.keep_data = keep_data
         self.filename = filename
+        self.time_broadcast = time_broadcast
+        self.consolidated = consolidated
         if savepath is not None:
-            self.cache = list()
-            # Check if files were already downloaded
-            files = os.listdir(savepath)
-            for i in samples:
-                if filename + '_' + str(int(i.item())) + '.h5' in files:
-                    self.cache.append(self.filename + '_' + str(i.item()) + '.h5')
+            self.cache = SampleCache(savepath, name='sample' if filename is None else filename, max_bytes=cache_size)
         else:
             self.cache = None
 
         # Open the data file
-        self.store = zarr.ABSStore(container=self.container, prefix=self.prefix, client=self.client)       
+        self.reader = ZarrReader(client=self.client, container=self.container, prefix=self.prefix,
+            max_workers=max_workers, lookahead=lookahead)
+
+        # Sample order of the epoch, shared with the DataLoader workers (version, batch size, length, order)
+        self._order = multiprocessing.Array('q', len(self.samples) + 3)
+        self._order_version = 0
+        self.order = None
+
+        # Rows of the samples in the consolidated layout
+        if consolidated:
+            attrs = self.reader.read_metadata()['.zattrs']
+            self.rows = {int(i): row for (row, i) in enumerate(attrs['sample_ids'])}
+            self.samples_per_chunk = attrs['samples_per_chunk']
+
+        # Normalization with dataset statistics: channel = scale * channel + shift
+        if normalize in ('minmax', 'standard'):
+            try:
+                stats = self.reader.read_json(NORMALIZATION_STATS)
+            except KeyError:
+                raise ValueError('No normalization statistics found. Run compute_normalization_stats first.')
+            if normalize == 'minmax':
+                self.scale, self.shift = affine_transform([stats[c]['min'] for c in CHANNELS], [stats[c]['max'] for c in CHANNELS])
+            else:
+                std = torch.tensor([stats[c]['std'] for c in CHANNELS], dtype=torch.float64)
+                self.scale = (1 / torch.where(std > 0, std, torch.ones_like(std))).float()
+                self.shift = -torch.tensor([stats[c]['mean'] for c in CHANNELS]) * self.scale
 
     def __len__(self):
         return len(self.samples)
 
     def __getitem__(self, index):
-        
-        # Read 
-        i = int(self.samples[index])
+        return self.__getitems__([index])[0]
+
+    def __getitems__(self, indices):
+        """ Read and process a list of samples (called with all indices of a batch by the DataLoader of Pytorch 2).
+        """
+        tstart = time.time()
+        samples = [int(self.samples[index]) for index in indices]
 
-        # If caching is used, check if data sample exists locally
-        if self.cache is not None and self.filename + '_' + str(i) + '.h5' in self.cache:
-            fid = h5py.File(os.path.join(self.savepath, self.filename + '_' + str(i) + '.h5'), 'r')
-            x = torch.tensor(np.array(fid['x']))
-            sat = torch.tensor(np.array(fid['y']))
-            fid.close()
+        # If caching is used, check if data samples exist locally
+        cached = [None if self.cache is None else self.cache.get(i) for i in samples]
+        missing = [i for (i, sample) in zip(samples, cached) if sample is None]
 
+        # Read (only the channels used in x and y: permxy, pressure and the well location are not used)
+        tread = time.time()
+        if len(missing) == 0:
+            arrays = []
+        elif self.consolidated:
+            channels = self.reader.read_rows(CHANNELS, [self.rows[i] for i in missing])
+            arrays = [[channel[k] for channel in channels] for k in range(len(missing))]
         else:
-            nx, ny, nz = self.shape
-            
-            permxy = torch.tensor(np.array(zarr.core.Array(self.store, path='permxy_' + str(i))), dtype=torch.float32)      # XYZ
-            permz = torch.tensor(np.array(zarr.core.Array(self.store, path='permz_' + str(i))), dtype=torch.float32)        # XYZ
-            tops = torch.tensor(np.array(zarr.core.Array(self.store, path='tops_' + str(i))), dtype=torch.float32)          # YZ
-            sat = torch.tensor(np.array(zarr.core.Array(self.store, path='saturation_' + str(i))), dtype=torch.float32)     # XYZT
-            pressure = torch.tensor(np.array(zarr.core.Array(self.store, path='pressure_' + str(i))), dtype=torch.float32)  # XYZT
-            well = torch.zeros(nx, ny, nz, 1)
-            well[30, 30, :, 0] = 1.0
-
-            # Copy tops
-            tops = tops.view(1, ny, nz).repeat(nx, 1, 1)
-
-            # Normalize
-            if self.normalize:
-                permxy -= permxy.min(); permxy /= permxy.max()
-                permz -= permz.min(); permz /= permz.max()
-                tops -= tops.min(); tops /= tops.max()
-                well -= well.min(); well /= well.max()
-                sat -= sat.min(); sat /= sat.max()
-                sat[sat < 0] = 0; sat /= sat.max()
-                pressure -= pressure.min(); pressure /= pressure.max()         
-
-            # Padding
-            if self.padding is not None:
-                xpad, ypad, zpad = self.padding
-                permxy = torch.nn.functional.pad(permxy, (zpad,zpad,ypad,ypad,xpad,xpad))
-                permz = torch.nn.functional.pad(permz, (zpad,zpad,ypad,ypad,xpad,xpad))
-                tops = torch.nn.functional.pad(tops, (zpad,zpad,ypad,ypad,xpad,xpad))
-                well = torch.nn.functional.pad(well, (zpad,zpad,ypad,ypad,xpad,xpad))
-                sat = torch.nn.functional.pad(sat, (0,0,zpad,zpad,ypad,ypad,xpad,xpad))
-                pressure = torch.nn.functional.pad(pressure, (0,0,zpad,zpad,ypad,ypad,xpad,xpad))
-                nx, ny, nz, nt = pressure.shape
-                self.shape = nx, ny, nz
-
-            # Repeat along time
-            permxy = permxy.view(nx, ny, nz, 1, 1).repeat(1, 1, 1, self.nt, 1)  # X Y Z T C=1
-            permz = permz.view(nx, ny, nz, 1, 1).repeat(1, 1, 1, self.nt, 1)    # X Y Z T C=1
-            tops = tops.view(nx, ny, nz, 1, 1).repeat(1, 1, 1, self.nt, 1)      # X Y Z T C=1
-            well = well.view(nx, ny, nz, 1, 1).repeat(1, 1, 1, self.nt, 1)      # X Y Z T C=1
-            sat = sat.view(nx, ny, nz, self.nt, 1)                              # X Y Z T C=1
-            pressure = pressure.view(nx, ny, nz, self.nt, 1)                    # X Y Z T C=1
-
-            x = torch.cat((
-                permz,
-                tops
-                ),
-                axis=-1
-            )
-
-            if self.cache is not None:
-                fid = h5py.File(os.path.join(self.savepath, self.filename + '_' + str(i) + '.h5'), 'w')
-                fid.create_dataset('x', data=x)
-                fid.create_dataset('y', data=sat)
-                fid.close()
-                self.cache.append(self.filename + '_' + str(i) + '.h5')
-
-        return x, sat
+            arrays = [self.reader.read(self.paths(i)) for i in missing]
+        io_wait = time.time() - tread
+        self.prefetch_next(indices[-1])
+
+        batch = []
+        arrays = iter(arrays)
+        for (i, sample) in zip(samples, cached):
+            if sample is None:
+                x, sat = self.process(*[torch.tensor(array, dtype=torch.float32) for array in next(arrays)])   # XYZ, YZ, XYZT
+
+                # Cache static inputs only (broadcast along time when read)
+                if self.cache is not None:
+                    self.cache.put(i, x, sat)
+            else:
+                x, sat = sample
+            batch.append((self.broadcast_time(x, sat.shape[3]), sat))
+
+        self.reader.add_stats(compute=time.time() - tstart - io_wait)
+        return batch
+
+    def process(self, permz, tops, sat):
+        """ Normalize and pad a sample. Returns the static inputs (X Y Z 1 C) and the saturation (X Y Z T C=1).
+        """
+        nx, ny, nz = permz.shape
+
+        # Static inputs
+        x = torch.stack((
+            permz,
+            tops.view(1, ny, nz).expand(nx, ny, nz)
+            ),
+            axis=-1
+        )   # X Y Z C
+
+        # Normalize (one in-place pass for all inputs and one for the saturation)
+        if self.normalize:
+            if self.normalize in ('minmax', 'standard'):
+                scale, shift = self.scale, self.shift
+            else:
+                scale, shift = affine_transform(*zip(*[torch.aminmax(array) for array in (permz, tops, sat)]))
+            torch.addcmul(shift[:2], x, scale[:2], out=x)
+            torch.addcmul(shift[2], sat, scale[2], out=sat)
+
+        # Padding
+        if self.padding is not None:
+            xpad, ypad, zpad = self.padding
+            x = torch.nn.functional.pad(x, (0,0,zpad,zpad,ypad,ypad,xpad,xpad))
+            sat = torch.nn.functional.pad(sat, (0,0,zpad,zpad,ypad,ypad,xpad,xpad))
+            nx, ny, nz, nt = sat.shape
+            self.shape = nx, ny, nz
+
+        return x.view(nx, ny, nz, 1, -1), sat.view(nx, ny, nz, self.nt, 1)
+
+    def paths(self, i):
+        return [channel + '_' + str(i) for channel in CHANNELS]
+
+    def chunk_of(self, index):
+        return self.rows[int(self.samples[index])] // self.samples_per_chunk
+
+    def is_cached(self, i):
+        return self.cache is not None and i in self.cache
+
+    def set_order(self, order, batch_size=1):
+        """ Order in which the dataset is indexed (set by PrefetchSampler and ChunkBatchSampler). The order is kept in
+        shared memory, so it also reaches DataLoader workers that were started before (e.g. persistent workers or
+        workers started before the first batch was sampled). Orders longer than the dataset are truncated.
+        """
+        order = list(order)[:len(self.samples)]
+        with self._order.get_lock():
+            self._order[3:3 + len(order)] = order
+            self._order[1] = batch_size
+            self._order[2] = len(order)
+            self._order[0] += 1
+
+    def sync_order(self):
+        """ Load the order from shared memory if it was changed since the last call.
+        """
+        if self._order[0] == self._order_version:
+            return
+        with self._order.get_lock():
+            version, batch_size, length = self._order[:3]
+            self.order = self._order[3:3 + length]
+        self._order_version = version
+        self.batch_size = batch_size
+        self.position = {index: p for (p, index) in enumerate(self.order)}
+
+    def prefetch_next(self, index):
+        """ Read the next samples of this worker ahead. DataLoader workers receive batches in turns.
+        """
+        self.sync_order()
+        if self.order is None or index not in self.position:
+            return
+        worker = get_worker_info()
+        num_workers, worker_id = (1, 0) if worker is None else (worker.num_workers, worker.id)
+        upcoming = []
+        for p in range(self.position[index] + 1, len(self.order)):
+            if len(upcoming) == self.reader.lookahead:
+                break
+            if (p // self.batch_size) % num_workers == worker_id:
+                upcoming.append(int(self.samples[self.order[p]]))
+        upcoming = [i for i in upcoming if not self.is_cached(i)]
+        if self.consolidated:
+            self.reader.prefetch_rows(CHANNELS, [self.rows[i] for i in upcoming])
+        else:
+            for i in upcoming:
+                self.reader.prefetch(self.paths(i))
+
+    def stats(self):
+        """ I/O wait and compute time of all DataLoader workers (seconds).
+        """
+        return self.reader.stats()
+
+    def broadcast_time(self, x, nt):
+        """ Broadcast static inputs (X Y Z 1 C) along time.
+        """
+        if self.time_broadcast == 'repeat':
+            return x.repeat(1, 1, 1, nt, 1)     # X Y Z T C
+        elif self.time_broadcast == 'expand':
+            return x.expand(-1, -1, -1, nt, -1) # X Y Z T C (view)
+        return x
         
     def close(self):
         if self.keep_data is False and self.cache is not None:
             print('Delete temp files.')
-            for file in self.cache:
-                os.system('rm ' + self.savepath + '/' + file)
+            self.cache.clear()
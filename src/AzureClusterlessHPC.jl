@@ -12,8 +12,8 @@ else
     using PyCall, Serialization, JSON, Random, SyntaxTree, Logging
     import Base.fetch, Base.setindex!
 
-    export batch_show, batch_clear, Options, fileinclude, filereturn
-    export delete_pool, delete_container, delete_all_jobs
+    export batch_show, batch_clear, print_stats, Options, fileinclude, filereturn
+    export delete_pool, delete_container, delete_all_jobs, wait_for_pools_ready
 
     # Initiliaze PyCall constants
     const batch = PyNULL()
@@ -84,14 +84,19 @@ else
         # Global list of pools (start with no pools)
         global __active_pools__ = Array{Dict}(undef, 0)
 
-        # Batch and blob clients
+        # Batch and blob clients (shared per account, with pooled HTTP connections)
+        ~isnothing(__params__) && azureclusterlesshpc.configure_http_pool(parse(Int, __params__["_HTTP_POOL_SIZE"]))
         global __clients__ = create_clients(__credentials__, batch=true, blob=true)
+
+        # Speculative copies of straggler tasks
+        configure_speculation(__params__)
     end
 
     # Includes
     include("pyinterface/pyinterface.jl")
     include("pyinterface/pyinterface_test.jl")
     include("core/azureclusterlesshpc_base.jl")
+    include("runtime/compression.jl")
     include("core/futures.jl")
     include("core/batch_controller.jl")
     include("core/batch_macros.jl")
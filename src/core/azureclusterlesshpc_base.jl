@@ -25,7 +25,23 @@ const default_parameters = [
     ["_JULIA_NUM_THREADS", "1"],
     ["_JULIA_DEPOT_PATH", "/mnt/batch/tasks/startup/wd/.julia"],
     ["_PYTHONPATH", "/mnt/batch/tasks/startup/wd/.local/lib/python3.6/site-packages"],
-    ["_VERBOSE", "1"]
+    ["_VERBOSE", "1"],
+    ["_POLL_MIN_INTERVAL", "1"],
+    ["_POLL_MAX_INTERVAL", "30"],
+    ["_POLL_BACKOFF", "1.5"],
+    ["_POLL_JITTER", "0.1"],
+    ["_HTTP_POOL_SIZE", "32"],
+    ["_PRINT_STATS", "0"],
+    ["_SPECULATION_MULTIPLE", "0"],
+    ["_SPECULATION_PERCENTILE", "0.9"],
+    ["_SPECULATION_MIN_SAMPLES", "10"],
+    ["_SPECULATION_MAX_COPIES", "1"],
+    ["_COMPLETION_QUEUE", "0"],
+    ["_COMPLETION_QUEUE_INTERVAL", "0.5"],
+    ["_COMPLETION_QUEUE_SAFETY_INTERVAL", "60"],
+    ["_COMPRESSION", "none"],
+    ["_COMPRESSION_LEVEL", "0"],
+    ["_COMPRESSION_MIN_SIZE", "65536"]
 ]
 
 function create_parameter_dict(params, default_parameters)
@@ -45,6 +61,13 @@ function create_parameter_dict(params, default_parameters)
     return default_parameters
 end
 
+# Compression of serialized payloads on the client (set via parameter file)
+function compression_options(params=__params__)
+    isnothing(params) && return (compression="none", level=0, min_size=0)
+    return (compression=params["_COMPRESSION"], level=parse(Int, params["_COMPRESSION_LEVEL"]),
+        min_size=parse(Int, params["_COMPRESSION_MIN_SIZE"]))
+end
+
 # Manage batch state
 """
     batch_show  ()
@@ -85,6 +108,50 @@ function batch_clear()
 end    
 
 
+# Print call statistics
+"""
+    print_stats(; reset=false, label="")
+
+ Print the number of calls, errors, throttled requests, retries, transferred bytes and latencies (mean and 90th 
+ percentile) per operation of all calls to the Azure Batch, Blob and Queue services. If the parameter `"_PRINT_STATS"`
+ is set to `"1"`, the statistics are printed (and reset) after each `@batchexec` and `fetch`.
+
+ *Optional input:*
+
+ - `reset=false`: Reset the statistics after printing them.
+
+ - `label=""`: Label that is printed in the header.
+
+ *Output*
+
+ - `Nothing`
+
+ See also: [`get_stats`](@ref), [`reset_stats`](@ref)
+"""
+function print_stats(; reset=false, label="")
+    stats = get_stats(; reset=reset)
+    total = stats["total"]
+    header = isempty(label) ? "Azure calls" : "Azure calls ($label)"
+    print("\n$header: $(total["calls"]) calls, $(total["throttled"]) throttled, $(total["retries"]) retries, ",
+        "$(round(total["bytes_sent"] / 2^20; digits=2)) MB sent, $(round(total["bytes_received"] / 2^20; digits=2)) MB received\n")
+    isempty(stats["operations"]) && return nothing
+    print(rpad("operation", 40), lpad("calls", 8), lpad("errors", 8), lpad("throttled", 10), lpad("retries", 8),
+        lpad("mean [ms]", 11), lpad("p90 [ms]", 11), lpad("MB", 10), "\n")
+    for (operation, op) in sort(collect(stats["operations"]); by=first)
+        ms(seconds) = isnothing(seconds) ? "-" : string(round(1e3 * seconds; digits=1))
+        mb = round((op["bytes_sent"] + op["bytes_received"]) / 2^20; digits=2)
+        print(rpad(operation, 40), lpad(op["calls"], 8), lpad(op["errors"], 8), lpad(op["throttled"], 10),
+            lpad(op["retries"], 8), lpad(ms(op["mean_seconds"]), 11), lpad(ms(op["p90_seconds"]), 11), lpad(mb, 10), "\n")
+    end
+    return nothing
+end
+
+# Print (and reset) statistics if enabled via the "_PRINT_STATS" parameter
+function print_stats_if_enabled(label)
+    ~isnothing(__params__) && parse(Bool, __params__["_PRINT_STATS"]) && print_stats(; reset=true, label=label)
+end
+
+
 # Delete pool
 """
     delete_pool(; pool_id=nothing)
@@ -133,7 +200,7 @@ end
 function delete_container(; blobcontainer=nothing)
     isnothing(blobcontainer) && (blobcontainer = __params__["_BLOB_CONTAINER"])
     for client in __clients__
-        client["blob_client"].delete_container(blobcontainer)
+        delete_blob_container(client["blob_client"], blobcontainer)
     end
 end
 
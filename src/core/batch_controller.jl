@@ -147,6 +147,7 @@ end
 function delete_job(batch_controller::BatchController)
     for (i, batch_client) in enumerate(batch_controller.batch_client)
         batch_client.job.delete(batch_controller.job_id[i])
+        disable_completion_notifications(batch_client, batch_controller.job_id[i])
     end
 end
 
@@ -190,7 +191,7 @@ end
 """
 function delete_container(batch_controller::BatchController)
     for client in __clients__
-        client["blob_client"].delete_container(batch_controller.blobcontainer)
+        delete_blob_container(client["blob_client"], batch_controller.blobcontainer)
     end
 end
 
@@ -243,13 +244,8 @@ end
  
 """
 function wait_for_tasks_to_complete(batch_controller::BatchController; timeout=60, task_timeout=60, num_restart=0)
-    status = []
-    @sync begin
-        for (i, batch_client) in enumerate(batch_controller.batch_client)
-            @async push!(status, wait_for_tasks_to_complete(batch_client, batch_controller.job_id[i];
-                task_timeout=task_timeout, fetch_timeout=timeout, verbose=__verbose__, num_restart=num_restart))
-        end
-    end
+    status = wait_for_all_tasks_to_complete(batch_controller.batch_client, batch_controller.job_id;
+        task_timeout=task_timeout, fetch_timeout=timeout, verbose=__verbose__, num_restart=num_restart)
 
     # Return indices of failed tasks
     return status[findall(i -> typeof(i) != Bool, status)]
@@ -6,6 +6,22 @@
 ###################################################################################################
 # Fetch methods
 
+# Download blobs concurrently and deserialize them. Returns the values and whether each blob could be read.
+function fetch_blobs(blob_client, container, blobs; destroy_blob=false)
+    contents = download_blobs(blob_client, container, blobs; delete=destroy_blob)
+    success = [~isnothing(val) for val in contents]
+    values = [isnothing(val) ? nothing : deserialize_blob(val) for val in contents]
+    return values, success
+end
+
+# Deserialize a downloaded bytearray in place: the PyArray wraps its buffer without copying and keeps it alive
+function deserialize_blob(val::PyObject)
+    buffer = PyArray(val)
+    GC.@preserve buffer deserialize_payload(unsafe_wrap(Array, pointer(buffer), length(buffer)))
+end
+
+deserialize_blob(val::AbstractVector{UInt8}) = deserialize_payload(val)
+
 # Fetch output blobs for given task index (blocking)
 """
     output = fetch(object::Union{BatchController, BlobFuture, BatchFuture}; destroy_blob=false, timeout=60, task_timeout=60)
@@ -46,23 +62,14 @@ function fetch(batch_controller::BatchController, idx; destroy_blob=false, timeo
             verbose=__verbose__, num_restart=num_restart)
     end
 
-    # Loop over entries in Future for i-th task
+    # Fetch all entries in Future for i-th task concurrently
     num_files = length(batch_controller.output[idx].blob.name)
     out_files = []
-    for blob in batch_controller.output[idx].blob.name
-
-        # Fetch blob and add to collection
-        if ~isnothing(batch_controller.blob_client[pool_no])
-            try
-                val = batch_controller.blob_client[pool_no].get_blob_to_bytes(batch_controller.blobcontainer, blob)
-                push!(out_files, deserialize(IOBuffer(val.content)))
-
-                # Delete blob (default is true)
-                destroy_blob && batch_controller.blob_client[pool_no].delete_blob(batch_controller.blobcontainer, blob)
-            catch
-                @warn "Blob does not exist or task has not finished yet. Return nothing."
-                push!(out_files, nothing)
-            end
+    if ~isnothing(batch_controller.blob_client[pool_no])
+        out_files, success = fetch_blobs(batch_controller.blob_client[pool_no], batch_controller.blobcontainer, 
+            batch_controller.output[idx].blob.name; destroy_blob=destroy_blob)
+        for blob_success in success
+            ~blob_success && @warn "Blob does not exist or task has not finished yet. Return nothing."
         end
     end
 
@@ -116,23 +123,14 @@ function fetch!(batch_controller::BatchController, idx; destroy_blob=true, timeo
             verbose=__verbose__, num_restart=num_restart)
     end
 
-    # Loop over entries in Future for i-th task
+    # Fetch all entries in Future for i-th task concurrently
     num_files = length(batch_controller.output[idx].blob.name)
     out_files = []
-    for blob in batch_controller.output[idx].blob.name
-
-        # Fetch blob and add to collection
-        if ~isnothing(batch_controller.blob_client[pool_no])
-            try
-                val = batch_controller.blob_client[pool_no].get_blob_to_bytes(batch_controller.blobcontainer, blob)
-                push!(out_files, deserialize(IOBuffer(val.content)))
-
-                # Delete blob (default is true)
-                destroy_blob && batch_controller.blob_client[pool_no].delete_blob(batch_controller.blobcontainer, blob)
-            catch
-                @warn "Blob does not exist or task has not finished yet. Return nothing."
-                push!(out_files, nothing)
-            end
+    if ~isnothing(batch_controller.blob_client[pool_no])
+        out_files, success = fetch_blobs(batch_controller.blob_client[pool_no], batch_controller.blobcontainer, 
+            batch_controller.output[idx].blob.name; destroy_blob=destroy_blob)
+        for blob_success in success
+            ~blob_success && @warn "Blob does not exist or task has not finished yet. Return nothing."
         end
     end
 
@@ -180,6 +178,7 @@ function fetch(batch_controller::BatchController; destroy_blob=false, timeout=60
         # Return it task list is empty
         if isempty(remaining_tasks)
             __verbose__ && print("\n")
+            print_stats_if_enabled("fetch")
             if length(out_files) > 1
                 return out_files
             elseif length(out_files) == 1
@@ -220,6 +219,7 @@ function fetch!(batch_controller::BatchController; destroy_blob=true, timeout=60
         # Return it task list is empty
         if isempty(remaining_tasks)
             __verbose__ && print("\n")
+            print_stats_if_enabled("fetch")
             if length(out_files) > 1
                 return out_files
             else
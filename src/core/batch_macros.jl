@@ -110,7 +110,8 @@ function create_batch_resource_from_batch_future(batch_future::BatchFuture, pool
 end
 
 
-function create_batch_task!(expr, pool_no, count, tasks, resources, task_ids, output, files, app_cmd, options)
+function create_batch_task!(expr, pool_no, count, tasks, resources, task_ids, output, files, app_cmd, options;
+    output_builder=nothing, completion_queue_url=nothing)
 
     # Append expressions previously tagged via @batchdef
     isnothing(options) ? (task_base = "task_") : (task_base = options.task_name)
@@ -122,15 +123,14 @@ function create_batch_task!(expr, pool_no, count, tasks, resources, task_ids, ou
         push!(expressions.args, expr)
     end
 
-    # Replace return statement with serialization and create batch output resources
+    # Replace return statement with serialization and create batch output resources (one wildcard pattern per task)
+    isnothing(output_builder) && (output_builder = create_output_file_builder(__active_pools__[pool_no]["clients"]["blob_client"],
+        __active_pools__[pool_no]["credentials"]["_STORAGE_ACCOUNT_NAME"], __container__))
     filenames = []; outfiles = Array{PyObject}(undef, 0)
     funcname = expr.args[1] # name of function that is called remotely
-    find_function_in_ast_and_replace_return!(expressions, funcname, filenames)
-    for outfile in filenames
-        push!(outfiles, create_batch_output_file(__active_pools__[pool_no]["clients"]["blob_client"], 
-            __active_pools__[pool_no]["credentials"]["_STORAGE_ACCOUNT_NAME"], 
-            __container__, outfile)...)
-    end
+    output_prefix = join([task_ids[end]["taskname"], "_"])
+    find_function_in_ast_and_replace_return!(expressions, funcname, filenames; prefix=output_prefix)
+    length(filenames) > 0 && append!(outfiles, output_builder.output_file_pattern(output_prefix))
 
     # Collect output blob names in Julia Futures
     future_return = BlobFuture(__container__, BlobRef(tuple(filenames...)), pool_no)
@@ -139,11 +139,7 @@ function create_batch_task!(expr, pool_no, count, tasks, resources, task_ids, ou
     # Create batch output files for filereturns()
     filereturns = []
     find_filereturns_in_ast!(expressions, filereturns)
-    for outfile in filereturns
-        push!(outfiles, create_batch_output_file(__active_pools__[pool_no]["clients"]["blob_client"], 
-            __active_pools__[pool_no]["credentials"]["_STORAGE_ACCOUNT_NAME"], 
-            __container__, outfile)...)
-    end
+    length(filereturns) > 0 && append!(outfiles, output_builder.output_files(filereturns))
 
     # Collect output blob names in Julia Futures
     future_file = FileFuture(__container__, BlobRef(tuple(filereturns...)), pool_no)
@@ -151,7 +147,7 @@ function create_batch_task!(expr, pool_no, count, tasks, resources, task_ids, ou
 
     # Serialize AST
     filename = join([task_base, count, ".dat"])
-    iostream = IOBuffer(); serialize(iostream, linefilter!(expressions))
+    ast_bytes, ast_compression = serialize_payload(linefilter!(expressions); compression_options()...)
 
     # Environment variables
     if ~isnothing(options) && options.reset_mpi == true
@@ -163,13 +159,22 @@ function create_batch_task!(expr, pool_no, count, tasks, resources, task_ids, ou
     end
     envs = create_batch_envs(
         ["FILENAME", "JULIA_DEPOT_PATH", "PYTHONPATH", "MPI_RUN", "INTER_NODE_CONNECTION", "NUM_NODES_PER_TASK",
-        "NUM_PROCS_PER_NODE", "OMP_NUM_THREADS", "JULIA_NUM_THREADS"], [filename, __params__["_JULIA_DEPOT_PATH"], 
+        "NUM_PROCS_PER_NODE", "OMP_NUM_THREADS", "JULIA_NUM_THREADS", "COMPRESSION", "COMPRESSION_LEVEL", 
+        "COMPRESSION_MIN_SIZE"], [filename, __params__["_JULIA_DEPOT_PATH"], 
         __params__["_PYTHONPATH"], __params__["_MPI_RUN"], __params__["_INTER_NODE_CONNECTION"], 
         env_num_nodes_per_task, env_num_procs_per_node, __params__["_OMP_NUM_THREADS"],
-        __params__["_JULIA_NUM_THREADS"]])
+        __params__["_JULIA_NUM_THREADS"], __params__["_COMPRESSION"], __params__["_COMPRESSION_LEVEL"], 
+        __params__["_COMPRESSION_MIN_SIZE"]])
+
+    # Post message to the completion queue of the job on exit
+    if ~isnothing(completion_queue_url)
+        output_patterns = vcat(length(filenames) > 0 ? [join([output_prefix, "*"])] : [], filereturns)
+        envs = vcat(envs, azureclusterlesshpc.create_completion_envs(completion_queue_url, output_patterns))
+    end
 
     # Create resource file and append to resource list
-    ast_resource = create_batch_resource_from_bytes(__active_pools__[pool_no]["clients"]["blob_client"], __container__, filename, iostream.data; verbose=__verbose__)
+    ast_resource = create_batch_resource_from_bytes(__active_pools__[pool_no]["clients"]["blob_client"], __container__, filename, ast_bytes; 
+        verbose=__verbose__, compression=ast_compression)
     length(__active_pools__[pool_no]["resources"]) > 0 && (ast_resource = vcat(ast_resource, __active_pools__[pool_no]["resources"]))
 
     # Create resource file for blob futures in AST
@@ -283,32 +288,46 @@ function submit_batch_job(expression_list; options=nothing)
 
         # Add Julia runtime and cmd to batch resource list
         resources = Array{PyObject}(undef, 0)
-        push!(resources, create_batch_resource_from_file(__active_pools__[pool_no]["clients"]["blob_client"], 
-            __container__, joinpath(dirname(pathof(AzureClusterlessHPC)), "runtime/application-cmd"); 
-            verbose=__verbose__)[1])  
-        push!(resources, create_batch_resource_from_file(__active_pools__[pool_no]["clients"]["blob_client"],
-            __container__, joinpath(dirname(pathof(AzureClusterlessHPC)), "runtime/batch_runtime.jl");
-            verbose=__verbose__)[1])
+        runtime_files = [joinpath(dirname(pathof(AzureClusterlessHPC)), "runtime/application-cmd"),
+            joinpath(dirname(pathof(AzureClusterlessHPC)), "runtime/batch_runtime.jl")]
+        append!(resources, create_batch_resources_from_files(__active_pools__[pool_no]["clients"]["blob_client"], 
+            __container__, runtime_files; verbose=__verbose__))
 
         # Serialize expressions with "using ..." and create batch resource
         if ~isnothing(__packages__)
-            iostream = IOBuffer(); serialize(iostream, __packages__)
+            package_bytes, package_compression = serialize_payload(__packages__; compression_options()...)
             push!(resources, create_batch_resource_from_bytes(__active_pools__[pool_no]["clients"]["blob_client"], 
-                __container__, "packages.dat", iostream.data; verbose=__verbose__)[1])
+                __container__, "packages.dat", package_bytes; verbose=__verbose__, compression=package_compression)[1])
         end
         
+        # Shared output file destination for all tasks of the job
+        output_builder = create_output_file_builder(__active_pools__[pool_no]["clients"]["blob_client"],
+            __active_pools__[pool_no]["credentials"]["_STORAGE_ACCOUNT_NAME"], __container__)
+
+        # Completion queue of the job (opt-in)
+        completion_queue_url = nothing
+        if parse(Bool, __params__["_COMPLETION_QUEUE"])
+            queue_client = create_queue_client(__active_pools__[pool_no]["credentials"])
+            completion_queue_url = create_completion_queue(queue_client, job_ids[end])
+        end
+
         # Create tasks for each batch pool
         tasks = []
         @sync begin
             for (j, expr) in enumerate(expressions)
-                create_batch_task!(expr, pool_no, count, tasks, resources, task_ids, output, files, app_cmd, options)
+                create_batch_task!(expr, pool_no, count, tasks, resources, task_ids, output, files, app_cmd, options;
+                    output_builder=output_builder, completion_queue_url=completion_queue_url)
                 count += 1
             end
         end
         if ~isnothing(__active_pools__[pool_no]["clients"]["batch_client"])
-            __active_pools__[pool_no]["clients"]["batch_client"].task.add_collection(job_ids[end], tasks)
+            submit_tasks(__active_pools__[pool_no]["clients"]["batch_client"], job_ids[end], tasks; verbose=__verbose__)
+            ~isnothing(completion_queue_url) && enable_completion_notifications(
+                __active_pools__[pool_no]["clients"]["batch_client"], job_ids[end], queue_client; 
+                blob_client=__active_pools__[pool_no]["clients"]["blob_client"], container_name=__container__)
         end
     end
+    print_stats_if_enabled("@batchexec")
     return BatchController(job_ids, task_ids, length(expression_list), output, files=files)
 end
 
@@ -528,7 +547,7 @@ function find_output_files!(expr, filenames)
 end
 
 # Find return statement in expression and replace w/ serialization
-function replace_return_with_serialization!(expr, filelist)
+function replace_return_with_serialization!(expr, filelist; prefix="")
     typeof(expr) != Expr && return
 
     # Check if return is in current symbol block
@@ -548,25 +567,21 @@ function replace_return_with_serialization!(expr, filelist)
             for (i, argout) in enumerate(expr.args[idx].args[1].args)
 
                 # Create random filename and add to collection
-                filename = randstring(12)
+                filename = join([prefix, randstring(12)])
                 push!(filelist, filename)
                 
                 # Insert serialization at location of return statement
-                insert!(expr.args, idx + (3*i-2), :(iostream = open($filename, "w")))
-                insert!(expr.args, idx + (3*i-1), :(serialize(iostream, $argout)))
-                insert!(expr.args, idx + 3*i, :(close(iostream)))
+                insert!(expr.args, idx + i, :(AzureClusterlessHPC.serialize_file($filename, $argout)))
             end
         else
             argout = expr.args[idx].args[1]
 
             # Create random filename and add to collection
-            filename = randstring(12)
+            filename = join([prefix, randstring(12)])
             push!(filelist, filename)
             
             # Insert serialization at location of return statement
-            insert!(expr.args, idx+1, :(iostream = open($filename, "w")))
-            insert!(expr.args, idx+2, :(serialize(iostream, $argout)))
-            insert!(expr.args, idx+3, :(close(iostream)))
+            insert!(expr.args, idx+1, :(AzureClusterlessHPC.serialize_file($filename, $argout)))
         end
         # Remove return statement from block
         popat!(expr.args, idx)
@@ -574,26 +589,26 @@ function replace_return_with_serialization!(expr, filelist)
         # Step through AST
         for i=1:length(expr.args)
             if typeof(expr.args[i]) == Expr
-                replace_return_with_serialization!(expr.args[i], filelist)
+                replace_return_with_serialization!(expr.args[i], filelist; prefix=prefix)
             end
         end
     end
 end
 
 # Replace return statement for given function with serialization
-function find_function_in_ast_and_replace_return!(expr, fname, filelist)
+function find_function_in_ast_and_replace_return!(expr, fname, filelist; prefix="")
 
     # Reached AST leaf
     typeof(expr) != Expr && return
 
     if expr.head == :function && expr.args[1].args[1] == fname
         # Found function with given name. Now replace return w/ serialization
-        replace_return_with_serialization!(expr, filelist)
+        replace_return_with_serialization!(expr, filelist; prefix=prefix)
     else
         # Step through AST
         for i=1:length(expr.args)
             if typeof(expr.args[i]) == Expr
-                find_function_in_ast_and_replace_return!(expr.args[i], fname, filelist)
+                find_function_in_ast_and_replace_return!(expr.args[i], fname, filelist; prefix=prefix)
             end
         end
     end
@@ -622,7 +637,7 @@ end
 # Bcast
 
 # Create batch resource for broadcasted variable
-function create_bcast_batch_resource(blob_name, binary; container=nothing)
+function create_bcast_batch_resource(blob_name, binary; container=nothing, compression=nothing)
 
     # If bcast is overwrite of exisiting resources -> remove original one
     isnothing(container) && (container = __container__)
@@ -631,7 +646,8 @@ function create_bcast_batch_resource(blob_name, binary; container=nothing)
         if ~isempty(resource_idx)
             popat!(resource, resource_idx[1]) # remove original resource
         end
-        upload_bytes_to_container(client["blob_client"], container, blob_name, binary; verbose=__verbose__)
+        upload_bytes_to_container(client["blob_client"], container, blob_name, binary; verbose=__verbose__,
+            compression=compression)
     end
 
     # Return future w/ blob name
@@ -651,13 +667,12 @@ function bcast_expression(expr::Symbol; container=nothing)
 
     # Return expression
     expr_out = quote
-        _iobuff = IOBuffer()
-        AzureClusterlessHPC.serialize(_iobuff, $expr)   # eval in local scope
-        _binary = _iobuff.data
+        _binary, _compression = AzureClusterlessHPC.serialize_payload($expr;   # eval in local scope
+            AzureClusterlessHPC.compression_options()...)
 
         # Create batch resource
         _blob_name = join([$filename, objectid($expr), ".dat"])
-        create_bcast_batch_resource(_blob_name, _binary; container=$container)
+        create_bcast_batch_resource(_blob_name, _binary; container=$container, compression=_compression)
     end
     return esc(expr_out)
 end
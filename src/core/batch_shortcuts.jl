@@ -54,6 +54,10 @@ end
 
  - `image_resource_id` (String): Image ID of the VM image.
 
+ - `node_agent_sku_id` (String): Node agent SKU of the custom VM image (e.g. `"batch.node.ubuntu 18.04"`). If omitted, 
+    the SKU is looked up from the supported VM images of the `_NODE_OS_*` parameters (cached). The lookup is skipped for 
+    custom images with an explicit SKU.
+
 
  *Output*:
 
@@ -63,70 +67,11 @@ end
  """
 function create_pool(; enable_auto_scale=false, auto_scale_formula=nothing, 
     auto_scale_evaluation_interval_minutes=nothing, image_resource_id=nothing, 
-    container_registry=nothing)
-
-    # Autoscaling?
-    for client in __clients__
-        create_blob_containers(client["blob_client"], [__container__])
-    end
-    
-    if enable_auto_scale
-        num_nodes = nothing
-    else
-        num_nodes = __params__["_NODE_COUNT_PER_POOL"]
-    end
-
-    # Internode?
-    enable_inter_node = parse(Bool, __params__["_INTER_NODE_CONNECTION"])
-
-    # Container?
-    if __params__["_CONTAINER"] == "None"
-        docker_container = nothing
-    else
-        docker_container = __params__["_CONTAINER"]
-    end
-
-    # Divide clients among pools
-    if ~isnothing(__credentials__)
-        credential_per_pool, clients_per_pool, resources_per_pool = divide_clients_among_pools()
-    else
-        __verbose__ && @warn "Could not create pool(s). No credentials were found."
-        return nothing
-    end
-    num_pools = parse(Int, __params__["_POOL_COUNT"])
-
-    # Create pools
-    for i=1:num_pools
-        pool_id = join([__params__["_POOL_ID"], "_", i])
-
-        # App insights?
-        if haskey(__credentials__[i], "_APP_INSIGHTS_APP_ID") && haskey(__credentials__[i], "_APP_INSIGHTS_INSTRUMENTATION_KEY")
-            app_insights = [__credentials__[i]["_APP_INSIGHTS_APP_ID"], __credentials__[i]["_APP_INSIGHTS_INSTRUMENTATION_KEY"]]
-        else
-            app_insights = nothing
-        end
-
-        try
-            azureclusterlesshpc.create_pool(clients_per_pool[i]["batch_client"], pool_id, __params__["_POOL_VM_SIZE"], num_nodes, 
-                __params__["_NODE_OS_PUBLISHER"], __params__["_NODE_OS_OFFER"], __params__["_NODE_OS_SKU"],
-                enable_inter_node=enable_inter_node, enable_auto_scale=enable_auto_scale, auto_scale_formula=auto_scale_formula, 
-                auto_scale_evaluation_interval_minutes=auto_scale_evaluation_interval_minutes, image_resource_id=image_resource_id,
-                container=docker_container, container_registry=container_registry, app_insights=app_insights)
+    container_registry=nothing, node_agent_sku_id=nothing)
 
-            # Keep track of active pools
-            __verbose__ && print(join(["Created pool ", i ," of ", num_pools, " in ", credential_per_pool[i]["_REGION"], " with ", num_nodes, " nodes.\n"]))
-            push!(__active_pools__, Dict("pool_id" => pool_id, "clients" => clients_per_pool[i], "credentials" => credential_per_pool[i],
-                "resources" => resources_per_pool[i]))
-        catch e
-            if typeof(e) == PyCall.PyError && e.val.error.code == "PoolExists"
-                __verbose__ && print(join(["Pool ", i ," of ", num_pools, " in ", credential_per_pool[i]["_REGION"]," already exists.\n"]))
-                push!(__active_pools__, Dict("pool_id" => pool_id, "clients" => clients_per_pool[i], "credentials" => credential_per_pool[i],
-                    "resources" => resources_per_pool[i]))
-            else
-                __verbose__ && print(join(["Failed to start pool ", i ," of ", num_pools, " in ", credential_per_pool[i]["_REGION"],". Verify that you have correct credentials, a batch account with AAD authentication and that pool parameters are correct.\n"]))
-            end
-        end
-    end
+    create_pools_from_params(nothing; enable_auto_scale=enable_auto_scale, auto_scale_formula=auto_scale_formula,
+        auto_scale_evaluation_interval_minutes=auto_scale_evaluation_interval_minutes, image_resource_id=image_resource_id,
+        container_registry=container_registry, node_agent_sku_id=node_agent_sku_id)
 end
 
 
@@ -153,6 +98,10 @@ end
 
  - `image_resource_id` (String): Image ID of the VM image.
 
+ - `node_agent_sku_id` (String): Node agent SKU of the custom VM image (e.g. `"batch.node.ubuntu 18.04"`). If omitted, 
+    the SKU is looked up from the supported VM images of the `_NODE_OS_*` parameters (cached). The lookup is skipped for 
+    custom images with an explicit SKU.
+
 
  *Output*:
 
@@ -161,7 +110,19 @@ end
  See also:  [`create_pool`](@ref)
  """
 function create_pool_and_resource_file(startup_script; enable_auto_scale=false, auto_scale_formula=nothing,
-    auto_scale_evaluation_interval_minutes=nothing, image_resource_id=nothing)
+    auto_scale_evaluation_interval_minutes=nothing, image_resource_id=nothing, node_agent_sku_id=nothing)
+
+    create_pools_from_params(startup_script; enable_auto_scale=enable_auto_scale, auto_scale_formula=auto_scale_formula,
+        auto_scale_evaluation_interval_minutes=auto_scale_evaluation_interval_minutes, image_resource_id=image_resource_id,
+        node_agent_sku_id=node_agent_sku_id)
+end
+
+
+# Create all pools of the parameter file concurrently (with an optional startup script that is uploaded once per
+# storage account) and add them to the active pools
+function create_pools_from_params(startup_script; enable_auto_scale=false, auto_scale_formula=nothing,
+    auto_scale_evaluation_interval_minutes=nothing, image_resource_id=nothing, container_registry=nothing,
+    node_agent_sku_id=nothing)
 
     # Create container if it doesn't exist
     for client in __clients__
@@ -172,7 +133,7 @@ function create_pool_and_resource_file(startup_script; enable_auto_scale=false,
     else
         num_nodes = __params__["_NODE_COUNT_PER_POOL"]
     end
-   
+
     # Enable inter node connection?
     enable_inter_node = parse(Bool, __params__["_INTER_NODE_CONNECTION"])
 
@@ -189,11 +150,12 @@ function create_pool_and_resource_file(startup_script; enable_auto_scale=false,
     else
         __verbose__ && @warn "Could not create pool(s). No credentials were found."
         return nothing
-    end    
+    end
     num_pools = parse(Int, __params__["_POOL_COUNT"])
 
+    # Pool specifications
+    specs = Array{Dict}(undef, 0)
     for i=1:num_pools
-        pool_id = join([__params__["_POOL_ID"], "_", i])
 
         # App insights?
         if haskey(__credentials__[i], "_APP_INSIGHTS_APP_ID") && haskey(__credentials__[i], "_APP_INSIGHTS_INSTRUMENTATION_KEY")
@@ -201,26 +163,79 @@ function create_pool_and_resource_file(startup_script; enable_auto_scale=false,
         else
             app_insights = nothing
         end
-        
-        try
-            azureclusterlesshpc.create_pool_and_resource_file(clients_per_pool[i], pool_id, __params__["_POOL_VM_SIZE"], num_nodes, 
-                __params__["_NODE_OS_PUBLISHER"], __params__["_NODE_OS_OFFER"], __params__["_NODE_OS_SKU"], startup_script, __container__; 
-                enable_inter_node=enable_inter_node, enable_auto_scale=enable_auto_scale, auto_scale_formula=auto_scale_formula, 
-                auto_scale_evaluation_interval_minutes=auto_scale_evaluation_interval_minutes, image_resource_id=image_resource_id,
-                container=docker_container, app_insights=app_insights)
-
-            # Keep track of active pools
+
+        push!(specs, Dict("clients" => clients_per_pool[i], "pool_id" => join([__params__["_POOL_ID"], "_", i]),
+            "pool_vm_size" => __params__["_POOL_VM_SIZE"], "pool_node_count" => num_nodes,
+            "node_os_publisher" => __params__["_NODE_OS_PUBLISHER"], "node_os_offer" => __params__["_NODE_OS_OFFER"],
+            "node_os_sku" => __params__["_NODE_OS_SKU"], "file_name" => startup_script, "container_name" => __container__,
+            "enable_inter_node" => enable_inter_node, "enable_auto_scale" => enable_auto_scale,
+            "auto_scale_formula" => auto_scale_formula,
+            "auto_scale_evaluation_interval_minutes" => auto_scale_evaluation_interval_minutes,
+            "image_resource_id" => image_resource_id, "container" => docker_container,
+            "container_registry" => container_registry, "app_insights" => app_insights,
+            "node_agent_sku_id" => node_agent_sku_id))
+    end
+
+    # Create pools concurrently
+    status = azureclusterlesshpc.create_pools(specs)
+    for i=1:num_pools
+        if status[i] == "created"
             __verbose__ && print(join(["Created pool ", i ," of ", num_pools, " in ", credential_per_pool[i]["_REGION"], " with ", num_nodes, " nodes.\n"]))
-            push!(__active_pools__, Dict("pool_id" => pool_id, "clients" => clients_per_pool[i], "credentials" => credential_per_pool[i],
-                "resources" => resources_per_pool[i]))
-        catch e
-            if typeof(e) == PyCall.PyError && e.val.error.code == "PoolExists"
-                __verbose__ && print(join(["Pool ", i ," of ", num_pools, " in ", credential_per_pool[i]["_REGION"]," already exists.\n"]))
-                push!(__active_pools__, Dict("pool_id" => pool_id, "clients" => clients_per_pool[i], "credentials" => credential_per_pool[i],
-                    "resources" => resources_per_pool[i]))
-            else
-                __verbose__ && print(join(["Failed to start pool ", i ," of ", num_pools, " in ", credential_per_pool[i]["_REGION"],". Verify that you have correct credentials, a batch account with AAD authentication and that pool parameters are correct.\n"]))
-            end
+        elseif status[i] == "exists"
+            __verbose__ && print(join(["Pool ", i ," of ", num_pools, " in ", credential_per_pool[i]["_REGION"]," already exists.\n"]))
+        else
+            __verbose__ && print(join(["Failed to start pool ", i ," of ", num_pools, " in ", credential_per_pool[i]["_REGION"],". Verify that you have correct credentials, a batch account with AAD authentication and that pool parameters are correct.\n"]))
+            continue
+        end
+
+        # Keep track of active pools
+        push!(__active_pools__, Dict("pool_id" => specs[i]["pool_id"], "clients" => clients_per_pool[i], "credentials" => credential_per_pool[i],
+            "resources" => resources_per_pool[i]))
+    end
+end
+
+
+"""
+    `wait_for_pools_ready(; min_idle_nodes=1, timeout=15)`
+
+ Wait until all active pools have reached a steady state with at least `min_idle_nodes` nodes that have completed their
+ start task. Call this function after `create_pool` or `create_pool_and_resource_file` to avoid that tasks of the first 
+ batch job wait in the queue while nodes are still being allocated.
+
+
+ *Optional keyword arguments*:
+
+ - `min_idle_nodes`: Minimum number of ready nodes per pool. Default is `1`.
+
+ - `timeout`: Timeout in minutes. Default is `15`.
+
+ *Output*:
+
+ - `ready`: `true` if all pools are ready, `false` otherwise.
+
+ *Usage*:
+
+ ```
+ create_pool_and_resource_file(startup_script)
+ wait_for_pools_ready(min_idle_nodes=2)
+ ```
+
+"""
+function wait_for_pools_ready(; min_idle_nodes=1, timeout=15)
+    length(__active_pools__) == 0 && return false
+    any(isnothing(pool["clients"]["batch_client"]) for pool in __active_pools__) && return true
+
+    batch_clients = [pool["clients"]["batch_client"] for pool in __active_pools__]
+    pool_ids = [pool["pool_id"] for pool in __active_pools__]
+    status = azureclusterlesshpc.wait_for_pools_ready(batch_clients, pool_ids; min_idle_nodes=min_idle_nodes,
+        timeout=timeout, verbose=__verbose__, polling_policy=create_polling_policy())
+
+    ready = true
+    for pool_id in pool_ids
+        if status[pool_id]["ready"] < min_idle_nodes
+            __verbose__ && print(join(["Pool ", pool_id, " has ", status[pool_id]["ready"], " of ", min_idle_nodes, " required nodes ready.\n"]))
+            ready = false
         end
     end
+    return ready
 end
\ No newline at end of file
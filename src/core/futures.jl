@@ -27,25 +27,20 @@ BatchFuture() = BatchFuture(nothing, nothing)
 # Fetch on a batch worker (if executed on user-side -> fetch data from blob)
 function fetch(arg::BatchFuture)
     try
-        iostream = open(arg.blob.name, "r")
-        data = deserialize(iostream)
-        close(iostream)
-        return data
+        return deserialize_file(arg.blob.name)
     catch
         iostream = __clients__[1]["blob_client"].get_blob_to_bytes(arg.container, arg.blob.name)
-        return deserialize(IOBuffer(iostream.content))
+        return deserialize_payload(iostream.content)
     end
 end
 
 function fetch!(arg::BatchFuture)
     data = nothing
     try
-        iostream = open(arg.blob.name, "r")
-        data = deserialize(iostream)
-        close(iostream)
+        data = deserialize_file(arg.blob.name)
     catch
         iostream = __clients__[1]["blob_client"].get_blob_to_bytes(arg.container, arg.blob.name)
-        data = deserialize(IOBuffer(iostream.content))
+        data = deserialize_payload(iostream.content)
     end
     arg.blob = data 
     return arg.blob
@@ -73,15 +68,10 @@ function fetch(arg::FileFuture; path=pwd(), destroy_blob=false)
     try
         num_files = length(arg.blob.name)
         out_files = []
-        for blob in arg.blob.name
-
-            # Fetch blob and add to collection
-            if ~isnothing(__clients__[i]["blob_client"])
-                __clients__[1]["blob_client"].get_blob_to_path(arg.container, blob, joinpath(path, blob))
-
-                # Delete blob (default is true)
-                destroy_blob && __clients__[i]["blob_client"].delete_blob(arg.container, blob)
-            end
+        if ~isnothing(__clients__[i]["blob_client"])
+            files = download_blobs(__clients__[i]["blob_client"], arg.container, arg.blob.name; into=path, 
+                delete=destroy_blob)
+            any(isnothing, files) && throw("Blob download failed.")
         end
     catch
         throw("Blob does not (yet) exist or BlobFuture does not contain a proper blob reference.")
@@ -115,16 +105,10 @@ function fetch(arg::BlobFuture; destroy_blob=false)
     try
         num_files = length(arg.blob.name)
         out_files = []
-        for blob in arg.blob.name
-
-            # Fetch blob and add to collection
-            if ~isnothing(__clients__[i]["blob_client"])
-                iostream = __clients__[i]["blob_client"].get_blob_to_bytes(arg.container, blob)
-                push!(out_files, deserialize(IOBuffer(iostream.content)))
-
-                # Delete blob (default is true)
-                destroy_blob && __clients__[i]["blob_client"].delete_blob(arg.container, blob)
-            end
+        if ~isnothing(__clients__[i]["blob_client"])
+            out_files, success = fetch_blobs(__clients__[i]["blob_client"], arg.container, arg.blob.name; 
+                destroy_blob=destroy_blob)
+            ~all(success) && throw("Blob download failed.")
         end
         
         if num_files > 1
@@ -147,16 +131,10 @@ function fetch!(arg::BlobFuture; destroy_blob=false)
     try
         num_files = length(arg.blob.name)
         out_files = []
-        for blob in arg.blob.name
-
-            # Fetch blob and add to collection
-            if ~isnothing(__clients__[i]["blob_client"])
-                iostream = __clients__[i]["blob_client"].get_blob_to_bytes(arg.container, blob)
-                push!(out_files, deserialize(IOBuffer(iostream.content)))
-
-                # Delete blob (default is true)
-                destroy_blob && __clients__[i]["blob_client"].delete_blob(arg.container, blob)
-            end
+        if ~isnothing(__clients__[i]["blob_client"])
+            out_files, success = fetch_blobs(__clients__[i]["blob_client"], arg.container, arg.blob.name; 
+                destroy_blob=destroy_blob)
+            ~all(success) && throw("Blob download failed.")
         end
         
         if num_files > 1
@@ -200,12 +178,11 @@ function migrate(arg::BlobFuture, destination; delete_blob=true)
     for (name, blob) in zip(arg.blob.name, blobs)
 
         # Serialize variable
-        iobuff = IOBuffer()
-        AzureClusterlessHPC.serialize(iobuff, blob)   # eval in local scope
-        binary = iobuff.data
+        binary, compression = serialize_payload(blob; compression_options()...)
 
         # Create new resource
-        upload_bytes_to_container(__clients__[destination]["blob_client"], arg.container, name, binary; verbose=__verbose__)
+        upload_bytes_to_container(__clients__[destination]["blob_client"], arg.container, name, binary; verbose=__verbose__,
+            compression=compression)
 
         # Remove old blob
         if delete_blob
@@ -239,12 +216,11 @@ function migrate!(arg::BlobFuture, destination; delete_blob=true)
     for (name, blob) in zip(arg.blob.name, blobs)
 
         # Serialize variable
-        iobuff = IOBuffer()
-        AzureClusterlessHPC.serialize(iobuff, blob)   # eval in local scope
-        binary = iobuff.data
+        binary, compression = serialize_payload(blob; compression_options()...)
 
         # Create new resource
-        upload_bytes_to_container(__clients__[destination]["blob_client"], arg.container, name, binary; verbose=__verbose__)
+        upload_bytes_to_container(__clients__[destination]["blob_client"], arg.container, name, binary; verbose=__verbose__,
+            compression=compression)
 
         # Remove old blob
         if delete_blob
@@ -7,49 +7,119 @@ import azure.storage.blob as azureblob
 import azure.storage.queue as azurequeue
 import azure.batch.models as batchmodels
 import azure.batch as batch
+from azure.common import AzureHttpError
 from azure.common.credentials import ServicePrincipalCredentials
 import azure.batch._batch_service_client as batchServiceClient
-import datetime, os, sys, time, warnings
+import azureclusterlesshpc_local
+import azureclusterlesshpc_stats
+import base64, collections, concurrent.futures, copy, datetime, hashlib, json, mmap, os, random, requests, sqlite3, sys, threading, time, warnings
 
 
 ###################################################################################################
 # Create clients
 
-def create_batch_client(credentials):
+# Process-wide registry of clients keyed by credential identity (account and key/secret hash). Clients and their 
+# HTTP sessions are shared by all pools and calls that use the same account.
+HTTP_POOL_SIZE = 32
+_client_registry = {}
+_client_registry_lock = threading.Lock()
 
-    credentials_batch = ServicePrincipalCredentials(
-        client_id = credentials['_AD_BATCH_CLIENT_ID'],
-        secret = credentials['_AD_SECRET_BATCH'],
-        tenant = credentials['_AD_TENANT'],
-        resource = credentials['_BATCH_RESOURCE']
-    )
+# Number of connections per host of new HTTP sessions (should cover concurrent uploads/downloads and polling)
+def configure_http_pool(pool_size=32):
+    global HTTP_POOL_SIZE
+    HTTP_POOL_SIZE = pool_size
 
-    # Batch client
-    batch_client = batch.BatchServiceClient(
-        credentials_batch,
-        batch_url = credentials['_BATCH_ACCOUNT_URL']
-    )
-    return batch_client
+
+def mount_http_adapters(session, pool_size=None):
+    pool_size = HTTP_POOL_SIZE if pool_size is None else pool_size
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_registered_client(key, create):
+    with _client_registry_lock:
+        if key not in _client_registry:
+            _client_registry[key] = create()
+        return _client_registry[key]
+
+
+def clear_client_registry():
+    with _client_registry_lock:
+        _client_registry.clear()
 
 
-def create_blob_client(credentials):
+def credential_hash(secret):
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()
+
+
+def create_batch_client(credentials, cached=True):
+
+    # Local stand-in for the batch service
+    if '_LOCAL_SERVICE' in credentials:
+        return azureclusterlesshpc_stats.instrument_client(azureclusterlesshpc_local.create_batch_client(credentials), 
+            'batch')
+
+    def create():
+        credentials_batch = ServicePrincipalCredentials(
+            client_id = credentials['_AD_BATCH_CLIENT_ID'],
+            secret = credentials['_AD_SECRET_BATCH'],
+            tenant = credentials['_AD_TENANT'],
+            resource = credentials['_BATCH_RESOURCE']
+        )
+
+        # Batch client. Its connection pools are not resized: the batch SDK keeps one HTTP session per thread, so 
+        # concurrent calls already use separate connections.
+        batch_client = batch.BatchServiceClient(
+            credentials_batch,
+            batch_url = credentials['_BATCH_ACCOUNT_URL']
+        )
+        return azureclusterlesshpc_stats.instrument_client(batch_client, 'batch')
+
+    if not cached:
+        return create()
+    key = ('batch', credentials['_BATCH_ACCOUNT_URL'], credentials['_AD_TENANT'], credentials['_AD_BATCH_CLIENT_ID'],
+        credential_hash(credentials['_AD_SECRET_BATCH']))
+    return get_registered_client(key, create)
+
+
+def create_blob_client(credentials, cached=True):
+
+    # Local stand-in for the blob service
+    if '_LOCAL_SERVICE' in credentials:
+        return azureclusterlesshpc_stats.instrument_client(azureclusterlesshpc_local.create_blob_client(credentials), 
+            'blob')
 
     # Storage blob client (cannot be AAD based)
-    blob_client = azureblob.BlockBlobService(
+    create = lambda: azureclusterlesshpc_stats.instrument_client(azureblob.BlockBlobService(
         account_name = credentials['_STORAGE_ACCOUNT_NAME'],
-        account_key = credentials['_STORAGE_ACCOUNT_KEY']
-    )
-    return blob_client
+        account_key = credentials['_STORAGE_ACCOUNT_KEY'],
+        request_session = mount_http_adapters(requests.Session())
+    ), 'blob')
+    if not cached:
+        return create()
+    key = ('blob', credentials['_STORAGE_ACCOUNT_NAME'], credential_hash(credentials['_STORAGE_ACCOUNT_KEY']))
+    return get_registered_client(key, create)
+
 
+def create_queue_client(credentials, cached=True):
 
-def create_queue_client(credentials):
+    # Local stand-in for the queue service
+    if '_LOCAL_SERVICE' in credentials:
+        return azureclusterlesshpc_stats.instrument_client(azureclusterlesshpc_local.create_queue_client(credentials), 
+            'queue')
 
     # Storage queue client
-    queue_client = azurequeue.QueueService(
+    create = lambda: azureclusterlesshpc_stats.instrument_client(azurequeue.QueueService(
         account_name = credentials['_STORAGE_ACCOUNT_NAME'],
-        account_key = credentials['_STORAGE_ACCOUNT_KEY']
-    )
-    return queue_client
+        account_key = credentials['_STORAGE_ACCOUNT_KEY'],
+        request_session = mount_http_adapters(requests.Session())
+    ), 'queue')
+    if not cached:
+        return create()
+    key = ('queue', credentials['_STORAGE_ACCOUNT_NAME'], credential_hash(credentials['_STORAGE_ACCOUNT_KEY']))
+    return get_registered_client(key, create)
 
 
 # Collect clients in dictionary
@@ -73,6 +143,33 @@ def create_clients(credentials, batch=False, blob=False, queue=False):
     return {"batch_client": batch_client, "blob_client": blob_client, "queue_client": queue_client}
 
 
+###################################################################################################
+# Call statistics
+
+# Summary of all calls of the batch, blob and queue clients per operation (calls, errors, throttled requests, 
+# retries, bytes sent/received and latencies) and totals over all operations
+def get_stats(reset=False):
+    return azureclusterlesshpc_stats.metrics.get_stats(reset=reset)
+
+
+def reset_stats():
+    azureclusterlesshpc_stats.metrics.reset()
+
+
+def enable_stats(enabled=True):
+    azureclusterlesshpc_stats.metrics.enabled = enabled
+
+
+# Register a callback that is called with a dictionary (operation, seconds, bytes_sent, bytes_received, error, 
+# throttled, retry) after every call, e.g. azureclusterlesshpc_stats.PrometheusHook()
+def add_stats_hook(hook):
+    return azureclusterlesshpc_stats.metrics.add_hook(hook)
+
+
+def remove_stats_hook(hook):
+    azureclusterlesshpc_stats.metrics.remove_hook(hook)
+
+
 ###################################################################################################
 # Blob stuff
 
@@ -81,6 +178,14 @@ def create_blob_containers(blob_client, container_name_list):
         blob_client.create_container(container, fail_on_exist=False)
     return True
 
+
+# Delete a container and the upload cache entries of its blobs
+def delete_blob_container(blob_client, container_name):
+    cache = get_upload_cache()
+    if cache is not None:
+        cache.discard_container(blob_client, container_name)
+    return blob_client.delete_container(container_name)
+
 def create_sas_token(
         blob_client, container_name, blob_name, permission, expiry=None,
         timeout=None):
@@ -123,54 +228,459 @@ def upload_blob_and_create_sas(
 
     return sas_url
 
-def upload_files_to_blob(blob_client, container_name, file_paths, verbose=True):
+# Content-hash keyed upload cache. Uploaded blobs are tagged with the SHA-256 of their content (blob metadata) and
+# a local SQLite index maps files (path, mtime, size) to their hash and blobs to the hash of their last upload.
+# Uploads are skipped if the blob in the container still has the same hash.
+class UploadCache(object):
+
+    def __init__(self, path, validation_ttl=24*3600):
+        if os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.validation_ttl = validation_ttl
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        with self.lock, self.db:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, sha256 TEXT)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS blobs (account TEXT, container TEXT, blob TEXT, sha256 TEXT, url TEXT, '
+                'PRIMARY KEY (account, container, blob))')
+            try:
+                self.db.execute('ALTER TABLE blobs ADD COLUMN verified REAL')    # caches of earlier versions
+            except sqlite3.OperationalError:
+                pass
+
+    def file_hash(self, path):
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.db.execute('SELECT sha256 FROM files WHERE path=? AND mtime=? AND size=?', 
+                (path, stat.st_mtime_ns, stat.st_size)).fetchone()
+        if row is not None:
+            return row[0]
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as fid:
+            for block in iter(lambda: fid.read(4*1024*1024), b''):
+                sha256.update(block)
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', 
+                (path, stat.st_mtime_ns, stat.st_size, sha256.hexdigest()))
+        return sha256.hexdigest()
+
+    # True if the file has not been modified since its hash was computed
+    def file_unchanged(self, path, sha256):
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.db.execute('SELECT sha256 FROM files WHERE path=? AND mtime=? AND size=?', 
+                (path, stat.st_mtime_ns, stat.st_size)).fetchone()
+        return row is not None and row[0] == sha256
+
+    # Check if blob with the given content exists. Entries are trusted for validation_ttl seconds after the upload or
+    # the last validation, after which they are validated against the blob's metadata.
+    def contains(self, blob_client, container_name, blob_name, sha256):
+        with self.lock:
+            row = self.db.execute('SELECT sha256, verified FROM blobs WHERE account=? AND container=? AND blob=?', 
+                (blob_client.account_name, container_name, blob_name)).fetchone()
+        if row is None or row[0] != sha256:
+            return False
+        if row[1] is not None and time.time() - row[1] < self.validation_ttl:
+            return True
+        try:
+            metadata = blob_client.get_blob_properties(container_name, blob_name).metadata
+        except Exception:
+            metadata = None
+        if metadata is None or metadata.get('sha256') != sha256:
+            self.discard(blob_client, container_name, blob_name)
+            return False
+        self.add(blob_client, container_name, blob_name, sha256)
+        return True
+
+    def add(self, blob_client, container_name, blob_name, sha256):
+        url = blob_client.make_blob_url(container_name, blob_name)
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)', 
+                (blob_client.account_name, container_name, blob_name, sha256, url, time.time()))
+
+    def discard(self, blob_client, container_name, blob_name):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM blobs WHERE account=? AND container=? AND blob=?', 
+                (blob_client.account_name, container_name, blob_name))
+
+    def discard_container(self, blob_client, container_name):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM blobs WHERE account=? AND container=?', 
+                (blob_client.account_name, container_name))
+
+
+# Remove the content hash of a blob whose source was modified during the upload (the uploaded content is unknown)
+def forget_uploaded_hash(cache, blob_client, container_name, blob_name):
+    cache.discard(blob_client, container_name, blob_name)
+    blob_client.set_blob_metadata(container_name, blob_name, metadata={})
+
+
+UPLOAD_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.azureclusterlesshpc', 'upload_cache.sqlite')
+_upload_cache = None
+
+def get_upload_cache(path=None):
+    global _upload_cache
+    if path is not None:
+        return UploadCache(path)
+    if _upload_cache is None:
+        try:
+            _upload_cache = UploadCache(UPLOAD_CACHE_PATH)
+        except Exception as e:
+            warnings.warn('Could not open upload cache {} ({}). Uploads are not cached.'.format(UPLOAD_CACHE_PATH, e))
+            _upload_cache = False
+    return _upload_cache or None
+
+
+# Upload (blob name, source) pairs concurrently. Sources are file paths or file objects, which are streamed 
+# in blocks. Each blob is uploaded with max_connections parallel block uploads. Files whose content already
+# exists in the container are skipped if use_cache=True. Returns upload statistics.
+def upload_blobs(blob_client, container_name, uploads, max_workers=8, max_connections=2, verbose=True, use_cache=True):
+
+    cache = get_upload_cache() if use_cache else None
+
+    def upload(blob_name, source):
+        if isinstance(source, str):
+            sha256 = None if cache is None else cache.file_hash(source)
+            if sha256 is not None and cache.contains(blob_client, container_name, blob_name, sha256):
+                if verbose:
+                    print('File {} is unchanged in blob container [{}].'.format(source, container_name))
+                return 0
+            if verbose:
+                print('Uploading file {} to blob container [{}]...'.format(source, container_name))
+            blob_client.create_blob_from_path(container_name, blob_name, source, max_connections=max_connections,
+                metadata=None if sha256 is None else {'sha256': sha256})
+            if sha256 is not None:
+                if cache.file_unchanged(source, sha256):
+                    cache.add(blob_client, container_name, blob_name, sha256)
+                else:
+                    forget_uploaded_hash(cache, blob_client, container_name, blob_name)
+            return os.path.getsize(source)
+        else:
+            if verbose:
+                print('Uploading file {} to blob container [{}]...'.format(blob_name, container_name))
+            start = source.tell()
+            blob_client.create_blob_from_stream(container_name, blob_name, source, max_connections=max_connections)
+            return source.tell() - start
+
+    tstart = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(upload, blob_name, source) for (blob_name, source) in uploads]
+        num_bytes = sum(future.result() for future in futures)
+    runtime = time.time() - tstart
+
+    stats = {"files": len(uploads), "bytes": num_bytes, "seconds": runtime, 
+        "throughput": num_bytes / runtime if runtime > 0 else 0.0}
+    if verbose and len(uploads) > 1:
+        print('Uploaded {} files ({:.2f} MB) in {:.2f} s ({:.2f} MB/s).'.format(stats["files"], num_bytes / 1e6, 
+            runtime, stats["throughput"] / 1e6))
+    return stats
+
+
+def upload_files_to_blob(blob_client, container_name, file_paths, verbose=True, max_workers=8, max_connections=2,
+    use_cache=True):
+
+    blob_names = [os.path.basename(path_to_file) for path_to_file in file_paths]
+    upload_blobs(blob_client, container_name, list(zip(blob_names, file_paths)), max_workers=max_workers,
+        max_connections=max_connections, verbose=verbose, use_cache=use_cache)
+    return blob_names
+
 
-    blob_names = list()
-    for path_to_file in file_paths:
-        blob_name = os.path.basename(path_to_file)
+# Upload file objects (e.g. open files) without loading them into memory
+def upload_streams_to_blob(blob_client, container_name, blob_names, streams, verbose=True, max_workers=8, 
+    max_connections=2):
 
-        if verbose:
-            print('Uploading file {} to blob container [{}]...'.format(path_to_file, container_name))
+    upload_blobs(blob_client, container_name, list(zip(blob_names, streams)), max_workers=max_workers,
+        max_connections=max_connections, verbose=verbose, use_cache=False)
+    return list(blob_names)
 
-        blob_client.create_blob_from_path(container_name, blob_name, path_to_file)
-        blob_names.append(blob_name)
+# Seekable read-only stream over a buffer. Reads return copies of at most the requested block size, so buffers are
+# uploaded in blocks without copying the full buffer
+class BufferReader(object):
 
-    return blob_names
+    def __init__(self, buffer):
+        self.view = memoryview(buffer).cast('B')
+        self.position = 0
+
+    def read(self, size=-1):
+        end = self.view.nbytes if size is None or size < 0 else min(self.position + size, self.view.nbytes)
+        data = self.view[self.position:end].tobytes()
+        self.position = max(self.position, end)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.view.nbytes
+        self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def seekable(self):
+        return True
+
+
+# Upload any buffer-protocol object (bytes, bytearray, memoryview, numpy array, mmap) without copying it. For
+# buffers that map a file, source_path is checked for modifications during the upload. Buffers are usually
+# serialized per run (e.g. task ASTs), so they are only looked up in the upload cache if use_cache=True. The codec
+# of compressed payloads is stored in the blob metadata (not as Content-Encoding, which HTTP clients would decode).
+def upload_bytes_to_container(blob_client, container_name, blob_name, blob, verbose=True, use_cache=False,
+    max_connections=2, compression=None, source_path=None):
+
+    view = memoryview(blob).cast('B')
+    cache = get_upload_cache() if use_cache else None
+    source_stat = None if source_path is None else os.stat(source_path)
+    sha256 = None if cache is None else hashlib.sha256(view).hexdigest()
+    if sha256 is not None and cache.contains(blob_client, container_name, blob_name, sha256):
+        if verbose:
+            print('File {} is unchanged in container [{}].'.format(blob_name, container_name))
+        return [blob_name]
 
-def upload_bytes_to_container(blob_client, container_name, blob_name, blob, verbose=True):
     if verbose:
         print('Uploading file {} to container [{}]...'.format(blob_name, container_name))
     
-    blob_client.create_blob_from_bytes(container_name, blob_name, bytes(blob))
+    metadata = {}
+    if sha256 is not None:
+        metadata['sha256'] = sha256
+    if compression is not None:
+        metadata['compression'] = compression
+    blob_client.create_blob_from_stream(container_name, blob_name, BufferReader(view), count=view.nbytes,
+        max_connections=max_connections, metadata=metadata or None)
+    if sha256 is not None:
+        stat = None if source_path is None else os.stat(source_path)
+        if stat is None or (stat.st_mtime_ns, stat.st_size) == (source_stat.st_mtime_ns, source_stat.st_size):
+            cache.add(blob_client, container_name, blob_name, sha256)
+        else:
+            forget_uploaded_hash(cache, blob_client, container_name, blob_name)
     return [blob_name]
 
 
-def create_blob_url(blob_client, container_name, blob_list):
+# Upload length bytes of a file starting at offset (default is the whole file) from a memory map
+def upload_file_range(blob_client, container_name, blob_name, file_path, offset=0, length=None, verbose=True,
+    use_cache=True, max_connections=2):
+
+    if length is None:
+        length = os.path.getsize(file_path) - offset
+    if length == 0:
+        return upload_bytes_to_container(blob_client, container_name, blob_name, b'', verbose=verbose, 
+            use_cache=use_cache, max_connections=max_connections)
+
+    # Memory maps have to start at a multiple of the allocation granularity
+    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+    with open(file_path, 'rb') as fid:
+        with mmap.mmap(fid.fileno(), length + offset - start, access=mmap.ACCESS_READ, offset=start) as buffer:
+            view = memoryview(buffer)[offset - start:]
+            try:
+                return upload_bytes_to_container(blob_client, container_name, blob_name, view, verbose=verbose, 
+                    use_cache=use_cache, max_connections=max_connections, source_path=file_path)
+            finally:
+                view.release()
+
+
+# Writable stream over a preallocated buffer, starting at a given offset
+class BufferWriter(object):
+
+    def __init__(self, buffer, offset=0):
+        self.view = memoryview(buffer).cast('B')
+        self.position = offset
+
+    def write(self, data):
+        self.view[self.position:self.position + len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+# Download blobs concurrently with ranged GETs of chunk_size bytes. Blobs are written into preallocated buffers:
+# into=None allocates one bytearray per blob, a list of writable buffers (bytearray, memoryview, numpy array) or
+# file paths uses the given targets and a directory name writes blob_name into that directory. Chunks are locked
+# on the etag of the first chunk. Returns the buffers (trimmed to the blob size) or file paths, and None for blobs
+# that could not be read. If delete=True, blobs are deleted once they have been read completely.
+def download_blobs(blob_client, container_name, blob_names, max_workers=8, into=None, delete=False,
+    chunk_size=4*1024*1024, verbose=False):
+
+    num_blobs = len(blob_names)
+    if into is None:
+        targets = [None] * num_blobs
+    elif isinstance(into, str):
+        targets = [os.path.join(into, blob_name) for blob_name in blob_names]
+    else:
+        targets = list(into)
+        if len(targets) != num_blobs:
+            raise ValueError('Number of targets ({}) does not match number of blobs ({}).'.format(len(targets),
+                num_blobs))
+
+    results = [None] * num_blobs
+    etags = [None] * num_blobs
+
+    def open_target(i, size):
+        target = targets[i]
+        if target is None:
+            return bytearray(size)
+        elif isinstance(target, str):
+            if os.path.dirname(target) != '':
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as stream:
+                stream.truncate(size)
+            return target
+        else:
+            view = memoryview(target).cast('B')
+            if view.nbytes < size:
+                raise ValueError('Buffer for blob {} is too small ({} < {} bytes).'.format(blob_names[i], view.nbytes,
+                    size))
+            return view[:size]
+
+    def write(i, offset, data):
+        if isinstance(results[i], str):
+            with open(results[i], 'r+b') as stream:
+                stream.seek(offset)
+                stream.write(data)
+        else:
+            BufferWriter(results[i], offset).write(data)
+
+    # First chunk also returns the blob size and etag
+    def download_first_chunk(i):
+        try:
+            blob = blob_client.get_blob_to_bytes(container_name, blob_names[i], start_range=0,
+                end_range=chunk_size - 1, max_connections=1)
+            size = int(blob.properties.content_range.split('/')[-1])
+        except AzureHttpError as e:
+            if e.status_code != 416:
+                raise
+            # Empty blob
+            blob = blob_client.get_blob_to_bytes(container_name, blob_names[i], max_connections=1)
+            size = 0
+        etags[i] = blob.properties.etag
+        results[i] = open_target(i, size)
+        write(i, 0, blob.content)
+        return [(start, min(start + chunk_size, size) - 1) for start in range(chunk_size, size, chunk_size)]
+
+    def download_chunk(i, start, end):
+        if isinstance(results[i], str):
+            with open(results[i], 'r+b') as stream:
+                stream.seek(start)
+                blob_client.get_blob_to_stream(container_name, blob_names[i], stream, start_range=start,
+                    end_range=end, max_connections=1, if_match=etags[i])
+        else:
+            blob_client.get_blob_to_stream(container_name, blob_names[i], BufferWriter(results[i], start),
+                start_range=start, end_range=end, max_connections=1, if_match=etags[i])
+        return []
+
+    tstart = time.time()
+    remaining = [1] * num_blobs
+    failed = set()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(download_first_chunk, i): (i, 'get') for i in range(num_blobs)}
+        while len(pending) > 0:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                i, operation = pending.pop(future)
+                try:
+                    ranges = future.result()
+                except Exception as e:
+                    if operation == 'delete':
+                        warnings.warn('Could not delete blob {}: {}'.format(blob_names[i], e))
+                        continue
+                    if i not in failed:
+                        warnings.warn('Could not download blob {}: {}'.format(blob_names[i], e))
+                        failed.add(i)
+                    ranges = []
+                if operation == 'delete':
+                    continue
+
+                # Schedule remaining chunks and delete blob once it has been read completely
+                for (start, end) in ranges:
+                    pending[executor.submit(download_chunk, i, start, end)] = (i, 'get')
+                remaining[i] += len(ranges) - 1
+                if remaining[i] == 0 and delete and i not in failed:
+                    pending[executor.submit(blob_client.delete_blob, container_name, blob_names[i])] = (i, 'delete')
+    runtime = time.time() - tstart
+
+    # Discard partial downloads
+    for i in failed:
+        if isinstance(results[i], str) and targets[i] is not None and os.path.isfile(results[i]):
+            os.remove(results[i])
+        results[i] = None
+
+    if verbose:
+        num_bytes = sum(os.path.getsize(result) if isinstance(result, str) else len(result)
+            for result in results if result is not None)
+        print('Downloaded {} blobs ({:.2f} MB) in {:.2f} s ({:.2f} MB/s).'.format(num_blobs - len(failed),
+            num_bytes / 1e6, runtime, num_bytes / runtime / 1e6 if runtime > 0 else 0.0))
+    return results
+
+
+# Cache of SAS tokens keyed by (account, container, blob, permission). Container-level tokens use blob=None. 
+# Tokens are valid for ttl and are regenerated once they expire within refresh_margin.
+class SasCache(object):
+
+    def __init__(self, ttl=datetime.timedelta(hours=999), refresh_margin=datetime.timedelta(hours=1)):
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def get(self, blob_client, container_name, blob_name, permission):
+        key = (blob_client.account_name, container_name, blob_name, str(permission))
+        now = datetime.datetime.utcnow()
+        with self.lock:
+            entry = self.tokens.get(key)
+            if entry is None or entry[1] - now < self.refresh_margin:
+                expiry = now + self.ttl
+                if blob_name is None:
+                    token = blob_client.generate_container_shared_access_signature(container_name, 
+                        permission=permission, expiry=expiry)
+                else:
+                    token = blob_client.generate_blob_shared_access_signature(container_name, blob_name, 
+                        permission=permission, expiry=expiry)
+                entry = (token, expiry)
+                self.tokens[key] = entry
+        return entry[0]
+
+    def clear(self):
+        with self.lock:
+            self.tokens = {}
+
+
+_sas_cache = SasCache()
+
+def configure_sas_cache(ttl_hours=999, refresh_margin_hours=1):
+    global _sas_cache
+    _sas_cache = SasCache(ttl=datetime.timedelta(hours=ttl_hours), 
+        refresh_margin=datetime.timedelta(hours=refresh_margin_hours))
+    return _sas_cache
+
+
+# Create read-only SAS urls for a list of blobs. If shared=True, all urls use one container-level SAS.
+def create_blob_urls(blob_client, container_name, blob_list, shared=False):
+
+    if shared:
+        sas_token = _sas_cache.get(blob_client, container_name, None, azureblob.BlobPermissions.READ)
+        return [blob_client.make_blob_url(container_name, blob_name, sas_token=sas_token) for blob_name in blob_list]
 
     sas_urls = list()
     for blob_name in blob_list:
-        sas_token = blob_client.generate_blob_shared_access_signature(
-            container_name,
-            blob_name,
-            permission=azureblob.BlobPermissions.READ,
-            expiry=datetime.datetime.utcnow() + datetime.timedelta(hours=999))
-
+        sas_token = _sas_cache.get(blob_client, container_name, blob_name, azureblob.BlobPermissions.READ)
         sas_urls.append(blob_client.make_blob_url(container_name,
                                                 blob_name,
                                                 sas_token=sas_token))
     return sas_urls
 
 
+def create_blob_url(blob_client, container_name, blob_list):
+    return create_blob_urls(blob_client, container_name, blob_list)
+
+
 def get_container_sas_token(blob_client, container_name, blob_permissions):
 
-    # Obtain the SAS token for the container, setting the expiry time and
+    # Obtain the (cached) SAS token for the container, setting the expiry time and
     # permissions. In this case, no start time is specified, so the shared
-    # access signature becomes valid immediately. Expiration is in 999 hours.
-    container_sas_token = \
-        blob_client.generate_container_shared_access_signature(
-            container_name,
-            permission=blob_permissions,
-            expiry=datetime.datetime.utcnow() + datetime.timedelta(hours=999))
+    # access signature becomes valid immediately.
+    container_sas_token = _sas_cache.get(blob_client, container_name, None, blob_permissions)
 
     return container_sas_token
 
@@ -186,18 +696,39 @@ def get_container_sas_url(blob_client, storage_account_name, container_name, blo
     return container_sas_url
 
 
-def create_batch_output_file(blob_client, storage_account_name, container_name, filename):
-    
-    output_container_sas_url = get_container_sas_url(blob_client, storage_account_name, container_name, 
-        azureblob.BlobPermissions.WRITE)
+# Job-scoped builder for task output files. All output files share one destination (with the container SAS url)
+# and one upload options object.
+class OutputFileBuilder(object):
 
-    destination = batchmodels.OutputFileDestination(container = 
-        batchmodels.OutputFileBlobContainerDestination(container_url=output_container_sas_url))
-    
-    upload_options = batchmodels.OutputFileUploadOptions(upload_condition=batchmodels.OutputFileUploadCondition.task_success)
-    output_files = batchmodels.OutputFile(file_pattern=filename, destination=destination, upload_options=upload_options)
+    def __init__(self, blob_client, storage_account_name, container_name):
+        output_container_sas_url = get_container_sas_url(blob_client, storage_account_name, container_name, 
+            azureblob.BlobPermissions.WRITE)
+        self.destination = batchmodels.OutputFileDestination(container = 
+            batchmodels.OutputFileBlobContainerDestination(container_url=output_container_sas_url))
+        self.upload_options = batchmodels.OutputFileUploadOptions(
+            upload_condition=batchmodels.OutputFileUploadCondition.task_success)
+
+    def output_files(self, filenames):
+        return [batchmodels.OutputFile(file_pattern=filename, destination=self.destination, 
+            upload_options=self.upload_options) for filename in filenames]
+
+    # Single output file that uploads all files starting with prefix (e.g. task_17_*)
+    def output_file_pattern(self, prefix):
+        return self.output_files([prefix + '*'])
 
-    return [output_files]
+    # Output files for N tasks from a list of filenames (or prefixes if wildcard=True) per task
+    def output_files_per_task(self, filenames_per_task, wildcard=False):
+        if wildcard:
+            return [self.output_file_pattern(prefix) for prefix in filenames_per_task]
+        return [self.output_files(filenames) for filenames in filenames_per_task]
+
+
+def create_output_file_builder(blob_client, storage_account_name, container_name):
+    return OutputFileBuilder(blob_client, storage_account_name, container_name)
+
+
+def create_batch_output_file(blob_client, storage_account_name, container_name, filename):
+    return OutputFileBuilder(blob_client, storage_account_name, container_name).output_files([filename])
 
 
 ###################################################################################################
@@ -241,11 +772,68 @@ def select_latest_verified_vm_image_with_node_agent_sku(
     agent_sku_id, image_ref_to_use = skus_to_use[0]
     return (agent_sku_id, image_ref_to_use)
 
+
+# Memoized VM image lookup with on-disk cache (entries expire after ttl_hours), keyed by 
+# (batch account, publisher, offer, sku prefix)
+VM_IMAGE_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.azureclusterlesshpc', 'vm_images.json')
+_vm_image_cache = {}
+_vm_image_cache_lock = threading.Lock()
+
+def read_vm_image_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as fid:
+            return json.load(fid)
+    except Exception:
+        return {}
+
+
+def write_vm_image_cache(cache_path, key, entry, ttl_hours=24):
+    try:
+        now = time.time()
+        cache = {k: v for k, v in read_vm_image_cache(cache_path).items()
+            if now - v.get('time', 0) < ttl_hours * 3600}
+        cache[key] = entry
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path + '.tmp', 'w') as fid:
+            json.dump(cache, fid)
+        os.replace(cache_path + '.tmp', cache_path)
+    except Exception as e:
+        warnings.warn('Could not write VM image cache {} ({}).'.format(cache_path, e))
+
+
+def resolve_vm_image(batch_client, publisher, offer, sku_starts_with, ttl_hours=24, cache_path=VM_IMAGE_CACHE_PATH):
+
+    # Clients without a batch url are only cached in memory
+    batch_url = getattr(getattr(batch_client, 'config', None), 'batch_url', None)
+    account = batch_url or 'client-{}'.format(id(batch_client))
+    key = '|'.join([account, publisher.lower(), offer.lower(), sku_starts_with])
+    is_valid = lambda entry: entry is not None and time.time() - entry['time'] < ttl_hours * 3600
+
+    with _vm_image_cache_lock:
+        entry = _vm_image_cache.get(key)
+        if not is_valid(entry) and batch_url is not None:
+            entry = read_vm_image_cache(cache_path).get(key)
+            if is_valid(entry):
+                _vm_image_cache[key] = entry
+
+    # List supported images outside the lock, so that lookups for other accounts are not serialized
+    if not is_valid(entry):
+        agent_sku_id, image_ref = select_latest_verified_vm_image_with_node_agent_sku(
+            batch_client, publisher, offer, sku_starts_with)
+        entry = {"time": time.time(), "node_agent_sku_id": agent_sku_id, "image_reference": image_ref.serialize()}
+        with _vm_image_cache_lock:
+            _vm_image_cache[key] = entry
+            if batch_url is not None:
+                write_vm_image_cache(cache_path, key, entry, ttl_hours=ttl_hours)
+
+    return entry["node_agent_sku_id"], batchmodels.ImageReference.deserialize(entry["image_reference"])
+
+
 # Create pool
 def create_pool(batch_service_client, pool_id, pool_vm_size, pool_node_count, node_os_publisher, 
     node_os_offer, node_os_sku, image_resource_id=None, enable_inter_node=False, resource_files=None,
     enable_auto_scale=False, auto_scale_formula=None, auto_scale_evaluation_interval_minutes=None,
-    container=None, container_registry=None, app_insights=None):
+    container=None, container_registry=None, app_insights=None, node_agent_sku_id=None):
 
     # Configure the start task for the pool
     user = batchmodels.AutoUserSpecification(
@@ -289,9 +877,13 @@ def create_pool(batch_service_client, pool_id, pool_vm_size, pool_node_count, no
     else:
         start_task = None
 
-    agent_sku_id, ir = select_latest_verified_vm_image_with_node_agent_sku(
-        batch_service_client, node_os_publisher, node_os_offer, node_os_sku
-    )
+    # Look up (cached) image and node agent sku, unless a custom image is provided with an explicit node agent sku
+    agent_sku_id = node_agent_sku_id
+    if image_resource_id is None or agent_sku_id is None:
+        looked_up_sku_id, ir = resolve_vm_image(
+            batch_service_client, node_os_publisher, node_os_offer, node_os_sku
+        )
+        agent_sku_id = agent_sku_id or looked_up_sku_id
 
     # Container image
     if container is not None:
@@ -337,7 +929,7 @@ def create_pool(batch_service_client, pool_id, pool_vm_size, pool_node_count, no
 def create_pool_and_resource_file(clients, pool_id, pool_vm_size, pool_node_count, node_os_publisher, 
     node_os_offer, node_os_sku, file_name, container_name, image_resource_id=None, enable_inter_node=False,
     enable_auto_scale=False, auto_scale_formula=None, auto_scale_evaluation_interval_minutes=None,
-    container=None, container_registry=None, app_insights=None):
+    container=None, container_registry=None, app_insights=None, node_agent_sku_id=None):
 
     resource_file = create_pool_resource_file(clients["blob_client"], file_name, container_name)
 
@@ -345,7 +937,99 @@ def create_pool_and_resource_file(clients, pool_id, pool_vm_size, pool_node_coun
         node_os_offer, node_os_sku, image_resource_id=image_resource_id, enable_inter_node=enable_inter_node, 
         resource_files=resource_file, enable_auto_scale=enable_auto_scale, auto_scale_formula=auto_scale_formula, 
         auto_scale_evaluation_interval_minutes=auto_scale_evaluation_interval_minutes, container=container,
-        container_registry=container_registry, app_insights=app_insights)
+        container_registry=container_registry, app_insights=app_insights, node_agent_sku_id=node_agent_sku_id)
+
+
+# Create pools concurrently. Each spec is a dictionary with the clients, the pool_id and the keyword arguments of 
+# create_pool. Specs with a startup script (file_name and container_name) share one upload of the script per 
+# storage account. Returns the status of each pool ("created", "exists" or the error message).
+def create_pools(specs, max_workers=8):
+
+    # Upload startup scripts (once per storage account)
+    resource_files = {}
+    resource_key = lambda spec: (id(spec['clients']['blob_client']), spec['file_name'], spec['container_name'])
+    for spec in specs:
+        if spec.get('file_name') is not None and resource_key(spec) not in resource_files:
+            resource_files[resource_key(spec)] = create_pool_resource_file(spec['clients']['blob_client'], 
+                spec['file_name'], spec['container_name'])
+
+    def create(spec):
+        kwargs = {key: value for (key, value) in spec.items() 
+            if key not in ('clients', 'pool_id', 'file_name', 'container_name')}
+        if spec.get('file_name') is not None:
+            kwargs['resource_files'] = resource_files[resource_key(spec)]
+        try:
+            create_pool(spec['clients']['batch_client'], spec['pool_id'], **kwargs)
+            return 'created'
+        except batchmodels.BatchErrorException as e:
+            if e.error is not None and e.error.code == 'PoolExists':
+                return 'exists'
+            return str(e)
+        except Exception as e:
+            return str(e)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(create, specs))
+
+
+# Wait until pools have reached a steady allocation state with at least min_idle_nodes nodes that have completed
+# their start task (idle or running). Returns the allocation state and node counts per pool.
+def wait_for_pools_ready(batch_clients, pool_ids, min_idle_nodes=1, timeout=15, verbose=True, polling_policy=None):
+
+    timeout_expiration = datetime.datetime.now() + datetime.timedelta(minutes=timeout)
+    if polling_policy is None:
+        polling_policy = PollingPolicy(min_interval=5.0, max_interval=30.0)
+    pool_options = batchmodels.PoolGetOptions(select='id,allocationState')
+    node_options = batchmodels.ComputeNodeListOptions(select='id,state')
+
+    if verbose:
+        print("Waiting for {} pool(s) to be ready, timeout in {}..."
+            .format(len(pool_ids), datetime.timedelta(minutes=timeout)), end='')
+
+    status = {}
+    pending = list(zip(batch_clients, pool_ids))
+    while True:
+        if verbose:
+            print('.', end='')
+        sys.stdout.flush()
+
+        changed = False
+        for (batch_client, pool_id) in list(pending):
+            pool = polling_policy.call_until(timeout_expiration, batch_client.pool.get, pool_id, 
+                pool_get_options=pool_options)
+            nodes = polling_policy.call_until(timeout_expiration, batch_client.compute_node.list, pool_id, 
+                compute_node_list_options=node_options)
+            states = collections.Counter(getattr(node.state, 'value', node.state) for node in nodes)
+            pool_status = {
+                "allocation_state": getattr(pool.allocation_state, 'value', pool.allocation_state),
+                "nodes": sum(states.values()),
+                "ready": states['idle'] + states['running'],
+                "start_task_failed": states['starttaskfailed']
+            }
+            changed = changed or status.get(pool_id) != pool_status
+            status[pool_id] = pool_status
+
+            # Pool is ready or cannot become ready anymore
+            if pool_status["allocation_state"] == batchmodels.AllocationState.steady.value:
+                if pool_status["ready"] >= min_idle_nodes:
+                    pending.remove((batch_client, pool_id))
+                elif pool_status["ready"] + pool_status["start_task_failed"] == pool_status["nodes"] and \
+                    pool_status["nodes"] > 0:
+                    if verbose:
+                        print("\nStart task failed on {} node(s) of pool {}.".format(pool_status["start_task_failed"],
+                            pool_id))
+                    pending.remove((batch_client, pool_id))
+
+        if len(pending) == 0:
+            if verbose:
+                print()
+            return status
+        if datetime.datetime.now() > timeout_expiration:
+            if verbose:
+                print("\nPools did not become ready within timeout period of " + str(datetime.timedelta(minutes=timeout)))
+            return status
+        polling_policy.update(changed)
+        polling_policy.sleep()
 
 
 # Enable auto-scaling
@@ -395,10 +1079,25 @@ def create_batch_resource_from_file(blob_client, container, shared_file, verbose
     return shared_resource
 
 
-def create_batch_resource_from_bytes(blob_client, container, blob_name, blob, verbose=True):
+def create_batch_resources_from_files(blob_client, container, shared_files, verbose=True):
+
+    # Upload all files concurrently and create urls
+    shared_blobs = upload_files_to_blob(blob_client, container, shared_files, verbose=verbose)
+    shared_urls = create_blob_url(blob_client, container, shared_blobs)
+
+    # Create batch resources
+    shared_resources = [batchmodels.ResourceFile(http_url=shared_url, file_path=shared_blob) 
+        for (shared_url, shared_blob) in zip(shared_urls, shared_blobs)]
+
+    return shared_resources
+
+
+def create_batch_resource_from_bytes(blob_client, container, blob_name, blob, verbose=True, compression=None,
+    use_cache=False):
 
     # Upload to blob and create url
-    shared_blob = upload_bytes_to_container(blob_client, container, blob_name, blob, verbose=verbose)
+    shared_blob = upload_bytes_to_container(blob_client, container, blob_name, blob, verbose=verbose,
+        compression=compression, use_cache=use_cache)
     shared_url = create_blob_url(blob_client, container, shared_blob)
 
     # Create batch resource
@@ -489,13 +1188,816 @@ def create_batch_task(resource_files=None, environment_variables=None, applicati
 
     return task
 
-# Wait for tasks to complete
-def wait_for_tasks_to_complete(batch_service_client, job_id, task_timeout=60, fetch_timeout=60, verbose=True, num_restart=0):
+###################################################################################################
+# Task submission
+
+# Service limits of task.add_collection (number of tasks and request size in bytes)
+MAX_TASKS_PER_COLLECTION = 100
+MAX_COLLECTION_SIZE = 1000000
+
+def split_tasks_into_chunks(tasks, max_tasks=MAX_TASKS_PER_COLLECTION, max_size=MAX_COLLECTION_SIZE):
+
+    chunks = []
+    chunk = []
+    chunk_size = 0
+    for task in tasks:
+        task_size = len(json.dumps(task.serialize()))
+        if len(chunk) > 0 and (len(chunk) >= max_tasks or chunk_size + task_size > max_size):
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+        chunk.append(task)
+        chunk_size += task_size
+    if len(chunk) > 0:
+        chunks.append(chunk)
+    return chunks
+
+
+# Add collection of tasks and resubmit tasks that failed with a server error
+def add_task_collection(batch_client, job_id, tasks, report, num_retries=3):
+
+    polling_policy = PollingPolicy()
+    pending = tasks
+    attempt = 0
+    while len(pending) > 0:
+        attempt += 1
+        try:
+            result = polling_policy.call(batch_client.task.add_collection, job_id, pending)
+        except batchmodels.BatchErrorException as e:
+            # Size estimate was too small -> split collection
+            if e.error is not None and e.error.code == 'RequestBodyTooLarge' and len(pending) > 1:
+                add_task_collection(batch_client, job_id, pending[:len(pending) // 2], report, num_retries=num_retries)
+                add_task_collection(batch_client, job_id, pending[len(pending) // 2:], report, num_retries=num_retries)
+                return report
+            raise
+
+        tasks_by_id = {task.id: task for task in pending}
+        pending = []
+        for task_result in result.value:
+            error = None if task_result.error is None else task_result.error.code
+            status = getattr(task_result.status, 'value', task_result.status)
+            report[task_result.task_id] = {"status": status, "error": error, "attempts": attempt}
+            if task_result.status == batchmodels.TaskAddStatus.server_error and attempt <= num_retries:
+                pending.append(tasks_by_id[task_result.task_id])
+                azureclusterlesshpc_stats.metrics.record_retry('task.add_collection')
+        if len(pending) > 0:
+            polling_policy.sleep()
+    return report
+
+
+# Submit tasks in chunks of at most 100 tasks/1 MB via concurrent add_collection calls. Returns a report with 
+# the status ("success", "clienterror", "servererror"), error code and number of attempts per task id.
+def submit_tasks(batch_client, job_id, tasks, max_workers=8, num_retries=3, verbose=True):
+
+    if _speculation_policy is not None:
+        register_task_definitions(batch_client, job_id, tasks)
+    chunks = split_tasks_into_chunks(tasks)
+    report = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(add_task_collection, batch_client, job_id, chunk, {}, num_retries) 
+            for chunk in chunks]
+        for future in futures:
+            report.update(future.result())
+
+    if verbose:
+        for task_id, task_report in report.items():
+            if task_report["status"] != batchmodels.TaskAddStatus.success.value:
+                print('Failed to add task {} to job [{}]: {}'.format(task_id, job_id, task_report["error"]))
+    return report
+
+
+###################################################################################################
+# Polling
+
+# Return the delay requested by the service for throttled requests (HTTP 429/503) or None otherwise
+def get_retry_after(error):
+    response = getattr(error, 'response', None)
+    status_code = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    if status_code not in (429, 503):
+        return None
+    try:
+        return float(response.headers['Retry-After'])
+    except Exception:
+        return 0.0
+
+
+# Polling interval for the wait_for_* functions. The interval grows exponentially (with jitter) between
+# min_interval and max_interval while no task changes its state and is reset once a task changes its state. 
+# Polls are accelerated if running tasks approach the expected runtime, which is estimated from the 
+# observed task durations (or set via expected_runtime). Jobs with a completion queue are polled at least every
+# notification_interval. Throttled calls are retried up to max_retries times (None for no limit). All times are in
+# seconds.
+class PollingPolicy(object):
+
+    def __init__(self, min_interval=1.0, max_interval=30.0, backoff=1.5, jitter=0.1, expected_runtime=None,
+        max_retries=10):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.expected_runtime = expected_runtime
+        self.max_retries = max_retries
+        self.interval = min_interval
+
+    def reset(self):
+        self.interval = self.min_interval
+
+    # Back off if nothing changed since the last poll
+    def update(self, changed):
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+    def next_interval(self, start_times=(), expected_runtime=None, notification_interval=None):
+        interval = self.interval * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        if notification_interval is not None:
+            return min(interval, notification_interval)
+        if expected_runtime is None:
+            expected_runtime = self.expected_runtime
+        if expected_runtime is not None:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            for tstart in start_times:
+                if tstart.tzinfo is None:
+                    tstart = tstart.replace(tzinfo=datetime.timezone.utc)
+                remaining = expected_runtime - (now - tstart).total_seconds()
+                if 0 < remaining < interval:
+                    interval = remaining
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def sleep(self, start_times=(), expected_runtime=None, notification_interval=None):
+        time.sleep(self.next_interval(start_times=start_times, expected_runtime=expected_runtime,
+            notification_interval=notification_interval))
+
+    # Call function and retry throttled requests after the delay requested by the service
+    def call(self, func, *args, **kwargs):
+        return self.call_until(None, func, *args, **kwargs)
+
+    # Call function and retry throttled requests, unless the retry would start after the deadline (datetime or None)
+    def call_until(self, deadline, func, *args, **kwargs):
+        retries = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self.throttle_delay(func, e, retries=retries, deadline=deadline)
+                if delay is None:
+                    raise
+                retries += 1
+                time.sleep(delay)
+
+    # Delay until a throttled call of func is retried (None if the error is not caused by throttling or if the call
+    # has been retried max_retries times or the retry would start after the deadline)
+    def throttle_delay(self, func, error, retries=0, deadline=None):
+        retry_after = get_retry_after(error)
+        if retry_after is None or (self.max_retries is not None and retries >= self.max_retries):
+            return None
+        self.interval = min(max(self.interval * self.backoff, retry_after), self.max_interval)
+        delay = max(retry_after, self.next_interval())
+        if deadline is not None and datetime.datetime.now() + datetime.timedelta(seconds=delay) > deadline:
+            return None
+        operation = getattr(error, 'operation', None) or getattr(func, 'operation', getattr(func, '__name__', 'call'))
+        azureclusterlesshpc_stats.metrics.record_retry(operation)
+        return delay
+
+
+###################################################################################################
+# Speculative execution
+
+# Copies of straggler tasks have the id <task id>__copy<n>, write the same output files as the original task and 
+# are reported under the id of the original task. Output blobs of a copy that is terminated after it started 
+# uploading can therefore be overwritten, so copies are only safe for tasks with deterministic outputs.
+SPECULATIVE_COPY_TAG = '__copy'
+
+def original_task_id(task_id):
+    original, tag, number = task_id.rpartition(SPECULATIVE_COPY_TAG)
+    if tag == '' or original == '' or not (number.isascii() and number.isdigit()):
+        return task_id
+    return original
+
+
+# A running task is a straggler if its runtime exceeds multiple times the given percentile of the runtimes of the 
+# successfully completed tasks of its job (once min_samples tasks have completed). Copies of stragglers are only
+# added if the pool has idle nodes (checked at most every check_interval seconds) and at most max_copies copies 
+# are added per task. Whichever copy finishes first wins and the other copies are terminated.
+class SpeculationPolicy(object):
+
+    def __init__(self, multiple=1.5, percentile=0.9, min_samples=10, max_copies=1, idle_only=True, check_interval=30.0):
+        self.multiple = multiple
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_copies = max_copies
+        self.idle_only = idle_only
+        self.check_interval = check_interval
+
+    # Runtime (in seconds) after which a task is a straggler (from sorted runtimes of completed tasks)
+    def threshold(self, sorted_durations):
+        if len(sorted_durations) == 0 or len(sorted_durations) < self.min_samples:
+            return None
+        index = min(int(self.percentile * len(sorted_durations)), len(sorted_durations) - 1)
+        return self.multiple * sorted_durations[index]
+
+
+# Process-wide speculation policy of the wait functions. Definitions of submitted tasks are only kept (to add 
+# copies of them) while a policy is set, i.e. tasks submitted before configure_speculation are never copied.
+_speculation_policy = None
+_task_definitions = {}
+
+def configure_speculation(multiple=1.5, percentile=0.9, min_samples=10, max_copies=1, idle_only=True, 
+    check_interval=30.0):
+    global _speculation_policy
+    if multiple is None:
+        _speculation_policy = None
+    else:
+        _speculation_policy = SpeculationPolicy(multiple=multiple, percentile=percentile, min_samples=min_samples, 
+            max_copies=max_copies, idle_only=idle_only, check_interval=check_interval)
+    return _speculation_policy
+
+
+def register_task_definitions(batch_client, job_id, tasks):
+    definitions = _task_definitions.setdefault((id(batch_client), job_id), {})
+    for task in tasks:
+        definitions[task.id] = task
+
+
+# Speculation policy of a wait function: None for the process-wide policy, False to disable speculation
+def get_speculation_policy(speculation=None):
+    if speculation is None:
+        return _speculation_policy
+    return speculation or None
+
+
+###################################################################################################
+# Completion notifications
+
+# Opt-in completion channel: tasks with the environment variable COMPLETION_QUEUE_URL post a message (job id,
+# task id, exit code, runtime and output blob names) to a storage queue of their job on exit (see
+# runtime/application-cmd). Trackers of a job with a completion queue learn about completed tasks from the queue
+# and only list the tasks of the job every safety_interval seconds to catch tasks that exit without a message
+# (e.g. terminated or timed-out tasks).
+COMPLETION_QUEUE_BATCH_SIZE = 32    # max. number of messages per get_messages call
+
+# Queue names are lowercase letters, digits and single hyphens (3-63 characters)
+def completion_queue_name(job_id):
+    name = '-'.join(part for part in ''.join(c if c.isalnum() else '-' for c in job_id.lower()).split('-') if part)
+    return '{}-{}'.format(name[:54].strip('-'), hashlib.sha256(job_id.encode('utf-8')).hexdigest()[:8])
+
+
+# Create queue and return the URL (with an add-only SAS token) to which tasks post their messages
+def create_completion_queue(queue_client, queue_name, expiry_hours=48):
+    queue_client.create_queue(queue_name, fail_on_exist=False)
+    sas_token = queue_client.generate_queue_shared_access_signature(queue_name,
+        permission=azurequeue.QueuePermissions.ADD,
+        expiry=datetime.datetime.utcnow() + datetime.timedelta(hours=expiry_hours))
+    return '{}://{}/{}/messages?{}'.format(queue_client.protocol, queue_client.primary_endpoint, queue_name, sas_token)
+
+
+# Environment variables of tasks that post a message to the completion queue. Output patterns are the file
+# patterns of the task's output files (relative to the task working directory).
+def create_completion_envs(queue_url, output_patterns):
+    return create_batch_envs(['COMPLETION_QUEUE_URL', 'OUTPUT_PATTERNS'], [queue_url, ' '.join(output_patterns)])
+
+
+# Consumer of the completion queue of one job. Messages are dequeued in batches of up to 32 messages and stay
+# invisible in the queue (visibility_timeout seconds, renewed when they are dequeued again) until a tracker has
+# consumed their notification, so they are only deleted once the completion is known. Notifications of successful
+# tasks are held back until the output blobs of the task exist (Batch uploads output files after the task exited), if
+# a blob client is given; the outputs of a held notification are checked with exponential backoff (from interval up
+# to safety_interval) and blobs that were found are not checked again. Received notifications are kept in order at
+# increasing positions, so several trackers of the same job can read them. Notifications are dropped once a listing
+# confirmed the completion of their task (see release) and the oldest are dropped beyond max_notifications: trackers
+# that did not read them yet learn about these completions from their next listing.
+class CompletionQueue(object):
+
+    def __init__(self, queue_client, queue_name, blob_client=None, container_name=None, interval=0.5,
+        safety_interval=60.0, visibility_timeout=300, max_notifications=10000):
+        self.queue_client = queue_client
+        self.queue_name = queue_name
+        self.blob_client = blob_client
+        self.container_name = container_name
+        self.interval = interval
+        self.safety_interval = safety_interval
+        self.visibility_timeout = visibility_timeout
+        self.max_notifications = max_notifications
+        self.lock = threading.Lock()
+        self.pop_receipts = {}                          # message id -> pop receipt of messages not deleted yet
+        self.held = collections.OrderedDict()           # message id -> [notification, next check, backoff]
+        self.existing = set()                           # output blobs of held notifications that exist
+        self.notifications = collections.OrderedDict()  # position -> (message id, notification)
+        self.next_position = 0
+        self.consumed = 0
+
+    # Dequeue all messages and return the notifications received so far from position start on together with the
+    # position of the next notification
+    def receive(self, start=0):
+        with self.lock:
+            self.dequeue()
+            now = time.time()
+            for message_id, entry in list(self.held.items()):
+                if entry[1] > now:
+                    continue
+                if self.outputs_available(entry[0]):
+                    del self.held[message_id]
+                    self.existing.difference_update(entry[0].get('outputs', []))
+                    self.notifications[self.next_position] = (message_id, entry[0])
+                    self.next_position += 1
+                else:
+                    entry[1] = now + entry[2]
+                    entry[2] = min(2 * entry[2], self.safety_interval)
+            while len(self.notifications) > self.max_notifications:
+                self.delete_message(self.notifications.popitem(last=False)[1][0])
+            return [notification for position, (_, notification) in self.notifications.items()
+                if position >= start], self.next_position
+
+    def dequeue(self):
+        while True:
+            messages = list(self.queue_client.get_messages(self.queue_name, num_messages=COMPLETION_QUEUE_BATCH_SIZE,
+                visibility_timeout=self.visibility_timeout))
+            for message in messages:
+                if message.id in self.pop_receipts:
+                    self.pop_receipts[message.id] = message.pop_receipt    # visible again before it was consumed
+                    continue
+                try:
+                    notification = json.loads(base64.b64decode(message.content).decode('utf-8'))
+                    notification['time'] = message.insertion_time or datetime.datetime.now(datetime.timezone.utc)
+                except (ValueError, TypeError):
+                    self.queue_client.delete_message(self.queue_name, message.id, message.pop_receipt)
+                    continue    # not a completion message
+                self.pop_receipts[message.id] = message.pop_receipt
+                self.held[message.id] = [notification, 0.0, self.interval]
+            if len(messages) < COMPLETION_QUEUE_BATCH_SIZE:
+                break
+
+    def outputs_available(self, notification):
+        if notification.get('exit_code') != 0 or self.blob_client is None:
+            return True
+        for blob_name in notification.get('outputs', []):
+            if blob_name not in self.existing:
+                if not self.blob_client.exists(self.container_name, blob_name):
+                    return False
+                self.existing.add(blob_name)
+        return True
+
+    # Delete the messages of the notifications before position end (once a tracker has read them)
+    def consume(self, end):
+        with self.lock:
+            for position in range(self.consumed, end):
+                if position in self.notifications:
+                    self.delete_message(self.notifications[position][0])
+            self.consumed = max(self.consumed, end)
+
+    # Drop the notifications (held or not) of tasks whose completion is already known from a listing (e.g. failed
+    # output uploads) and delete their messages
+    def release(self, task_ids):
+        with self.lock:
+            for message_id, entry in list(self.held.items()):
+                if entry[0].get('task_id') in task_ids:
+                    del self.held[message_id]
+                    self.existing.difference_update(entry[0].get('outputs', []))
+                    self.delete_message(message_id)
+            for position, (message_id, notification) in list(self.notifications.items()):
+                if notification.get('task_id') in task_ids:
+                    del self.notifications[position]
+                    self.delete_message(message_id)
+
+    # A message whose visibility timed out may have been dequeued again with a new pop receipt (in which case it is
+    # deleted with that one later, or it is gone already)
+    def delete_message(self, message_id):
+        pop_receipt = self.pop_receipts.pop(message_id, None)
+        if pop_receipt is None:
+            return
+        try:
+            self.queue_client.delete_message(self.queue_name, message_id, pop_receipt)
+        except AzureHttpError as e:
+            if e.status_code not in (400, 404):
+                raise
+
+    def delete(self):
+        self.queue_client.delete_queue(self.queue_name, fail_not_exist=False)
+
+
+# Completed task (as returned by task.list) from a notification. The queue's insertion time is the end time.
+def notification_task(notification):
+    end_time = notification['time']
+    success = notification.get('exit_code') == 0
+    failure_info = None if success else batchmodels.TaskFailureInformation(category=batchmodels.ErrorCategory.user_error,
+        code='FailureExitCode', message='The task exited with an exit code representing a failure')
+    execution_info = batchmodels.TaskExecutionInformation(retry_count=0, requeue_count=0,
+        start_time=end_time - datetime.timedelta(seconds=float(notification.get('runtime', 0.0))), end_time=end_time,
+        exit_code=notification.get('exit_code'), failure_info=failure_info,
+        result=batchmodels.TaskExecutionResult.success if success else batchmodels.TaskExecutionResult.failure)
+    return batchmodels.CloudTask(id=notification['task_id'], state=batchmodels.TaskState.completed,
+        state_transition_time=end_time, execution_info=execution_info)
+
+
+# Completion queues of jobs (attached to all trackers of the job)
+_completion_queues = {}
+
+def enable_completion_notifications(batch_client, job_id, queue_client, queue_name, blob_client=None,
+    container_name=None, interval=0.5, safety_interval=60.0):
+    completion_queue = CompletionQueue(queue_client, queue_name, blob_client=blob_client,
+        container_name=container_name, interval=interval, safety_interval=safety_interval)
+    _completion_queues[(id(batch_client), job_id)] = completion_queue
+    for key, tracker in _task_state_trackers.items():
+        if key[:2] == (id(batch_client), job_id):
+            tracker.attach_completion_queue(completion_queue)
+    return completion_queue
+
+
+def disable_completion_notifications(batch_client, job_id, delete_queue=True):
+    completion_queue = _completion_queues.pop((id(batch_client), job_id), None)
+    for key, tracker in _task_state_trackers.items():
+        if key[:2] == (id(batch_client), job_id):
+            tracker.attach_completion_queue(None)
+    if completion_queue is not None and delete_queue:
+        completion_queue.delete()
+
+
+###################################################################################################
+# Task state tracking
+
+def _format_odata_datetime(timestamp):
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc)
+    return "DateTime'{}'".format(timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ'))
+
+
+# Index of task states of one job. Each poll issues a single filtered task.list that only returns tasks
+# whose state changed since the last poll (id, state and execution info only). By default, only running
+# and completed tasks are listed; set all_states=True to also track active/preparing tasks. With a completion
+# queue, each poll reads the queue and the tasks are only listed every safety_interval seconds.
+class TaskStateTracker(object):
+
+    # Overlap of consecutive listings: the task list is eventually consistent, so a transition may become visible
+    # after tasks with later transition times were listed (tasks that are listed again are ignored by update)
+    high_water_margin = datetime.timedelta(seconds=60)
+
+    def __init__(self, batch_service_client, job_id, all_states=False):
+        self.batch_service_client = batch_service_client
+        self.job_id = job_id
+        self.all_states = all_states
+        self.lock = threading.RLock()
+        self.retries = {}
+        self.durations = []
+        self.sorted_durations = []
+        self.copies = {}            # original task id -> ids of speculative copies
+        self.num_copies = {}
+        self.copy_states = {}       # (state, transition time) of originals with copies and of copies
+        self.resolved = set()       # originals with copies that completed successfully
+        self.losers = []            # copies (or originals) to terminate
+        self.pool_id = None
+        self.last_idle_check = None
+        self.completion_queue = None
+        self.reactivation_times = {}
+        self.reset()
+
+    def reset(self):
+        self.high_water = None
+        self.pending = {}
+        self.running = {}
+        self.completed = collections.OrderedDict()     # in order of completion
+        self.notified = {}          # tasks completed by a notification that have not been listed as completed yet
+        self.notification_position = 0
+        self.last_list = None
+
+    def attach_completion_queue(self, completion_queue):
+        with self.lock:
+            self.completion_queue = completion_queue
+            self.notification_position = 0
+
+    def notification_interval(self):
+        return None if self.completion_queue is None else self.completion_queue.interval
+
+    def list_options(self):
+        task_filter = [] if self.all_states else ["(state eq 'running' or state eq 'completed')"]
+        if self.high_water is not None:
+            task_filter.insert(0, "stateTransitionTime ge {}".format(
+                _format_odata_datetime(self.high_water - self.high_water_margin)))
+        return batchmodels.TaskListOptions(filter=" and ".join(task_filter) or None,
+            select='id,state,stateTransitionTime,executionInfo')
+
+    # Update index and return list of tasks whose state changed
+    def poll(self):
+        changed = []
+        completion_queue = self.completion_queue
+        if completion_queue is not None:
+            changed += self.poll_notifications(completion_queue)
+            if self.last_list is not None and time.time() - self.last_list < completion_queue.safety_interval:
+                return changed
+        self.last_list = time.time()
+        tasks = self.batch_service_client.task.list(self.job_id, task_list_options=self.list_options())
+        with self.lock:
+            for task in tasks:
+                if self.update(task):
+                    original = original_task_id(task.id)
+                    changed.append(task if original == task.id else self.completed.get(original, task))
+            completed = set(self.completed) | set(task_id for task_id, state in self.copy_states.items() 
+                if state[0] == batchmodels.TaskState.completed)
+        if completion_queue is not None:
+            completion_queue.release(completed)
+        return changed
+
+    def poll_notifications(self, completion_queue):
+        notifications, position = completion_queue.receive(self.notification_position)
+        changed = []
+        with self.lock:
+            high_water = self.high_water    # only listed tasks advance the high water mark
+            self.notification_position = position
+            for notification in notifications:
+                if notification.get('job_id', self.job_id) != self.job_id or not self.expects(notification):
+                    continue
+                task = notification_task(notification)
+                if self.update(task):
+                    original = original_task_id(task.id)
+                    changed.append(task if original == task.id else self.completed.get(original, task))
+                self.notified[task.id] = task
+            self.high_water = high_water
+        completion_queue.consume(position)
+        return changed
+
+    # Notifications of tasks that are known to be completed or that were posted before the task was reactivated
+    # are ignored
+    def expects(self, notification):
+        task_id = notification['task_id']
+        if task_id in self.completed or self.copy_states.get(task_id, (None,))[0] == batchmodels.TaskState.completed:
+            return False
+        reactivation_time = self.reactivation_times.get(task_id)
+        return reactivation_time is None or notification['time'] > reactivation_time
+
+    def update(self, task):
+        if task.id in self.notified:
+            if task.state == batchmodels.TaskState.completed:
+                self.confirm(task)
+            return False
+        original = original_task_id(task.id)
+        if original != task.id or original in self.copies:
+            return self.update_speculative(task, original)
+        previous = self.pending.get(task.id) or self.running.get(task.id) or self.completed.get(task.id)
+        if previous is not None and previous.state == task.state and \
+            previous.state_transition_time == task.state_transition_time:
+            return False
+        self.index(task)
+        self.update_high_water(task)
+        return True
+
+    def index(self, task):
+        self.forget(task.id)
+        if task.state == batchmodels.TaskState.completed:
+            self.completed[task.id] = task
+            info = task.execution_info
+            if info is not None and info.result == batchmodels.TaskExecutionResult.success and \
+                info.start_time is not None and info.end_time is not None:
+                self.durations.append((info.end_time - info.start_time).total_seconds())
+        elif task.state == batchmodels.TaskState.running:
+            self.running[task.id] = task
+        else:
+            self.pending[task.id] = task
+
+    def update_high_water(self, task):
+        if task.state_transition_time is not None and \
+            (self.high_water is None or task.state_transition_time > self.high_water):
+            self.high_water = task.state_transition_time
+
+    # Replace the task created from a notification by the listed task (without reporting a state change)
+    def confirm(self, task):
+        notified = self.notified.pop(task.id)
+        self.update_high_water(task)
+        if task.id in self.copy_states:
+            self.copy_states[task.id] = (task.state, task.state_transition_time)
+        if self.completed.get(task.id) is notified:
+            self.completed[task.id] = task
+
+    def outstanding_copies(self, original):
+        return [task_id for task_id in [original] + sorted(self.copies.get(original, ())) 
+            if self.copy_states.get(task_id, (None,))[0] != batchmodels.TaskState.completed]
+
+    # States of an original task with copies and of its copies are folded into the state of the original task. The
+    # first successful copy completes the original task (and the other copies are terminated); a failure is only 
+    # reported once all copies have failed.
+    def update_speculative(self, task, original):
+        state = (task.state, task.state_transition_time)
+        if self.copy_states.get(task.id) == state:
+            return False
+        self.copy_states[task.id] = state
+        self.update_high_water(task)
+        if task.id != original:
+            self.copies.setdefault(original, set()).add(task.id)
+        if original in self.resolved:
+            return False
+
+        if task.state != batchmodels.TaskState.completed:
+            if task.id != original:
+                return False
+            self.index(task)
+            return True
+
+        if task.execution_info.result == batchmodels.TaskExecutionResult.success:
+            self.resolved.add(original)
+            self.losers += [task_id for task_id in self.outstanding_copies(original) if task_id != task.id]
+            winner = copy.copy(task)
+            winner.id = original
+            self.index(winner)
+            return True
+
+        # Failure: keep the original task running as long as one of its copies is running
+        if len(self.outstanding_copies(original)) > 0:
+            if task.id == original:
+                self.forget(original)
+                self.pending[original] = None
+            return False
+        failed = copy.copy(task)
+        failed.id = original
+        self.copies.pop(original, None)
+        self.index(failed)
+        return True
+
+    def forget(self, task_id):
+        self.pending.pop(task_id, None)
+        self.running.pop(task_id, None)
+        self.completed.pop(task_id, None)
+
+    # Median runtime (in seconds) of successfully completed tasks
+    def expected_runtime(self):
+        if len(self.durations) == 0:
+            return None
+        return sorted(self.durations)[len(self.durations) // 2]
+
+    def start_times(self):
+        with self.lock:
+            return [task.execution_info.start_time for task in self.running.values()]
+
+    def failed(self):
+        return [task_id for task_id, task in self.completed.items() 
+            if task.execution_info.result == batchmodels.TaskExecutionResult.failure]
+
+    def counts(self):
+        with self.lock:
+            num_failed = len(self.failed())
+            return {"active": len(self.pending), "running": len(self.running), 
+                "completed": len(self.completed) - num_failed, "failed": num_failed}
+
+    def retry_count(self, task_id):
+        return self.retries.get(task_id, 0)
+
+    def reactivate(self, task_id, terminate=False):
+        polling_policy = PollingPolicy()
+        if terminate:
+            polling_policy.call(self.batch_service_client.task.terminate, self.job_id, task_id)
+        polling_policy.call(self.batch_service_client.task.reactivate, self.job_id, task_id)
+        with self.lock:
+            self.retries[task_id] = self.retry_count(task_id) + 1
+            self.reactivation_times[task_id] = datetime.datetime.now(datetime.timezone.utc)
+            self.notified.pop(task_id, None)
+            self.forget(task_id)
+            self.pending[task_id] = None
+
+    def terminate(self, task_id):
+        polling_policy = PollingPolicy()
+        with self.lock:
+            copies = [copy_id for copy_id in self.outstanding_copies(task_id) if copy_id != task_id]
+        for copy_id in copies:
+            polling_policy.call(self.batch_service_client.task.terminate, self.job_id, copy_id)
+        polling_policy.call(self.batch_service_client.task.terminate, self.job_id, task_id)
+        with self.lock:
+            self.forget(task_id)
+            self.pending[task_id] = None
+
+    def straggler_threshold(self, policy):
+        with self.lock:
+            if len(self.sorted_durations) != len(self.durations):
+                self.sorted_durations = sorted(self.durations)
+            return policy.threshold(self.sorted_durations)
+
+    def idle_nodes(self):
+        polling_policy = PollingPolicy()
+        if self.pool_id is None:
+            job = polling_policy.call(self.batch_service_client.job.get, self.job_id, 
+                job_get_options=batchmodels.JobGetOptions(select='id,poolInfo'))
+            self.pool_id = job.pool_info.pool_id
+            if self.pool_id is None:
+                return 0
+        node_options = batchmodels.ComputeNodeListOptions(filter="state eq 'idle'", select='id')
+        return len(list(polling_policy.call(self.batch_service_client.compute_node.list, self.pool_id, 
+            compute_node_list_options=node_options)))
+
+    # Terminate copies (or original tasks) that lost against a copy
+    def terminate_losers(self):
+        with self.lock:
+            losers, self.losers = self.losers, []
+        for task_id in losers:
+            try:
+                PollingPolicy().call(self.batch_service_client.task.terminate, self.job_id, task_id)
+            except batchmodels.BatchErrorException:
+                pass    # already completed
+
+    # Add copies of stragglers among the given running tasks (default: all). Returns the ids of the new copies.
+    def speculate(self, policy, task_ids=None, verbose=True):
+        polling_policy = PollingPolicy()
+        definitions = _task_definitions.get((id(self.batch_service_client), self.job_id))
+        if policy is None or not definitions:
+            return []
+        threshold = self.straggler_threshold(policy)
+        if threshold is None:
+            return []
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        stragglers = []
+        with self.lock:
+            for task_id, task in self.running.items():
+                if task_id not in definitions or (task_ids is not None and task_id not in task_ids) or \
+                    len(self.outstanding_copies(task_id)) > 1 or self.num_copies.get(task_id, 0) >= policy.max_copies:
+                    continue
+                runtime = (now - task.execution_info.start_time).total_seconds()
+                if runtime > threshold:
+                    stragglers.append((runtime, task_id))
+        if len(stragglers) == 0:
+            return []
+
+        # Only add copies on idle nodes (longest running stragglers first)
+        stragglers.sort(reverse=True)
+        if policy.idle_only:
+            if self.last_idle_check is not None and time.time() - self.last_idle_check < policy.check_interval:
+                return []
+            self.last_idle_check = time.time()
+            stragglers = stragglers[:self.idle_nodes()]
+
+        copies = []
+        for runtime, task_id in stragglers:
+            num_copies = self.num_copies.get(task_id, 0) + 1
+            task = copy.copy(definitions[task_id])
+            task.id = '{}{}{}'.format(task_id, SPECULATIVE_COPY_TAG, num_copies)
+            polling_policy.call(self.batch_service_client.task.add, self.job_id, task)
+            with self.lock:
+                self.num_copies[task_id] = num_copies
+                self.copies.setdefault(task_id, set()).add(task.id)
+            copies.append(task.id)
+            if verbose:
+                print('\nTask {} is a straggler (running for {:.0f} s) and a copy was added as {}'.format(task_id, 
+                    runtime, task.id))
+        return copies
+
+    # Block until one of the given tasks (default: any task) has completed
+    def wait_for_next_completion(self, task_ids=None, timeout=None, polling_policy=None):
+        if polling_policy is None:
+            polling_policy = PollingPolicy()
+        timeout_expiration = None if timeout is None else datetime.datetime.now() + timeout
+        while timeout_expiration is None or datetime.datetime.now() < timeout_expiration:
+            changed = polling_policy.call_until(timeout_expiration, self.poll)
+            with self.lock:
+                for task_id, task in self.completed.items():
+                    if task_ids is None or task_id in task_ids:
+                        return task
+            polling_policy.update(len(changed) > 0)
+            polling_policy.sleep(self.start_times(), self.expected_runtime(), self.notification_interval())
+        return None
+
+
+# Share one tracker per job across calls, so repeated waits only download state changes. A shared tracker keeps
+# the state of all tasks of the job: failed tasks stay in the index and are reported (and restarted if retries are
+# left) by every later wait, and the retry counts are per job rather than per call. Use
+# clear_task_state_trackers to start over (e.g. when a job id is reused).
+_task_state_trackers = {}
+
+def get_task_state_tracker(batch_service_client, job_id, all_states=False):
+    key = (id(batch_service_client), job_id, all_states)
+    if key not in _task_state_trackers:
+        _task_state_trackers[key] = TaskStateTracker(batch_service_client, job_id, all_states=all_states)
+        _task_state_trackers[key].attach_completion_queue(_completion_queues.get(key[:2]))
+    return _task_state_trackers[key]
+
+
+def clear_task_state_trackers(job_id=None):
+    for key in list(_task_state_trackers):
+        if job_id is None or key[1] == job_id:
+            del _task_state_trackers[key]
+    for key in list(_task_definitions):
+        if job_id is None or key[1] == job_id:
+            del _task_definitions[key]
+    for key in list(_completion_queues):
+        if job_id is None or key[1] == job_id:
+            del _completion_queues[key]
+
+
+###################################################################################################
+# Wait for tasks
+
+# Wait for tasks to complete. In incremental mode, each poll only downloads tasks whose state changed since 
+# the last poll. The optional progress_callback receives the job id and a dictionary with active/running/completed/
+# failed counts (as in azureclusterlesshpc.aio).
+# Copies of stragglers are added according to the speculation policy (see configure_speculation).
+def wait_for_tasks_to_complete(batch_service_client, job_id, task_timeout=60, fetch_timeout=60, verbose=True, num_restart=0,
+    incremental=True, progress_callback=None, polling_policy=None, speculation=None):
 
     timeout_fetch = datetime.timedelta(minutes=fetch_timeout)    # individual task time out
     timeout_task = datetime.timedelta(minutes=task_timeout)      # fetch all tasks time out
     timeout_expiration = datetime.datetime.now() + timeout_fetch
-    task_retries = {}
+    if incremental:
+        tracker = get_task_state_tracker(batch_service_client, job_id, all_states=True)
+    else:
+        tracker = TaskStateTracker(batch_service_client, job_id, all_states=True)
+    if polling_policy is None:
+        polling_policy = PollingPolicy()
+    speculation = get_speculation_policy(speculation)
 
     if verbose:
         print("Monitoring all tasks for 'Completed' state, timeout in {}..."
@@ -505,272 +2007,230 @@ def wait_for_tasks_to_complete(batch_service_client, job_id, task_timeout=60, fe
         if verbose:
             print('.', end='')
         sys.stdout.flush()
-        tasks = batch_service_client.task.list(job_id)
-        incomplete_tasks = []
-        failed_tasks = []
+        if not incremental:
+            tracker.reset()
 
-        # Check if tasks completed or failed and restart is task is eligible
-        for task in tasks:
-
-            # Has current task been retried in the past?
-            if task_retries.get(task.id) is None:
-                retry_count = 0
-            else:
-                retry_count = task_retries[task.id]
-            if task.state == batchmodels.TaskState.completed:
-                # If task has completed with error, check if retry possible
-                if task.execution_info.result == batchmodels.TaskExecutionResult.failure:
-                    # Restart task
-                    if retry_count < num_restart:
-                        if verbose:
-                            print('\nRestart task no ', task.id)
-                        batch_service_client.task.reactivate(job_id, task.id)
-                        incomplete_tasks.append(task.id)
-                        task_retries.update({task.id: retry_count + 1})
-                    else:
-                        failed_tasks.append(task.id)
-            else:
-                # Check if task has exceed max. runtime
-                if task.state == batchmodels.TaskState.running:
-                    tstart = task.execution_info.start_time
-                    current_runtime = datetime.datetime.now(tz=tstart.tzinfo) - tstart
-                    if current_runtime > timeout_task:
-                        if retry_count < num_restart:
-                            if verbose:
-                                print("\nTask did not reach 'Completed' state within timeout period of " 
-                                    + str(timeout_task) + " and will be restarted.")
-                            # Restart task
-                            batch_service_client.task.terminate(job_id, task.id)
-                            batch_service_client.task.reactivate(job_id, task.id)
-                            task_retries.update({task.id: retry_count + 1})
-                        else:
-                            # Interrupt task
-                            if verbose:
-                                print("\nTask did not reach 'Completed' state within timeout period of " 
-                                    + str(timeout_task) + " and will be terminated.")
-                            batch_service_client.task.terminate(job_id, task.id)
-                            failed_tasks.append(task.id)
-                incomplete_tasks.append(task.id)
+        changed = polling_policy.call_until(timeout_expiration, tracker.poll)
+        counts = check_tracked_tasks(tracker, changed, timeout_task, num_restart=num_restart, verbose=verbose, 
+            speculation=speculation)
+        if progress_callback is not None:
+            progress_callback(job_id, counts)
 
         # If no tasks are left -> done
-        if not incomplete_tasks:
-            if verbose:
-                print()
-            if len(failed_tasks) > 0:
-                return failed_tasks
-            else:
-                return True
+        if counts['active'] + counts['running'] == 0:
+            return tracked_job_result(tracker, verbose=verbose)
         else:
-            time.sleep(1)
+            polling_policy.update(len(changed) > 0)
+            polling_policy.sleep(tracker.start_times(), tracker.expected_runtime(), tracker.notification_interval())
     if verbose:
         print("\nTask did not reach 'Completed' state within timeout period of " + str(timeout_expiration))
     return False
 
 
-def wait_for_task_to_complete(batch_service_client, job_id, task_id, timedelta_minutes, verbose=True, num_restart=0):
+# Restart failed tasks, restart or terminate tasks that exceeded the max. runtime and add copies of stragglers
+# after a poll of the tracker. Returns the task counts. All failed tasks of the tracker are checked (not only the
+# ones that changed in this poll), so failures seen by an earlier wait on a shared tracker are restarted as well.
+def check_tracked_tasks(tracker, changed, timeout_task, num_restart=0, verbose=True, speculation=None):
+
+    # If task has completed with error, check if retry possible
+    tracker.terminate_losers()
+    for task_id in tracker.failed():
+        if tracker.retry_count(task_id) < num_restart:
+            if verbose:
+                print('\nRestart task no ', task_id)
+            tracker.reactivate(task_id)
+
+    # Check if running tasks have exceeded max. runtime
+    for task_id, task in list(tracker.running.items()):
+        tstart = task.execution_info.start_time
+        current_runtime = datetime.datetime.now(tz=tstart.tzinfo) - tstart
+        if current_runtime > timeout_task:
+            if tracker.retry_count(task_id) < num_restart:
+                if verbose:
+                    print("\nTask did not reach 'Completed' state within timeout period of " 
+                        + str(timeout_task) + " and will be restarted.")
+                tracker.reactivate(task_id, terminate=True)
+            else:
+                if verbose:
+                    print("\nTask did not reach 'Completed' state within timeout period of " 
+                        + str(timeout_task) + " and will be terminated.")
+                tracker.terminate(task_id)
+
+    # Add copies of stragglers
+    tracker.speculate(speculation, verbose=verbose)
+    return tracker.counts()
+
+
+# Result of a job without active or running tasks: True or the list of failed tasks
+def tracked_job_result(tracker, verbose=True):
+    if verbose:
+        print()
+    failed_tasks = tracker.failed()
+    if len(failed_tasks) > 0:
+        return failed_tasks
+    else:
+        return True
+
+
+# Wait for a single task to complete. The task is monitored by the job's tracker, so that copies of the task 
+# (see configure_speculation) are taken into account.
+def wait_for_task_to_complete(batch_service_client, job_id, task_id, timedelta_minutes, verbose=True, num_restart=0,
+    polling_policy=None, speculation=None):
 
     timeout = datetime.timedelta(minutes=timedelta_minutes)
-    task_retries = 0
+    tracker = get_task_state_tracker(batch_service_client, job_id)
     if verbose:
         print("Monitoring task {} for 'Completed' state, timeout in {}..."
             .format(task_id, timeout), end='')
 
-    while True:
+    task_name, _, success = wait_for_one_tracked_task([(tracker, task_id, None)], timeout, datetime.datetime.max, 
+        verbose=verbose, num_restart=num_restart, polling_policy=polling_policy, speculation=speculation)
+    if verbose:
+        print()
+    return task_name is not None and success
+
+
+# Wait for one task from a list of (tracker, task name, return key) references
+def wait_for_one_tracked_task(task_refs, timeout_task, timeout_expiration, verbose=True, num_restart=0,
+    polling_policy=None, speculation=None):
+
+    if polling_policy is None:
+        polling_policy = PollingPolicy()
+    speculation = get_speculation_policy(speculation)
+    refs_per_tracker = group_task_refs(task_refs)
+
+    while datetime.datetime.now() < timeout_expiration:
         if verbose:
             print('.', end='')
         sys.stdout.flush()
-        task = batch_service_client.task.get(job_id, task_id)
 
-        # Check if task has terminated and restart if applicable
-        if task.state == batchmodels.TaskState.completed:
+        # One task.list call per job
+        changed = False
+        for tracker in refs_per_tracker:
+            changed = len(polling_policy.call_until(timeout_expiration, tracker.poll)) > 0 or changed
+
+        result = find_tracked_task(refs_per_tracker, timeout_task, num_restart=num_restart, verbose=verbose,
+            speculation=speculation)
+        if result is not None:
+            return result
+
+        # No completed task found -> sleep and try again
+        polling_policy.update(changed)
+        polling_policy.sleep(*tracked_start_times(refs_per_tracker))
+    return None, None, False
+
+
+# Group (tracker, task name, return key) references by tracker
+def group_task_refs(task_refs):
+    refs_per_tracker = collections.OrderedDict()
+    for tracker, task_name, key in task_refs:
+        refs_per_tracker.setdefault(tracker, {})[task_name] = key
+    return refs_per_tracker
+
+
+# Find a completed task (in order of completion) after a poll of the trackers and return (task name, key, success).
+# Failed tasks are restarted and tasks that exceeded the max. runtime restarted or terminated if applicable. Returns
+# None if no task has completed.
+def find_tracked_task(refs_per_tracker, timeout_task, num_restart=0, verbose=True, speculation=None):
+
+    for tracker, refs in refs_per_tracker.items():
+        tracker.terminate_losers()
+
+        # Completed tasks (in order of completion)
+        for task_name, task in list(tracker.completed.items()):
+            if task_name not in refs:
+                continue
             if task.execution_info.result == batchmodels.TaskExecutionResult.failure:
-                if task_retries < num_restart:
-                    batch_service_client.task.reactivate(job_id, task.id)
-                    task_retries += 1
+                if tracker.retry_count(task_name) < num_restart:
+                    tracker.reactivate(task_name)
                     if verbose:
-                        print('\nRestart task no ', task.id)
+                        print('\nRestart task no ', task_name)
                 else:
                     if verbose:
-                        print()
-                    return False
+                        print("\nTask failed after maximum number of retries.")
+                    return task_name, refs[task_name], False
             else:
-                if verbose:
-                    print()
-                return True
+                return task_name, refs[task_name], True
 
-        # If task is running, check it hasn't exceeded max runtime
-        elif task.state == batchmodels.TaskState.running:
+        # Check if running tasks have exceeded max. runtime
+        for task_name, task in list(tracker.running.items()):
+            if task_name not in refs:
+                continue
             tstart = task.execution_info.start_time
             current_runtime = datetime.datetime.now(tz=tstart.tzinfo) - tstart
-
-            # Max runtime violated -> either restart task or return
-            if current_runtime > timeout:
-                if task_retries < num_restart:
+            if current_runtime > timeout_task:
+                if tracker.retry_count(task_name) < num_restart:
                     if verbose:
                         print("\nTask did not reach 'Completed' state within timeout period of " 
-                            + str(timeout) + " and will be restarted.")
-                    batch_service_client.task.terminate(job_id, task.id)
-                    batch_service_client.task.reactivate(job_id, task.id)
-                    task_retries += 1
+                            + str(timeout_task) + " and will be restarted.")
+                    tracker.reactivate(task_name, terminate=True)
                 else:
                     if verbose:
                         print("\nTask did not reach 'Completed' state within timeout period of " 
-                            + str(timeout))
-                    return False
-            else:
-                time.sleep(1)
-        else:
-            time.sleep(1)
-
+                            + str(timeout_task) + " and will be terminated.")
+                    tracker.terminate(task_name)
+                    return task_name, refs[task_name], False
+
+        # Add copies of stragglers
+        tracker.speculate(speculation, task_ids=refs, verbose=verbose)
+    return None
+
+
+# Start times of running tasks, median runtime of completed tasks and shortest notification interval of all
+# trackers (to schedule the next poll)
+def tracked_start_times(trackers):
+    start_times = []
+    durations = []
+    intervals = []
+    for tracker in trackers:
+        start_times += tracker.start_times()
+        durations += tracker.durations
+        if tracker.notification_interval() is not None:
+            intervals.append(tracker.notification_interval())
+    expected_runtime = sorted(durations)[len(durations) // 2] if len(durations) > 0 else None
+    return start_times, expected_runtime, min(intervals) if len(intervals) > 0 else None
 
 
 def wait_for_one_task_from_multi_pool(batch_service_clients, job_id, task_id_list, task_timeout=60, fetch_timeout=60,
-    verbose=True, num_restart=0):
+    verbose=True, num_restart=0, polling_policy=None, speculation=None):
 
     timeout_fetch = datetime.timedelta(minutes=fetch_timeout)    # individual task time out
     timeout_task = datetime.timedelta(minutes=task_timeout)      # fetch all tasks time out
     timeout_expiration = datetime.datetime.now() + timeout_fetch
-    task_retries = {}
-
-    while datetime.datetime.now() < timeout_expiration:
-        if verbose:
-            print('.', end='')
-        sys.stdout.flush()
-        is_complete = False
-
-        for task_id in task_id_list:
-            pool_no = task_id['pool'] - 1
-            task_name = task_id['taskname']
 
-            if type(job_id) == str:
-                task = batch_service_clients[pool_no].task.get(job_id, task_name)
-            else:
-                task = batch_service_clients[pool_no].task.get(job_id[pool_no], task_name)
-            is_complete = (task.state == batchmodels.TaskState.completed)
-
-            # Has current task been retried in the past?
-            if task_retries.get(task.id) is None:
-                retry_count = 0
-            else:
-                retry_count = task_retries[task.id]
-
-            if is_complete:            
-                if task.execution_info.result == batchmodels.TaskExecutionResult.failure:
-                    if retry_count < num_restart:
-                        if type(job_id) == str:
-                            batch_service_clients[pool_no].task.reactivate(job_id, task.id)
-                        else:
-                            batch_service_clients[pool_no].task.reactivate(job_id[pool_no], task.id)
-                        task_retries.update({task.id: retry_count + 1})
-                        if verbose:
-                            print('\nRestart task no ', task.id)
-                    else:
-                        if verbose:
-                            print("\nTask failed after maximum number of retries.")
-                        return task_name, pool_no, False
-                else:
-                    return task_name, pool_no, True
-            else:
-                # Check if task has exceed max. runtime
-                if task.state == batchmodels.TaskState.running:
-                    tstart = task.execution_info.start_time
-                    current_runtime = datetime.datetime.now(tz=tstart.tzinfo) - tstart
-                    if current_runtime > timeout_task:
-                        if retry_count < num_restart:
-                            if verbose:
-                                print("\nTask did not reach 'Completed' state within timeout period of " 
-                                    + str(timeout_task) + " and will be restarted.")
-                            # Restart task
-                            if type(job_id) == str:
-                                batch_service_clients[pool_no].task.terminate(job_id, task.id)
-                                batch_service_clients[pool_no].task.reactivate(job_id, task.id)
-                            else:
-                                batch_service_clients[pool_no].task.terminate(job_id[pool_no], task.id)
-                                batch_service_clients[pool_no].task.reactivate(job_id[pool_no], task.id)
-                            task_retries.update({task.id: retry_count + 1})
-                        else:
-                            # Interrupt task
-                            if verbose:
-                                print("\nTask did not reach 'Completed' state within timeout period of " 
-                                    + str(timeout_task) + " and will be terminated.")
-                            if type(job_id) == str:
-                                batch_service_clients[pool_no].task.terminate(job_id, task.id)       
-                            else:
-                                batch_service_clients[pool_no].task.terminate(job_id[pool_no], task.id)                            
-                            return task_name, pool_no, False
+    task_refs = []
+    for task_id in task_id_list:
+        pool_no = task_id['pool'] - 1
+        if type(job_id) == str:
+            tracker = get_task_state_tracker(batch_service_clients[pool_no], job_id)
+        else:
+            tracker = get_task_state_tracker(batch_service_clients[pool_no], job_id[pool_no])
+        task_refs.append((tracker, task_id['taskname'], pool_no))
 
-        # No completed task found -> sleep and try again
-        time.sleep(1)
-    if verbose:        
+    task_name, pool_no, success = wait_for_one_tracked_task(task_refs, timeout_task, timeout_expiration, 
+        verbose=verbose, num_restart=num_restart, polling_policy=polling_policy, speculation=speculation)
+    if task_name is None and verbose:
         print("\nTask did not reach 'Completed' state within timeout period of " + str(timeout_task))
-    return None, None, False
+    return task_name, pool_no, success
 
 
 def wait_for_one_task_from_multi_jobs(batch_service_client, job_id_list, task_id_list, task_timeout=60, 
-    fetch_timeout=60, verbose=True, num_restart=0):
+    fetch_timeout=60, verbose=True, num_restart=0, polling_policy=None, speculation=None):
 
     timeout_fetch = datetime.timedelta(minutes=fetch_timeout)    # individual task time out
     timeout_task = datetime.timedelta(minutes=task_timeout)      # fetch all tasks time out
     timeout_expiration = datetime.datetime.now() + timeout_fetch
-    task_retries = {}
-
-    while datetime.datetime.now() < timeout_expiration:
-        if verbose:
-            print('.', end='')
-        sys.stdout.flush()
 
-        is_complete = False
+    task_refs = []
+    for job_id, task_id in zip(job_id_list, task_id_list):
+        tracker = get_task_state_tracker(batch_service_client, job_id)
+        task_refs.append((tracker, task_id['taskname'], job_id))
 
-        for job_id, task_id in zip(job_id_list, task_id_list):
-            task = batch_service_client.task.get(job_id, task_id['taskname'])
-            is_complete = (task.state == batchmodels.TaskState.completed)
-
-            # Has current task been retried in the past?
-            if task_retries.get(task.id) is None:
-                retry_count = 0
-            else:
-                retry_count = task_retries[task.id]
-
-            if is_complete:            
-                if task.execution_info.result == batchmodels.TaskExecutionResult.failure:
-                    if retry_count < num_restart:
-                        batch_service_client.task.reactivate(job_id, task.id)
-                        task_retries.update({task.id: retry_count + 1})
-                        if verbose:
-                            print('\nRestart task no ', task.id)
-                    else:
-                        if verbose:
-                            print("\nTask failed after maximum number of retries.")
-                        return task_id['taskname'], job_id, False
-                else:
-                    return task_id['taskname'], job_id, True
-            else:
-                # Check if task has exceed max. runtime
-                if task.state == batchmodels.TaskState.running:
-                    tstart = task.execution_info.start_time
-                    current_runtime = datetime.datetime.now(tz=tstart.tzinfo) - tstart
-                    if current_runtime > timeout_task:
-                        if retry_count < num_restart:
-                            if verbose:
-                                print("\nTask did not reach 'Completed' state within timeout period of " 
-                                    + str(timeout_task) + " and will be restarted.")
-                            # Restart task
-                            batch_service_client.task.terminate(job_id, task.id)
-                            batch_service_client.task.reactivate(job_id, task.id)
-                            task_retries.update({task.id: retry_count + 1})
-                        else:
-                            # Interrupt task
-                            if verbose:
-                                print("\nTask did not reach 'Completed' state within timeout period of " 
-                                    + str(timeout_task) + " and will be terminated.")
-                            batch_service_client.task.terminate(job_id, task.id)       
-                            return task_id['taskname'], job_id, False
-
-        # No completed task found -> sleep and try again
-        time.sleep(1)
-    if verbose:        
+    task_name, job_id, success = wait_for_one_tracked_task(task_refs, timeout_task, timeout_expiration, 
+        verbose=verbose, num_restart=num_restart, polling_policy=polling_policy, speculation=speculation)
+    if task_name is None and verbose:
         print("\nTask did not reach 'Completed' state within timeout period of " + str(timeout_fetch))
-    return None, None, False
+    return task_name, job_id, success
 
 
 # Environment variables
@@ -782,3 +2242,7 @@ def create_batch_envs(names, values):
     for (name, value) in zip(names, values):
         envs.append(batchmodels.EnvironmentSetting(name=name, value=value))
     return envs
+
+
+# Asyncio variants (azureclusterlesshpc.aio)
+import azureclusterlesshpc_aio as aio
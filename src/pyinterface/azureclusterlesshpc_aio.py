@@ -0,0 +1,233 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+# Asyncio variants of task submission, monitoring and blob transfers (available as azureclusterlesshpc.aio). The
+# Azure SDKs used by azureclusterlesshpc (azure-batch 11, azure-storage-blob 1.3) have no async clients, so SDK
+# calls run in one shared thread pool (HTTP requests release the GIL) and are multiplexed on the event loop of the
+# caller. Throttled calls are retried with asyncio.sleep, so waiting never occupies a thread. The *_sync functions
+# run a coroutine to completion for blocking callers (e.g. Julia via PyCall).
+
+import asyncio, concurrent.futures, copy, datetime, functools, sys, threading, time
+import azure.batch.models as batchmodels
+import azureclusterlesshpc
+
+
+MAX_CONCURRENCY = 64
+_executor = None
+_executor_lock = threading.Lock()
+
+# Thread pool of all SDK calls (at most max_concurrency calls at a time)
+def configure(max_concurrency=64):
+    global MAX_CONCURRENCY, _executor
+    with _executor_lock:
+        MAX_CONCURRENCY = max_concurrency
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENCY,
+                thread_name_prefix='azureclusterlesshpc-aio')
+        return _executor
+
+
+# Run blocking function in the thread pool and retry throttled calls after the delay requested by the service (up 
+# to the max_retries of the polling policy and unless the retry would start after the deadline)
+async def call(func, *args, polling_policy=None, deadline=None, **kwargs):
+    if polling_policy is None:
+        polling_policy = azureclusterlesshpc.PollingPolicy()
+    loop = asyncio.get_running_loop()
+    retries = 0
+    while True:
+        try:
+            return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+        except Exception as e:
+            delay = polling_policy.throttle_delay(func, e, retries=retries, deadline=deadline)
+            if delay is None:
+                raise
+            retries += 1
+            await asyncio.sleep(delay)
+
+
+###################################################################################################
+# Tasks
+
+# Submit tasks in chunks of at most 100 tasks/1 MB (one add_collection call per chunk, all chunks concurrently)
+async def submit_tasks(batch_client, job_id, tasks, num_retries=3, verbose=True):
+
+    if azureclusterlesshpc._speculation_policy is not None:
+        azureclusterlesshpc.register_task_definitions(batch_client, job_id, tasks)
+    chunks = azureclusterlesshpc.split_tasks_into_chunks(tasks)
+    reports = await asyncio.gather(*[call(azureclusterlesshpc.add_task_collection, batch_client, job_id, chunk, {},
+        num_retries) for chunk in chunks])
+    report = {}
+    for chunk_report in reports:
+        report.update(chunk_report)
+
+    if verbose:
+        for task_id, task_report in report.items():
+            if task_report["status"] != batchmodels.TaskAddStatus.success.value:
+                print('Failed to add task {} to job [{}]: {}'.format(task_id, job_id, task_report["error"]))
+    return report
+
+
+# Wait for all tasks of one job (same results as azureclusterlesshpc.wait_for_tasks_to_complete)
+async def wait_for_job(batch_service_client, job_id, task_timeout=60, fetch_timeout=60, verbose=True, num_restart=0,
+    progress_callback=None, polling_policy=None, speculation=None):
+
+    timeout_task = datetime.timedelta(minutes=task_timeout)
+    timeout_expiration = datetime.datetime.now() + datetime.timedelta(minutes=fetch_timeout)
+    tracker = azureclusterlesshpc.get_task_state_tracker(batch_service_client, job_id, all_states=True)
+    polling_policy = azureclusterlesshpc.PollingPolicy() if polling_policy is None else copy.copy(polling_policy)
+    speculation = azureclusterlesshpc.get_speculation_policy(speculation)
+
+    while datetime.datetime.now() < timeout_expiration:
+        changed = await call(tracker.poll, polling_policy=polling_policy, deadline=timeout_expiration)
+        counts = await call(azureclusterlesshpc.check_tracked_tasks, tracker, changed, timeout_task,
+            num_restart=num_restart, verbose=verbose, speculation=speculation)
+        if progress_callback is not None:
+            progress_callback(job_id, counts)
+        if counts['active'] + counts['running'] == 0:
+            return azureclusterlesshpc.tracked_job_result(tracker, verbose=verbose)
+        polling_policy.update(len(changed) > 0)
+        await asyncio.sleep(polling_policy.next_interval(tracker.start_times(), tracker.expected_runtime(),
+            tracker.notification_interval()))
+    if verbose:
+        print("\nTask did not reach 'Completed' state within timeout period of " + str(timeout_expiration))
+    return False
+
+
+# Wait for all tasks of several jobs (e.g. one job per pool) concurrently. Returns the result per job: True, the
+# list of failed tasks or False (timeout) as a tuple, so that the per job lists are not merged into a matrix by
+# PyCall. The optional progress_callback receives the job id and task counts.
+async def wait_for_all(batch_service_clients, job_ids, task_timeout=60, fetch_timeout=60, verbose=True, num_restart=0,
+    progress_callback=None, polling_policy=None, speculation=None):
+
+    if verbose:
+        print("Monitoring all tasks of {} jobs for 'Completed' state, timeout in {}..."
+            .format(len(job_ids), datetime.timedelta(minutes=fetch_timeout)))
+    return tuple(await asyncio.gather(*[wait_for_job(batch_service_client, job_id, task_timeout=task_timeout,
+        fetch_timeout=fetch_timeout, verbose=verbose, num_restart=num_restart, progress_callback=progress_callback,
+        polling_policy=polling_policy, speculation=speculation)
+        for (batch_service_client, job_id) in zip(batch_service_clients, job_ids)]))
+
+
+# Wait for one task from a list of tasks ({"taskname", "pool"} as in wait_for_one_task_from_multi_pool) in one or
+# more pools. All jobs are polled concurrently. Returns (task name, pool index, success).
+async def wait_for_any(batch_service_clients, job_id, task_id_list, task_timeout=60, fetch_timeout=60, verbose=True,
+    num_restart=0, polling_policy=None, speculation=None):
+
+    timeout_task = datetime.timedelta(minutes=task_timeout)
+    timeout_expiration = datetime.datetime.now() + datetime.timedelta(minutes=fetch_timeout)
+    if polling_policy is None:
+        polling_policy = azureclusterlesshpc.PollingPolicy()
+    speculation = azureclusterlesshpc.get_speculation_policy(speculation)
+
+    task_refs = []
+    for task_id in task_id_list:
+        pool_no = task_id['pool'] - 1
+        job = job_id if isinstance(job_id, str) else job_id[pool_no]
+        task_refs.append((azureclusterlesshpc.get_task_state_tracker(batch_service_clients[pool_no], job),
+            task_id['taskname'], pool_no))
+    refs_per_tracker = azureclusterlesshpc.group_task_refs(task_refs)
+
+    while datetime.datetime.now() < timeout_expiration:
+        if verbose:
+            print('.', end='')
+        sys.stdout.flush()
+        changed = await asyncio.gather(*[call(tracker.poll, polling_policy=polling_policy, deadline=timeout_expiration)
+            for tracker in refs_per_tracker])
+        result = await call(azureclusterlesshpc.find_tracked_task, refs_per_tracker, timeout_task,
+            num_restart=num_restart, verbose=verbose, speculation=speculation)
+        if result is not None:
+            return result
+        polling_policy.update(any(len(tasks) > 0 for tasks in changed))
+        await asyncio.sleep(polling_policy.next_interval(*azureclusterlesshpc.tracked_start_times(refs_per_tracker)))
+    if verbose:
+        print("\nTask did not reach 'Completed' state within timeout period of " + str(timeout_task))
+    return None, None, False
+
+
+###################################################################################################
+# Blob transfers
+
+# Upload (blob name, source) pairs concurrently. Sources are file paths, file objects or bytes-like objects.
+# Returns upload statistics as azureclusterlesshpc.upload_blobs. By default (use_cache=None), only files are looked
+# up in the upload cache (as the defaults of upload_blobs and upload_bytes_to_container).
+async def upload_many(blob_client, container_name, uploads, max_connections=2, verbose=True, use_cache=None):
+
+    async def upload(blob_name, source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            await call(azureclusterlesshpc.upload_bytes_to_container, blob_client, container_name, blob_name, source,
+                verbose=verbose, use_cache=use_cache is True, max_connections=max_connections)
+            return memoryview(source).nbytes
+        stats = await call(azureclusterlesshpc.upload_blobs, blob_client, container_name, [(blob_name, source)],
+            max_workers=1, max_connections=max_connections, verbose=verbose, use_cache=use_cache is not False)
+        return stats["bytes"]
+
+    tstart = time.time()
+    num_bytes = sum(await asyncio.gather(*[upload(blob_name, source) for (blob_name, source) in uploads]))
+    runtime = time.time() - tstart
+    stats = {"files": len(uploads), "bytes": num_bytes, "seconds": runtime,
+        "throughput": num_bytes / runtime if runtime > 0 else 0.0}
+    if verbose and len(uploads) > 1:
+        print('Uploaded {} files ({:.2f} MB) in {:.2f} s ({:.2f} MB/s).'.format(stats["files"], num_bytes / 1e6,
+            runtime, stats["throughput"] / 1e6))
+    return stats
+
+
+# Download blobs concurrently (each one with max_connections ranged requests). The targets are specified as in
+# azureclusterlesshpc.download_blobs (None, a directory or a list of buffers/file paths), as are the results.
+async def download_many(blob_client, container_name, blob_names, into=None, delete=False, max_connections=2,
+    chunk_size=4*1024*1024):
+
+    if into is None or isinstance(into, str):
+        targets = [into] * len(blob_names)
+    else:
+        targets = [[target] for target in into]
+        if len(targets) != len(blob_names):
+            raise ValueError('Number of targets ({}) does not match number of blobs ({}).'.format(len(targets),
+                len(blob_names)))
+    results = await asyncio.gather(*[call(azureclusterlesshpc.download_blobs, blob_client, container_name, [blob_name],
+        max_workers=max_connections, into=target, delete=delete, chunk_size=chunk_size)
+        for (blob_name, target) in zip(blob_names, targets)])
+    return [result[0] for result in results]
+
+
+###################################################################################################
+# Sync facade
+
+# Run coroutine to completion (in a separate thread if the calling thread already runs an event loop)
+def run(coroutine):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+def submit_tasks_sync(*args, **kwargs):
+    return run(submit_tasks(*args, **kwargs))
+
+
+def wait_for_all_sync(*args, **kwargs):
+    return run(wait_for_all(*args, **kwargs))
+
+
+def wait_for_any_sync(*args, **kwargs):
+    return run(wait_for_any(*args, **kwargs))
+
+
+def upload_many_sync(*args, **kwargs):
+    return run(upload_many(*args, **kwargs))
+
+
+def download_many_sync(*args, **kwargs):
+    return run(download_many(*args, **kwargs))
@@ -0,0 +1,921 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+# In-process stand-in for the Azure Batch, Blob and Queue services. The local clients have the same method surface
+# as azure.batch.BatchServiceClient, azure.storage.blob.BlockBlobService and azure.storage.queue.QueueService (as
+# used by azureclusterlesshpc), return the same SDK models and raise the same exceptions. Tasks go through a
+# simulated lifecycle (active -> running -> completed) in wall-clock time and post a completion message if they
+# have a COMPLETION_QUEUE_URL (as runtime/application-cmd). Latency, throttling and failures can be injected.
+# Local clients are created by azureclusterlesshpc.create_clients if the credentials contain a "_LOCAL_SERVICE"
+# entry with the options below.
+
+import azure.batch.models as batchmodels
+import azure.storage.blob.models as blobmodels
+import azure.storage.queue.models as queuemodels
+from azure.common import AzureConflictHttpError, AzureHttpError, AzureMissingResourceHttpError
+import msrest
+import base64, collections, datetime, hashlib, heapq, json, math, os, random, re, requests, threading, time, uuid
+
+
+###################################################################################################
+# Local service
+
+DEFAULT_OPTIONS = {
+    "name": "local",            # services with the same name share their state
+    "latency": 0.0,             # seconds per API call (per page for list calls)
+    "latency_jitter": 0.0,      # relative uniform jitter of the latency
+    "throttle_rate": 0.0,       # probability that a call is throttled (HTTP 429/503)
+    "retry_after": 0.0,         # Retry-After of throttled calls (seconds)
+    "blob_retries": 3,          # retries of throttled blob/queue calls (retry policy of the storage SDK)
+    "task_runtime": 0.0,        # task runtime in seconds (number or [min, max])
+    "straggler_rate": 0.0,      # probability that a task runs straggler_factor times longer
+    "straggler_factor": 10.0,
+    "schedule_delay": 0.0,      # delay between adding a task and starting it (seconds)
+    "slots": None,              # number of concurrently running tasks (default is unlimited)
+    "task_failure_rate": 0.0,   # probability that a task exits with exit code 1
+    "message_loss_rate": 0.0,   # probability that the completion message of a task is lost
+    "add_error_rate": 0.0,      # probability that add_collection returns a server error for a task
+    "allocation_time": 0.0,     # time until the nodes of a new pool are idle (seconds)
+    "page_size": 1000,          # results per page of list calls
+    "root": None,               # directory for blob contents (default is in memory)
+    "seed": None
+}
+
+MAX_COLLECTION_SIZE = 1000000
+
+def _utc(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+
+_batch_deserializer = msrest.Deserializer({key: value for (key, value) in batchmodels.__dict__.items()
+    if isinstance(value, type)})
+
+def batch_error(status_code, code, message, retry_after=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    response._content = json.dumps({'code': code, 'message': {'lang': 'en-US', 'value': message}}).encode('utf-8')
+    return batchmodels.BatchErrorException(_batch_deserializer, response)
+
+
+# List result with the next() method of the SDK's paged iterators
+class LocalPaged(object):
+
+    def __init__(self, items):
+        self.items = iter(items)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.items)
+
+    next = __next__
+
+
+class LocalService(object):
+
+    def __init__(self, **options):
+        unknown = set(options) - set(DEFAULT_OPTIONS)
+        if len(unknown) > 0:
+            raise ValueError('Unknown options of local service: {}'.format(', '.join(sorted(unknown))))
+        self.options = dict(DEFAULT_OPTIONS, **options)
+        self.lock = threading.RLock()
+        self.random = random.Random(self.options["seed"])
+        self.calls = collections.Counter()
+        self.throttled = collections.Counter()
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+
+        # Batch state
+        self.pools = {}
+        self.jobs = collections.OrderedDict()
+        self.clock = 0.0
+        self.queue = collections.deque()    # (ready time, job id, task id, generation)
+        self.running = []                   # heap of (end time, sequence, job id, task id, generation)
+        self.sequence = 0
+
+        # Blob state: container -> blob name -> blob record
+        self.containers = {}
+
+        # Queue state: account -> queue name -> list of message records
+        self.queues = {}
+
+    # Count call, wait for the simulated latency and throttle randomly. Throttled calls are repeated up to 
+    # retries times before the error is raised.
+    def call(self, operation, throttle_error, retries=0):
+        for attempt in range(retries + 1):
+            with self.lock:
+                self.calls[operation] += 1
+                throttle = self.random.random() < self.options["throttle_rate"]
+                latency = self.options["latency"] * (1.0 + self.options["latency_jitter"] * (2.0 * self.random.random() - 1.0))
+                if throttle:
+                    self.throttled[operation] += 1
+            if latency > 0:
+                time.sleep(latency)
+            if not throttle:
+                return
+            if attempt < retries:
+                time.sleep(self.options["retry_after"])
+        raise throttle_error(self.options["retry_after"])
+
+    def stats(self):
+        with self.lock:
+            return {"calls": dict(self.calls), "throttled": dict(self.throttled), "bytes_uploaded": self.bytes_uploaded,
+                "bytes_downloaded": self.bytes_downloaded}
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls.clear()
+            self.throttled.clear()
+            self.bytes_uploaded = 0
+            self.bytes_downloaded = 0
+
+    ###############################################################################################
+    # Task lifecycle
+
+    def task_runtime(self):
+        runtime = self.options["task_runtime"]
+        if isinstance(runtime, (list, tuple)):
+            runtime = self.random.uniform(runtime[0], runtime[1])
+        if self.random.random() < self.options["straggler_rate"]:
+            runtime *= self.options["straggler_factor"]
+        return runtime
+
+    # Remove running tasks (of a job) from the schedule, so they do not occupy slots
+    def drop_running(self, job_id, task_id=None):
+        self.running = [entry for entry in self.running if entry[2] != job_id or (task_id is not None and entry[3] != task_id)]
+        heapq.heapify(self.running)
+
+    def enqueue(self, job_id, task, now):
+        if task.get('state') == batchmodels.TaskState.running:
+            self.drop_running(job_id, task['id'])
+        task['generation'] += 1
+        task['state'] = batchmodels.TaskState.active
+        task['state_transition_time'] = now
+        task['start_time'] = task['end_time'] = task['exit_code'] = task['result'] = task['failure'] = None
+        self.queue.append((now + self.options["schedule_delay"], job_id, task['id'], task['generation']))
+
+    def current(self, job_id, task_id, generation):
+        task = self.jobs.get(job_id, {}).get('tasks', {}).get(task_id)
+        return task if task is not None and task['generation'] == generation else None
+
+    # Process all task starts and completions up to the given time (in order)
+    def advance(self, now=None):
+        now = time.time() if now is None else now
+        slots = self.options["slots"]
+        with self.lock:
+            while True:
+                while len(self.queue) > 0 and self.current(*self.queue[0][1:]) is None:
+                    self.queue.popleft()
+                while len(self.running) > 0 and self.current(*self.running[0][2:]) is None:
+                    heapq.heappop(self.running)
+                free = slots is None or len(self.running) < slots
+                t_start = max(self.queue[0][0], self.clock) if len(self.queue) > 0 and free else math.inf
+                t_end = self.running[0][0] if len(self.running) > 0 else math.inf
+                if min(t_start, t_end) > now:
+                    break
+                if t_end <= t_start:
+                    end_time, _, job_id, task_id, generation = heapq.heappop(self.running)
+                    self.clock = end_time
+                    task = self.current(job_id, task_id, generation)
+                    failed = self.random.random() < self.options["task_failure_rate"]
+                    task.update(state=batchmodels.TaskState.completed, state_transition_time=end_time,
+                        end_time=end_time, exit_code=1 if failed else 0,
+                        result=batchmodels.TaskExecutionResult.failure if failed else batchmodels.TaskExecutionResult.success,
+                        failure=('FailureExitCode', 'The task exited with an exit code representing a failure') if failed else None)
+                    self.notify(job_id, task)
+                else:
+                    _, job_id, task_id, generation = self.queue.popleft()
+                    self.clock = t_start
+                    task = self.current(job_id, task_id, generation)
+                    task.update(state=batchmodels.TaskState.running, state_transition_time=t_start, start_time=t_start)
+                    self.sequence += 1
+                    heapq.heappush(self.running, (t_start + self.task_runtime(), self.sequence, job_id, task_id, generation))
+
+    def complete(self, job_id, task, now, code, message):
+        if task['state'] == batchmodels.TaskState.running:
+            self.drop_running(job_id, task['id'])
+        task['generation'] += 1
+        task.update(state=batchmodels.TaskState.completed, state_transition_time=now, end_time=now,
+            exit_code=None, result=batchmodels.TaskExecutionResult.failure, failure=(code, message))
+        if task['start_time'] is None:
+            task['start_time'] = now
+
+    # Post the completion message of a task to its completion queue (the local tasks have no output files)
+    def notify(self, job_id, task):
+        environment = {setting.name: setting.value for setting in task['parameter'].environment_settings or []}
+        match = _QUEUE_URL.match(environment.get('COMPLETION_QUEUE_URL', ''))
+        if match is None or self.random.random() < self.options["message_loss_rate"]:
+            return
+        message = {"job_id": job_id, "task_id": task['id'], "exit_code": task['exit_code'],
+            "runtime": task['end_time'] - task['start_time'], "outputs": []}
+        self.put_message(match.group(1), match.group(2), 
+            base64.b64encode(json.dumps(message).encode('utf-8')).decode('utf-8'), task['end_time'])
+
+    # Snapshot of a task as SDK model (later state changes do not modify it)
+    def cloud_task(self, task):
+        failure_info = None
+        if task['failure'] is not None:
+            failure_info = batchmodels.TaskFailureInformation(category=batchmodels.ErrorCategory.user_error,
+                code=task['failure'][0], message=task['failure'][1])
+        execution_info = batchmodels.TaskExecutionInformation(retry_count=task['retry_count'], requeue_count=0,
+            start_time=None if task['start_time'] is None else _utc(task['start_time']),
+            end_time=None if task['end_time'] is None else _utc(task['end_time']),
+            exit_code=task['exit_code'], result=task['result'], failure_info=failure_info)
+        parameter = task['parameter']
+        return batchmodels.CloudTask(id=task['id'], display_name=parameter.display_name,
+            creation_time=_utc(task['creation_time']), state=task['state'],
+            state_transition_time=_utc(task['state_transition_time']), command_line=parameter.command_line,
+            resource_files=parameter.resource_files, output_files=parameter.output_files,
+            environment_settings=parameter.environment_settings, constraints=parameter.constraints,
+            user_identity=parameter.user_identity, execution_info=execution_info)
+
+    ###############################################################################################
+    # Blob store
+
+    def blob_path(self, account_name, container_name, blob_name):
+        return os.path.join(self.options["root"], account_name, container_name, blob_name)
+
+    def write_blob(self, account_name, container_name, blob_name, data, metadata):
+        if self.options["root"] is not None:
+            path = self.blob_path(account_name, container_name, blob_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as fid:
+                fid.write(data)
+            content = None
+        else:
+            content = bytes(data)
+        return {"content": content, "size": len(data), "metadata": metadata, "etag": '"0x{}"'.format(uuid.uuid4().hex[:16].upper()),
+            "last_modified": _utc(time.time())}
+
+    def read_blob(self, account_name, container_name, blob_name, record, start, end):
+        if record["content"] is not None:
+            return record["content"][start:end]
+        with open(self.blob_path(account_name, container_name, blob_name), 'rb') as fid:
+            fid.seek(start)
+            return fid.read(end - start)
+
+
+    ###############################################################################################
+    # Queues
+
+    def put_message(self, account_name, queue_name, content, now, visibility_timeout=0):
+        with self.lock:
+            queue = self.queues.get(account_name, {}).get(queue_name)
+            if queue is None:
+                return None
+            message = {"id": str(uuid.uuid4()), "content": content, "insertion_time": now,
+                "visible_time": now + visibility_timeout, "pop_receipt": None, "dequeue_count": 0}
+            queue.append(message)
+            return message
+
+
+_QUEUE_URL = re.compile(r'^\w+://([^./]+)\.[^/]+/([^/?]+)/messages')
+
+_local_services = {}
+_local_services_lock = threading.Lock()
+
+# Get (or create) the local service with the given options (dictionary, name or True for the default service)
+def get_local_service(options=True):
+    if options is True:
+        options = {}
+    elif isinstance(options, str):
+        options = {"name": options}
+    name = options.get("name", DEFAULT_OPTIONS["name"])
+    with _local_services_lock:
+        if name not in _local_services:
+            _local_services[name] = LocalService(**options)
+        return _local_services[name]
+
+
+def clear_local_services():
+    with _local_services_lock:
+        _local_services.clear()
+
+
+###################################################################################################
+# Local batch client
+
+def _batch_throttle_error(retry_after):
+    return batch_error(429, 'TooManyRequests', 'The server is busy. Retry the request later.', retry_after=retry_after)
+
+
+class LocalPoolOperations(object):
+
+    def __init__(self, service):
+        self.service = service
+
+    def add(self, pool, pool_add_options=None, **kwargs):
+        self.service.call('pool.add', _batch_throttle_error)
+        with self.service.lock:
+            if pool.id in self.service.pools:
+                raise batch_error(409, 'PoolExists', 'The specified pool already exists.')
+            self.service.pools[pool.id] = {"parameter": pool, "creation_time": time.time(),
+                "target_dedicated_nodes": pool.target_dedicated_nodes or 0, "enable_auto_scale": pool.enable_auto_scale,
+                "auto_scale_formula": pool.auto_scale_formula}
+
+    def _pool(self, pool_id):
+        if pool_id not in self.service.pools:
+            raise batch_error(404, 'PoolNotFound', 'The specified pool does not exist.')
+        return self.service.pools[pool_id]
+
+    def get(self, pool_id, pool_get_options=None, **kwargs):
+        self.service.call('pool.get', _batch_throttle_error)
+        with self.service.lock:
+            pool = self._pool(pool_id)
+            ready = time.time() - pool["creation_time"] >= self.service.options["allocation_time"]
+            parameter = pool["parameter"]
+            return batchmodels.CloudPool(id=pool_id, vm_size=parameter.vm_size, creation_time=_utc(pool["creation_time"]),
+                state=batchmodels.PoolState.active,
+                allocation_state=batchmodels.AllocationState.steady if ready else batchmodels.AllocationState.resizing,
+                virtual_machine_configuration=parameter.virtual_machine_configuration,
+                current_dedicated_nodes=pool["target_dedicated_nodes"] if ready else 0,
+                target_dedicated_nodes=pool["target_dedicated_nodes"], enable_auto_scale=pool["enable_auto_scale"],
+                auto_scale_formula=pool["auto_scale_formula"], start_task=parameter.start_task)
+
+    def exists(self, pool_id, **kwargs):
+        self.service.call('pool.exists', _batch_throttle_error)
+        return pool_id in self.service.pools
+
+    def delete(self, pool_id, pool_delete_options=None, **kwargs):
+        self.service.call('pool.delete', _batch_throttle_error)
+        with self.service.lock:
+            self._pool(pool_id)
+            del self.service.pools[pool_id]
+
+    def resize(self, pool_id, pool_resize_parameter, pool_resize_options=None, **kwargs):
+        self.service.call('pool.resize', _batch_throttle_error)
+        with self.service.lock:
+            pool = self._pool(pool_id)
+            pool["target_dedicated_nodes"] = pool_resize_parameter.target_dedicated_nodes or 0
+            pool["creation_time"] = time.time()
+
+    def enable_auto_scale(self, pool_id, auto_scale_formula=None, auto_scale_evaluation_interval=None,
+        pool_enable_auto_scale_options=None, **kwargs):
+        self.service.call('pool.enable_auto_scale', _batch_throttle_error)
+        with self.service.lock:
+            pool = self._pool(pool_id)
+            pool["enable_auto_scale"] = True
+            pool["auto_scale_formula"] = auto_scale_formula
+
+
+class LocalComputeNodeOperations(object):
+
+    def __init__(self, service):
+        self.service = service
+
+    # Nodes of a ready pool are running (one per running task of the pool's jobs) or idle. Supports filters on the 
+    # node state (e.g. "state eq 'idle'").
+    def list(self, pool_id, compute_node_list_options=None, **kwargs):
+        self.service.call('compute_node.list', _batch_throttle_error)
+        node_filter = None if compute_node_list_options is None else compute_node_list_options.filter
+        with self.service.lock:
+            if pool_id not in self.service.pools:
+                raise batch_error(404, 'PoolNotFound', 'The specified pool does not exist.')
+            self.service.advance()
+            pool = self.service.pools[pool_id]
+            ready = time.time() - pool["creation_time"] >= self.service.options["allocation_time"]
+            num_running = sum(1 for job in self.service.jobs.values() if job["parameter"].pool_info is not None and
+                job["parameter"].pool_info.pool_id == pool_id for task in job["tasks"].values()
+                if task["state"] == batchmodels.TaskState.running) if ready else 0
+            nodes = []
+            for i in range(pool["target_dedicated_nodes"]):
+                if not ready:
+                    state = batchmodels.ComputeNodeState.starting
+                else:
+                    state = batchmodels.ComputeNodeState.running if i < num_running else batchmodels.ComputeNodeState.idle
+                nodes.append(batchmodels.ComputeNode(id='tvm-{}_{}'.format(pool_id, i), state=state,
+                    vm_size=pool["parameter"].vm_size, is_dedicated=True))
+        states = re.findall(r"state eq '(\w+)'", node_filter or '')
+        if len(states) > 0:
+            nodes = [node for node in nodes if getattr(node.state, 'value', node.state) in states]
+        return LocalPaged(nodes)
+
+
+class LocalAccountOperations(object):
+
+    IMAGES = [
+        ('canonical', 'ubuntuserver', '18.04-lts', 'batch.node.ubuntu 18.04'),
+        ('canonical', '0001-com-ubuntu-server-focal', '20_04-lts', 'batch.node.ubuntu 20.04'),
+        ('openlogic', 'centos', '7_9', 'batch.node.centos 7')
+    ]
+
+    def __init__(self, service):
+        self.service = service
+
+    def list_supported_images(self, account_list_supported_images_options=None, **kwargs):
+        self.service.call('account.list_supported_images', _batch_throttle_error)
+        return LocalPaged([batchmodels.ImageInformation(node_agent_sku_id=node_agent_sku_id,
+            image_reference=batchmodels.ImageReference(publisher=publisher, offer=offer, sku=sku, version='latest'),
+            os_type=batchmodels.OSType.linux, verification_type=batchmodels.VerificationType.verified)
+            for (publisher, offer, sku, node_agent_sku_id) in self.IMAGES])
+
+
+class LocalJobOperations(object):
+
+    def __init__(self, service):
+        self.service = service
+
+    def add(self, job, job_add_options=None, **kwargs):
+        self.service.call('job.add', _batch_throttle_error)
+        with self.service.lock:
+            if job.id in self.service.jobs:
+                raise batch_error(409, 'JobExists', 'The specified job already exists.')
+            now = time.time()
+            self.service.jobs[job.id] = {"parameter": job, "creation_time": now, "state": batchmodels.JobState.active,
+                "state_transition_time": now, "end_time": None, "tasks": collections.OrderedDict()}
+
+    def _job(self, job_id):
+        if job_id not in self.service.jobs:
+            raise batch_error(404, 'JobNotFound', 'The specified job does not exist.')
+        return self.service.jobs[job_id]
+
+    def _cloud_job(self, job_id, job):
+        parameter = job["parameter"]
+        pool_id = None if parameter.pool_info is None else parameter.pool_info.pool_id
+        return batchmodels.CloudJob(id=job_id, display_name=parameter.display_name,
+            uses_task_dependencies=parameter.uses_task_dependencies, creation_time=_utc(job["creation_time"]),
+            state=job["state"], state_transition_time=_utc(job["state_transition_time"]), priority=parameter.priority,
+            pool_info=parameter.pool_info, execution_info=batchmodels.JobExecutionInformation(
+            start_time=_utc(job["creation_time"]), end_time=None if job["end_time"] is None else _utc(job["end_time"]),
+            pool_id=pool_id))
+
+    def get(self, job_id, job_get_options=None, **kwargs):
+        self.service.call('job.get', _batch_throttle_error)
+        with self.service.lock:
+            return self._cloud_job(job_id, self._job(job_id))
+
+    def list(self, job_list_options=None, **kwargs):
+        with self.service.lock:
+            jobs = [self._cloud_job(job_id, job) for (job_id, job) in self.service.jobs.items()]
+        for _ in range(max(1, math.ceil(len(jobs) / self.service.options["page_size"]))):
+            self.service.call('job.list', _batch_throttle_error)
+        return LocalPaged(jobs)
+
+    def delete(self, job_id, job_delete_options=None, **kwargs):
+        self.service.call('job.delete', _batch_throttle_error)
+        with self.service.lock:
+            self._job(job_id)
+            del self.service.jobs[job_id]
+            self.service.drop_running(job_id)
+
+    def terminate(self, job_id, terminate_reason=None, job_terminate_options=None, **kwargs):
+        self.service.call('job.terminate', _batch_throttle_error)
+        with self.service.lock:
+            self.service.advance()
+            job = self._job(job_id)
+            now = time.time()
+            for task in job["tasks"].values():
+                if task["state"] != batchmodels.TaskState.completed:
+                    self.service.complete(job_id, task, now, 'TaskEnded', 'The task was terminated with the job.')
+            job.update(state=batchmodels.JobState.completed, state_transition_time=now, end_time=now)
+
+
+# OData filters of task.list: clauses joined by 'and' on state and stateTransitionTime, e.g.
+# "stateTransitionTime ge DateTime'2021-01-01T00:00:00.000000Z' and (state eq 'running' or state eq 'completed')"
+_COMPARISONS = {'eq': lambda x, y: x == y, 'ne': lambda x, y: x != y, 'ge': lambda x, y: x >= y,
+    'gt': lambda x, y: x > y, 'le': lambda x, y: x <= y, 'lt': lambda x, y: x < y}
+_TERM = re.compile(r"^(state|id|stateTransitionTime) (eq|ne|ge|gt|le|lt) (?:DateTime)?'([^']*)'$")
+
+def parse_task_filter(task_filter):
+    if task_filter is None:
+        return lambda task: True
+
+    clauses = []
+    for clause in task_filter.split(' and '):
+        terms = []
+        for term in clause.strip().strip('()').split(' or '):
+            match = _TERM.match(term.strip())
+            if match is None:
+                raise batch_error(400, 'InvalidQueryParameterValue',
+                    'The value for one of the query parameters specified in the request is invalid: {}'.format(term))
+            field, operator, value = match.groups()
+            if field == 'stateTransitionTime':
+                value = datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ').replace(
+                    tzinfo=datetime.timezone.utc).timestamp()
+                terms.append((lambda task, op=operator, value=value:
+                    _COMPARISONS[op](round(task['state_transition_time'], 6), round(value, 6))))
+            elif field == 'state':
+                terms.append((lambda task, op=operator, value=value: _COMPARISONS[op](task['state'].value, value)))
+            else:
+                terms.append((lambda task, op=operator, value=value: _COMPARISONS[op](task['id'], value)))
+        clauses.append(terms)
+    return lambda task: all(any(term(task) for term in terms) for terms in clauses)
+
+
+class LocalTaskOperations(object):
+
+    def __init__(self, service):
+        self.service = service
+
+    def _job(self, job_id):
+        if job_id not in self.service.jobs:
+            raise batch_error(404, 'JobNotFound', 'The specified job does not exist.')
+        return self.service.jobs[job_id]
+
+    def _task(self, job_id, task_id):
+        tasks = self._job(job_id)["tasks"]
+        if task_id not in tasks:
+            raise batch_error(404, 'TaskNotFound', 'The specified task does not exist.')
+        return tasks[task_id]
+
+    def _add(self, job_id, task, now):
+        tasks = self._job(job_id)["tasks"]
+        if task.id in tasks:
+            return batchmodels.TaskAddResult(status=batchmodels.TaskAddStatus.client_error, task_id=task.id,
+                error=batchmodels.BatchError(code='TaskExists', message=batchmodels.ErrorMessage(lang='en-US',
+                value='The specified task already exists.')))
+        if self.service.random.random() < self.service.options["add_error_rate"]:
+            return batchmodels.TaskAddResult(status=batchmodels.TaskAddStatus.server_error, task_id=task.id,
+                error=batchmodels.BatchError(code='ServerBusy', message=batchmodels.ErrorMessage(lang='en-US',
+                value='The server is currently unable to receive requests.')))
+        tasks[task.id] = {"id": task.id, "parameter": task, "creation_time": now, "retry_count": 0, "generation": 0}
+        self.service.enqueue(job_id, tasks[task.id], now)
+        return batchmodels.TaskAddResult(status=batchmodels.TaskAddStatus.success, task_id=task.id)
+
+    def add(self, job_id, task, task_add_options=None, **kwargs):
+        self.service.call('task.add', _batch_throttle_error)
+        with self.service.lock:
+            self.service.advance()
+            result = self._add(job_id, task, time.time())
+        if result.status != batchmodels.TaskAddStatus.success:
+            raise batch_error(409 if result.status == batchmodels.TaskAddStatus.client_error else 503,
+                result.error.code, result.error.message.value)
+
+    def add_collection(self, job_id, value, task_add_collection_options=None, threads=0, **kwargs):
+        self.service.call('task.add_collection', _batch_throttle_error)
+        if len(json.dumps([task.serialize() for task in value])) > MAX_COLLECTION_SIZE:
+            raise batch_error(413, 'RequestBodyTooLarge', 'The request body is too large and exceeds the maximum permissible limit.')
+        with self.service.lock:
+            self.service.advance()
+            now = time.time()
+            return batchmodels.TaskAddCollectionResult(value=[self._add(job_id, task, now) for task in value])
+
+    def get(self, job_id, task_id, task_get_options=None, **kwargs):
+        self.service.call('task.get', _batch_throttle_error)
+        with self.service.lock:
+            self.service.advance()
+            return self.service.cloud_task(self._task(job_id, task_id))
+
+    def list(self, job_id, task_list_options=None, **kwargs):
+        task_filter = parse_task_filter(None if task_list_options is None else task_list_options.filter)
+        with self.service.lock:
+            self.service.advance()
+            tasks = [self.service.cloud_task(task) for task in self._job(job_id)["tasks"].values() if task_filter(task)]
+        for _ in range(max(1, math.ceil(len(tasks) / self.service.options["page_size"]))):
+            self.service.call('task.list', _batch_throttle_error)
+        return LocalPaged(tasks)
+
+    def reactivate(self, job_id, task_id, task_reactivate_options=None, **kwargs):
+        self.service.call('task.reactivate', _batch_throttle_error)
+        with self.service.lock:
+            self.service.advance()
+            task = self._task(job_id, task_id)
+            if task['state'] != batchmodels.TaskState.completed or task['result'] != batchmodels.TaskExecutionResult.failure:
+                raise batch_error(409, 'TaskNotFailed', 'The specified task has not failed and cannot be reactivated.')
+            task['retry_count'] += 1
+            self.service.enqueue(job_id, task, time.time())
+
+    def terminate(self, job_id, task_id, task_terminate_options=None, **kwargs):
+        self.service.call('task.terminate', _batch_throttle_error)
+        with self.service.lock:
+            self.service.advance()
+            task = self._task(job_id, task_id)
+            if task['state'] != batchmodels.TaskState.completed:
+                self.service.complete(job_id, task, time.time(), 'TaskEnded', 'The task was terminated.')
+
+    def delete(self, job_id, task_id, task_delete_options=None, **kwargs):
+        self.service.call('task.delete', _batch_throttle_error)
+        with self.service.lock:
+            if self._task(job_id, task_id)['state'] == batchmodels.TaskState.running:
+                self.service.drop_running(job_id, task_id)
+            del self.service.jobs[job_id]["tasks"][task_id]
+
+
+class LocalBatchClient(object):
+
+    def __init__(self, service):
+        self.service = service
+        self.pool = LocalPoolOperations(service)
+        self.compute_node = LocalComputeNodeOperations(service)
+        self.account = LocalAccountOperations(service)
+        self.job = LocalJobOperations(service)
+        self.task = LocalTaskOperations(service)
+
+
+###################################################################################################
+# Local blob client
+
+def _blob_throttle_error(retry_after):
+    return AzureHttpError('The server is busy.', 503)
+
+
+class LocalBlobService(object):
+
+    MAX_SINGLE_GET_SIZE = 32 * 1024 * 1024
+
+    def __init__(self, service, account_name='local'):
+        self.service = service
+        self.account_name = account_name
+
+    # Throttled calls are retried as by the storage SDK
+    def _call(self, operation):
+        self.service.call(operation, _blob_throttle_error, retries=self.service.options["blob_retries"])
+
+    def _containers(self):
+        return self.service.containers.setdefault(self.account_name, {})
+
+    def _container(self, container_name):
+        if container_name not in self._containers():
+            raise AzureMissingResourceHttpError('The specified container does not exist.', 404)
+        return self._containers()[container_name]
+
+    def _record(self, container_name, blob_name):
+        container = self._container(container_name)
+        if blob_name not in container:
+            raise AzureMissingResourceHttpError('The specified blob does not exist.', 404)
+        return container[blob_name]
+
+    def create_container(self, container_name, metadata=None, public_access=None, fail_on_exist=False, **kwargs):
+        self._call('blob.create_container')
+        with self.service.lock:
+            if container_name in self._containers():
+                if fail_on_exist:
+                    raise AzureConflictHttpError('The specified container already exists.', 409)
+                return False
+            self._containers()[container_name] = {}
+            return True
+
+    def delete_container(self, container_name, fail_not_exist=False, **kwargs):
+        self._call('blob.delete_container')
+        with self.service.lock:
+            if container_name not in self._containers():
+                if fail_not_exist:
+                    raise AzureMissingResourceHttpError('The specified container does not exist.', 404)
+                return False
+            del self._containers()[container_name]
+            return True
+
+    def exists(self, container_name, blob_name=None, **kwargs):
+        self._call('blob.exists')
+        with self.service.lock:
+            container = self._containers().get(container_name)
+            return container is not None and (blob_name is None or blob_name in container)
+
+    def list_blobs(self, container_name, prefix=None, **kwargs):
+        self._call('blob.list_blobs')
+        with self.service.lock:
+            return LocalPaged([self._blob(name, record) for (name, record) in sorted(self._container(container_name).items())
+                if prefix is None or name.startswith(prefix)])
+
+    def _blob(self, blob_name, record, content=None, content_range=None):
+        properties = blobmodels.BlobProperties()
+        properties.blob_type = 'BlockBlob'
+        properties.content_length = record["size"] if content is None else len(content)
+        properties.content_range = content_range
+        properties.etag = record["etag"]
+        properties.last_modified = record["last_modified"]
+        return blobmodels.Blob(name=blob_name, content=content, props=properties, metadata=dict(record["metadata"] or {}))
+
+    # Uploads
+    def _put(self, container_name, blob_name, data, metadata):
+        with self.service.lock:
+            container = self._container(container_name)
+            container[blob_name] = self.service.write_blob(self.account_name, container_name, blob_name, data, metadata)
+            self.service.bytes_uploaded += len(data)
+            properties = blobmodels.ResourceProperties()
+            properties.etag = container[blob_name]["etag"]
+            properties.last_modified = container[blob_name]["last_modified"]
+            return properties
+
+    def create_blob_from_bytes(self, container_name, blob_name, blob, index=0, count=None, metadata=None, **kwargs):
+        self._call('blob.create_blob_from_bytes')
+        count = len(blob) - index if count is None else count
+        return self._put(container_name, blob_name, memoryview(blob)[index:index + count], metadata)
+
+    def create_blob_from_text(self, container_name, blob_name, text, encoding='utf-8', metadata=None, **kwargs):
+        self._call('blob.create_blob_from_text')
+        return self._put(container_name, blob_name, text.encode(encoding), metadata)
+
+    def create_blob_from_stream(self, container_name, blob_name, stream, count=None, metadata=None, **kwargs):
+        self._call('blob.create_blob_from_stream')
+        data = stream.read() if count is None else stream.read(count)
+        return self._put(container_name, blob_name, data, metadata)
+
+    def create_blob_from_path(self, container_name, blob_name, file_path, metadata=None, **kwargs):
+        self._call('blob.create_blob_from_path')
+        with open(file_path, 'rb') as fid:
+            return self._put(container_name, blob_name, fid.read(), metadata)
+
+    # Downloads
+    def _get(self, container_name, blob_name, start_range=None, end_range=None, if_match=None):
+        with self.service.lock:
+            record = self._record(container_name, blob_name)
+            if if_match is not None and if_match != '*' and if_match != record["etag"]:
+                raise AzureHttpError('The condition specified using HTTP conditional header(s) is not met.', 412)
+            if start_range is None:
+                start, end, content_range = 0, record["size"], None
+            else:
+                if start_range >= record["size"]:
+                    raise AzureHttpError('The range specified is invalid for the current size of the resource.', 416)
+                start = start_range
+                end = record["size"] if end_range is None else min(end_range + 1, record["size"])
+                content_range = 'bytes {}-{}/{}'.format(start, end - 1, record["size"])
+            content = self.service.read_blob(self.account_name, container_name, blob_name, record, start, end)
+            self.service.bytes_downloaded += len(content)
+            return self._blob(blob_name, record, content=content, content_range=content_range)
+
+    def get_blob_to_bytes(self, container_name, blob_name, start_range=None, end_range=None, if_match=None, **kwargs):
+        self._call('blob.get_blob_to_bytes')
+        return self._get(container_name, blob_name, start_range=start_range, end_range=end_range, if_match=if_match)
+
+    def get_blob_to_stream(self, container_name, blob_name, stream, start_range=None, end_range=None, if_match=None,
+        **kwargs):
+        self._call('blob.get_blob_to_stream')
+        blob = self._get(container_name, blob_name, start_range=start_range, end_range=end_range, if_match=if_match)
+        stream.write(blob.content)
+        blob.content = None
+        return blob
+
+    def get_blob_to_path(self, container_name, blob_name, file_path, open_mode='wb', start_range=None, end_range=None,
+        **kwargs):
+        self._call('blob.get_blob_to_path')
+        blob = self._get(container_name, blob_name, start_range=start_range, end_range=end_range)
+        with open(file_path, open_mode) as fid:
+            fid.write(blob.content)
+        blob.content = None
+        return blob
+
+    def get_blob_properties(self, container_name, blob_name, **kwargs):
+        self._call('blob.get_blob_properties')
+        with self.service.lock:
+            return self._blob(blob_name, self._record(container_name, blob_name))
+
+    def set_blob_metadata(self, container_name, blob_name, metadata=None, **kwargs):
+        self._call('blob.set_blob_metadata')
+        with self.service.lock:
+            record = self._record(container_name, blob_name)
+            record["metadata"] = dict(metadata or {})
+            record["etag"] = '"0x{}"'.format(uuid.uuid4().hex[:16].upper())
+            properties = blobmodels.ResourceProperties()
+            properties.etag = record["etag"]
+            properties.last_modified = record["last_modified"]
+            return properties
+
+    def delete_blob(self, container_name, blob_name, **kwargs):
+        self._call('blob.delete_blob')
+        with self.service.lock:
+            record = self._record(container_name, blob_name)
+            del self._container(container_name)[blob_name]
+            if record["content"] is None:
+                os.remove(self.service.blob_path(self.account_name, container_name, blob_name))
+
+    # URLs and shared access signatures (not validated by the local service)
+    def make_blob_url(self, container_name, blob_name, protocol=None, sas_token=None, snapshot=None):
+        url = '{}://{}.blob.core.windows.net/{}/{}'.format(protocol or 'https', self.account_name, container_name,
+            blob_name)
+        return url if sas_token is None else '{}?{}'.format(url, sas_token)
+
+    def make_container_url(self, container_name, protocol=None, sas_token=None):
+        url = '{}://{}.blob.core.windows.net/{}?restype=container'.format(protocol or 'https', self.account_name,
+            container_name)
+        return url if sas_token is None else '{}&{}'.format(url, sas_token)
+
+    def generate_blob_shared_access_signature(self, container_name, blob_name, permission=None, expiry=None, **kwargs):
+        return _sas('{}/{}'.format(container_name, blob_name), permission, expiry, 'b')
+
+    def generate_container_shared_access_signature(self, container_name, permission=None, expiry=None, **kwargs):
+        return _sas(container_name, permission, expiry, 'c')
+
+
+def _sas(resource, permission, expiry, resource_type=None):
+    expiry = expiry.strftime('%Y-%m-%dT%H:%M:%SZ') if isinstance(expiry, datetime.datetime) else expiry
+    signature = hashlib.sha256('{}|{}|{}'.format(resource, permission, expiry).encode('utf-8')).hexdigest()[:32]
+    query = 'se={}&sp={}&sv=2018-11-09'.format(expiry, permission)
+    return '{}&sig={}'.format(query if resource_type is None else '{}&sr={}'.format(query, resource_type), signature)
+
+
+###################################################################################################
+# Local queue client
+
+class LocalQueueService(object):
+
+    MAX_MESSAGES = 32
+
+    def __init__(self, service, account_name='local'):
+        self.service = service
+        self.account_name = account_name
+        self.protocol = 'https'
+        self.primary_endpoint = '{}.queue.core.windows.net'.format(account_name)
+
+    # Throttled calls are retried as by the storage SDK
+    def _call(self, operation):
+        self.service.call(operation, _blob_throttle_error, retries=self.service.options["blob_retries"])
+
+    def _queues(self):
+        return self.service.queues.setdefault(self.account_name, {})
+
+    def _queue(self, queue_name):
+        if queue_name not in self._queues():
+            raise AzureMissingResourceHttpError('The specified queue does not exist.', 404)
+        return self._queues()[queue_name]
+
+    def _message(self, message):
+        queue_message = queuemodels.QueueMessage()
+        queue_message.id = message["id"]
+        queue_message.insertion_time = _utc(message["insertion_time"])
+        queue_message.time_next_visible = _utc(message["visible_time"])
+        queue_message.pop_receipt = message["pop_receipt"]
+        queue_message.dequeue_count = message["dequeue_count"]
+        queue_message.content = message["content"]
+        return queue_message
+
+    def create_queue(self, queue_name, metadata=None, fail_on_exist=False, **kwargs):
+        self._call('queue.create_queue')
+        with self.service.lock:
+            if queue_name in self._queues():
+                if fail_on_exist:
+                    raise AzureConflictHttpError('The specified queue already exists.', 409)
+                return False
+            self._queues()[queue_name] = []
+            return True
+
+    def delete_queue(self, queue_name, fail_not_exist=False, **kwargs):
+        self._call('queue.delete_queue')
+        with self.service.lock:
+            if queue_name not in self._queues():
+                if fail_not_exist:
+                    raise AzureMissingResourceHttpError('The specified queue does not exist.', 404)
+                return False
+            del self._queues()[queue_name]
+            return True
+
+    def exists(self, queue_name, **kwargs):
+        self._call('queue.exists')
+        with self.service.lock:
+            return queue_name in self._queues()
+
+    def put_message(self, queue_name, content, visibility_timeout=None, **kwargs):
+        self._call('queue.put_message')
+        with self.service.lock:
+            self._queue(queue_name)
+            message = self.service.put_message(self.account_name, queue_name, content, time.time(), 
+                visibility_timeout=visibility_timeout or 0)
+            return self._message(message)
+
+    # Messages of tasks that completed since the last call are posted first
+    def get_messages(self, queue_name, num_messages=None, visibility_timeout=None, **kwargs):
+        self._call('queue.get_messages')
+        num_messages = 1 if num_messages is None else num_messages
+        if not 1 <= num_messages <= self.MAX_MESSAGES:
+            raise AzureHttpError('One of the query parameters specified in the request URI is outside the '
+                'permissible range.', 400)
+        self.service.advance()
+        now = time.time()
+        with self.service.lock:
+            messages = [message for message in self._queue(queue_name) if message["visible_time"] <= now][:num_messages]
+            for message in messages:
+                message["pop_receipt"] = uuid.uuid4().hex
+                message["visible_time"] = now + (30 if visibility_timeout is None else visibility_timeout)
+                message["dequeue_count"] += 1
+            return [self._message(message) for message in messages]
+
+    def delete_message(self, queue_name, message_id, pop_receipt, **kwargs):
+        self._call('queue.delete_message')
+        with self.service.lock:
+            queue = self._queue(queue_name)
+            for i, message in enumerate(queue):
+                if message["id"] == message_id and message["pop_receipt"] == pop_receipt:
+                    del queue[i]
+                    return
+            raise AzureMissingResourceHttpError('The specified message does not exist.', 404)
+
+    def clear_messages(self, queue_name, **kwargs):
+        self._call('queue.clear_messages')
+        with self.service.lock:
+            del self._queue(queue_name)[:]
+
+    def generate_queue_shared_access_signature(self, queue_name, permission=None, expiry=None, **kwargs):
+        return _sas(queue_name, permission, expiry)
+
+
+###################################################################################################
+# Clients
+
+def create_batch_client(credentials):
+    return LocalBatchClient(get_local_service(credentials['_LOCAL_SERVICE']))
+
+
+def create_blob_client(credentials):
+    return LocalBlobService(get_local_service(credentials['_LOCAL_SERVICE']),
+        account_name=credentials.get('_STORAGE_ACCOUNT_NAME', 'local'))
+
+
+def create_queue_client(credentials):
+    return LocalQueueService(get_local_service(credentials['_LOCAL_SERVICE']),
+        account_name=credentials.get('_STORAGE_ACCOUNT_NAME', 'local'))
@@ -0,0 +1,349 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+# Instrumentation of the outbound calls of the batch, blob and queue clients. Clients are wrapped in an
+# InstrumentedClient, which records the number of calls, latencies (histogram), bytes transferred, errors,
+# throttled requests and retries per operation (e.g. "task.add_collection" or "blob.create_blob_from_path").
+# Every call is passed to the registered hooks (callbacks, OpenTelemetry or Prometheus exporters).
+
+import collections, math, os, threading, time
+
+
+# Upper bounds of the latency buckets in seconds (last bucket is unbounded)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+
+def get_status_code(error):
+    response = getattr(error, 'response', None)
+    return getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+
+
+def is_throttled(error):
+    return get_status_code(error) in (429, 503)
+
+
+class OperationStats(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def add(self, seconds, bytes_sent, bytes_received, error, throttled):
+        self.calls += 1
+        self.errors += error is not None and not throttled
+        self.throttled += throttled
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for (i, bound) in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    # Latency quantile estimated from the histogram (upper bound of the bucket, capped at the maximum latency)
+    def quantile(self, q):
+        if self.calls == 0:
+            return None
+        count = 0
+        for (bound, bucket) in zip(LATENCY_BUCKETS, self.buckets):
+            count += bucket
+            if count >= q * self.calls:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "total_seconds": self.total_seconds,
+            "mean_seconds": self.total_seconds / self.calls if self.calls > 0 else None,
+            "max_seconds": self.max_seconds,
+            "p50_seconds": self.quantile(0.5),
+            "p90_seconds": self.quantile(0.9),
+            "p99_seconds": self.quantile(0.99),
+            "histogram": {"bounds": [str(bound) for bound in LATENCY_BUCKETS], "counts": list(self.buckets)}
+        }
+
+
+# In-memory summary of all calls (always enabled) and list of hooks. A hook is called with a dictionary
+# (operation, seconds, bytes_sent, bytes_received, error, throttled, retry) after every call and retry.
+class Metrics(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = collections.defaultdict(OperationStats)
+        self.hooks = []
+        self.enabled = True
+
+    def record(self, operation, seconds, bytes_sent=0, bytes_received=0, error=None):
+        throttled = error is not None and is_throttled(error)
+        with self.lock:
+            self.operations[operation].add(seconds, bytes_sent, bytes_received, error, throttled)
+            hooks = list(self.hooks)
+        self.notify(hooks, {"operation": operation, "seconds": seconds, "bytes_sent": bytes_sent,
+            "bytes_received": bytes_received, "error": None if error is None else type(error).__name__,
+            "throttled": throttled, "retry": False})
+
+    def record_retry(self, operation):
+        with self.lock:
+            self.operations[operation].retries += 1
+            hooks = list(self.hooks)
+        self.notify(hooks, {"operation": operation, "seconds": 0.0, "bytes_sent": 0, "bytes_received": 0,
+            "error": None, "throttled": False, "retry": True})
+
+    # Exceptions of hooks must not break calls to the services
+    def notify(self, hooks, event):
+        for hook in hooks:
+            try:
+                hook(event)
+            except Exception:
+                pass
+
+    def add_hook(self, hook):
+        with self.lock:
+            self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        with self.lock:
+            if hook in self.hooks:
+                self.hooks.remove(hook)
+
+    def reset(self):
+        with self.lock:
+            self.operations.clear()
+
+    def get_stats(self, reset=False):
+        with self.lock:
+            operations = {operation: stats.summary() for (operation, stats) in sorted(self.operations.items())}
+            if reset:
+                self.operations.clear()
+        total = {key: sum(stats[key] for stats in operations.values()) for key in
+            ("calls", "errors", "throttled", "retries", "bytes_sent", "bytes_received", "total_seconds")}
+        return {"operations": operations, "total": total}
+
+
+metrics = Metrics()
+
+
+###################################################################################################
+# Bytes transferred per call
+
+def _argument(args, kwargs, position, name):
+    if name in kwargs:
+        return kwargs[name]
+    return args[position] if len(args) > position else None
+
+
+def _length(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    try:
+        return memoryview(value).nbytes
+    except TypeError:
+        return 0
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+# Size of downloaded range ("bytes start-end/total") or of the full blob
+def _blob_size(blob):
+    properties = getattr(blob, 'properties', None)
+    content_range = getattr(properties, 'content_range', None)
+    if content_range:
+        try:
+            start, end = content_range.split()[1].split('/')[0].split('-')
+            return int(end) - int(start) + 1
+        except (IndexError, ValueError):
+            pass
+    return getattr(properties, 'content_length', None) or 0
+
+
+BYTES_SENT = {
+    'create_blob_from_bytes': lambda args, kwargs: _length(_argument(args, kwargs, 2, 'blob')),
+    'create_blob_from_text': lambda args, kwargs: _length(_argument(args, kwargs, 2, 'text')),
+    'create_blob_from_path': lambda args, kwargs: _file_size(_argument(args, kwargs, 2, 'file_path')),
+    'create_blob_from_stream': lambda args, kwargs: kwargs.get('count') or 0,
+    'put_message': lambda args, kwargs: _length(_argument(args, kwargs, 1, 'content')),
+}
+
+BYTES_RECEIVED = {
+    'get_blob_to_bytes': lambda result: _length(getattr(result, 'content', None)),
+    'get_blob_to_text': lambda result: _length(getattr(result, 'content', None)),
+    'get_blob_to_stream': _blob_size,
+    'get_blob_to_path': _blob_size,
+    'get_messages': lambda result: sum(_length(getattr(message, 'content', None)) for message in result),
+}
+
+
+###################################################################################################
+# Instrumented clients
+
+def instrument(func, operation, name, metrics=metrics):
+
+    def call(*args, **kwargs):
+        if not metrics.enabled:
+            return func(*args, **kwargs)
+        tstart = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            metrics.record(operation, time.perf_counter() - tstart, error=e)
+            if not hasattr(e, 'operation'):
+                e.operation = operation     # retries are attributed to the failed operation
+            raise
+
+        # Paged results (msrest) request pages while iterating -> record each page as a call
+        if hasattr(result, '_get_next'):
+            result._get_next = instrument(result._get_next, operation, name, metrics=metrics)
+            return result
+
+        bytes_sent = BYTES_SENT[name](args, kwargs) if name in BYTES_SENT else 0
+        bytes_received = BYTES_RECEIVED[name](result) if name in BYTES_RECEIVED else 0
+        metrics.record(operation, time.perf_counter() - tstart, bytes_sent=bytes_sent, bytes_received=bytes_received)
+        return result
+
+    call.operation = operation
+    call.__name__ = name
+    return call
+
+
+# Methods of the storage clients that do not call the service (URLs and shared access signatures are built locally)
+LOCAL_METHOD_PREFIXES = ('make_', 'generate_', 'extract_')
+
+# Proxy of a client (or operation group such as batch_client.task) that instruments all public methods that call
+# the service. Attributes, private methods and local helpers (LOCAL_METHOD_PREFIXES) are passed through.
+class InstrumentedClient(object):
+
+    def __init__(self, client, prefix, metrics=metrics):
+        object.__setattr__(self, '_client', client)
+        object.__setattr__(self, '_prefix', prefix)
+        object.__setattr__(self, '_metrics', metrics)
+        object.__setattr__(self, '_wrapped', {})
+
+    def __getattr__(self, name):
+        wrapped = self._wrapped.get(name)
+        if wrapped is not None:
+            return wrapped
+        attr = getattr(self._client, name)
+        if name.startswith('_') or name.startswith(LOCAL_METHOD_PREFIXES):
+            return attr
+        if type(attr).__name__.endswith('Operations'):
+            wrapped = InstrumentedClient(attr, name, metrics=self._metrics)
+        elif callable(attr):
+            operation = name if self._prefix is None else '{}.{}'.format(self._prefix, name)
+            wrapped = instrument(attr, operation, name, metrics=self._metrics)
+        else:
+            return attr
+        self._wrapped[name] = wrapped
+        return wrapped
+
+    def __setattr__(self, name, value):
+        self._wrapped.pop(name, None)
+        setattr(self._client, name, value)
+
+    def __repr__(self):
+        return 'InstrumentedClient({!r})'.format(self._client)
+
+
+# Batch client operations are named after their operation group (e.g. "pool.add"), blob and queue
+# client operations after the service (e.g. "blob.delete_blob")
+def instrument_client(client, service):
+    if client is None or isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client, None if service == 'batch' else service)
+
+
+def unwrap_client(client):
+    return client._client if isinstance(client, InstrumentedClient) else client
+
+
+###################################################################################################
+# Hooks and exporters
+
+# Export calls as OpenTelemetry metrics (requires the opentelemetry-api package and a configured meter provider)
+class OpenTelemetryHook(object):
+
+    def __init__(self, meter_name='azureclusterlesshpc'):
+        from opentelemetry import metrics as otel_metrics
+        meter = otel_metrics.get_meter(meter_name)
+        self.calls = meter.create_counter('azure.calls', description='Number of calls to Azure services')
+        self.errors = meter.create_counter('azure.errors', description='Number of failed calls')
+        self.throttled = meter.create_counter('azure.throttled', description='Number of throttled calls')
+        self.retries = meter.create_counter('azure.retries', description='Number of retried calls')
+        self.bytes = meter.create_counter('azure.bytes', unit='By', description='Bytes transferred')
+        self.latency = meter.create_histogram('azure.latency', unit='s', description='Latency of calls')
+
+    def __call__(self, event):
+        attributes = {"operation": event["operation"]}
+        if event["retry"]:
+            self.retries.add(1, attributes)
+            return
+        self.calls.add(1, attributes)
+        self.latency.record(event["seconds"], attributes)
+        if event["throttled"]:
+            self.throttled.add(1, attributes)
+        elif event["error"] is not None:
+            self.errors.add(1, attributes)
+        if event["bytes_sent"] > 0:
+            self.bytes.add(event["bytes_sent"], dict(attributes, direction='sent'))
+        if event["bytes_received"] > 0:
+            self.bytes.add(event["bytes_received"], dict(attributes, direction='received'))
+
+
+# Export calls as Prometheus metrics (requires the prometheus_client package). Metrics are added to the
+# given registry (default registry of prometheus_client otherwise).
+class PrometheusHook(object):
+
+    def __init__(self, namespace='azureclusterlesshpc', registry=None):
+        import prometheus_client
+        kwargs = {} if registry is None else {"registry": registry}
+        self.calls = prometheus_client.Counter('calls', 'Number of calls to Azure services', ['operation'],
+            namespace=namespace, **kwargs)
+        self.errors = prometheus_client.Counter('errors', 'Number of failed calls', ['operation'],
+            namespace=namespace, **kwargs)
+        self.throttled = prometheus_client.Counter('throttled', 'Number of throttled calls', ['operation'],
+            namespace=namespace, **kwargs)
+        self.retries = prometheus_client.Counter('retries', 'Number of retried calls', ['operation'],
+            namespace=namespace, **kwargs)
+        self.bytes = prometheus_client.Counter('bytes', 'Bytes transferred', ['operation', 'direction'],
+            namespace=namespace, **kwargs)
+        self.latency = prometheus_client.Histogram('latency_seconds', 'Latency of calls', ['operation'],
+            namespace=namespace, buckets=LATENCY_BUCKETS, **kwargs)
+
+    def __call__(self, event):
+        operation = event["operation"]
+        if event["retry"]:
+            self.retries.labels(operation).inc()
+            return
+        self.calls.labels(operation).inc()
+        self.latency.labels(operation).observe(event["seconds"])
+        if event["throttled"]:
+            self.throttled.labels(operation).inc()
+        elif event["error"] is not None:
+            self.errors.labels(operation).inc()
+        if event["bytes_sent"] > 0:
+            self.bytes.labels(operation, 'sent').inc(event["bytes_sent"])
+        if event["bytes_received"] > 0:
+            self.bytes.labels(operation, 'received').inc(event["bytes_received"])
@@ -6,12 +6,15 @@
 # Exports
 export create_batch_client, create_blob_client, create_queue_client, create_clients
 export create_blob_containers, create_pool_and_resource_file, resize_pool, create_pool
-export create_batch_resource_from_file, create_batch_resource_from_bytes, create_batch_resource_from_blob
-export create_batch_job, create_batch_task, submit_batch_job, create_batch_env
-export wait_for_tasks_to_complete, wait_for_task_to_complete#, wait_for_one_task_to_complete
-export create_batch_output_file, create_task_constraint, enable_auto_scale, create_batch_envs
+export create_batch_resource_from_file, create_batch_resources_from_files, create_batch_resource_from_bytes
+export create_batch_resource_from_blob
+export create_batch_job, create_batch_task, submit_batch_job, submit_tasks, create_batch_env
+export wait_for_tasks_to_complete, wait_for_all_tasks_to_complete, wait_for_task_to_complete#, wait_for_one_task_to_complete
+export create_batch_output_file, create_output_file_builder, create_task_constraint, enable_auto_scale, create_batch_envs
 export wait_for_one_task_from_multi_jobs, wait_for_one_task_from_multi_pool
-export upload_bytes_to_container, create_blob_url, create_batch_resource_from_blob_url
+export upload_bytes_to_container, create_blob_url, create_blob_urls, create_batch_resource_from_blob_url
+export download_blobs, upload_file_range
+export get_stats, reset_stats
 
 
 ###################################################################################################
@@ -28,7 +31,7 @@ end
 
 
 function create_queue_client(credentials::Dict{String, Any})
-    return azureclusterlesshpc.queue_blob_client(credentials)
+    return azureclusterlesshpc.create_queue_client(credentials)
 end
 
 
@@ -67,6 +70,15 @@ function create_clients(credential_list::Array; batch::Bool=false, blob::Bool=fa
     return clients
 end
 
+
+###################################################################################################
+# Call statistics
+
+# Calls, errors, throttled requests, retries, bytes and latencies per operation (and in total) of all clients
+get_stats(; reset=false) = azureclusterlesshpc.get_stats(reset=reset)
+
+reset_stats() = azureclusterlesshpc.reset_stats()
+
 ###################################################################################################
 # Blob stuff
 
@@ -74,17 +86,38 @@ end
 create_blob_url(blob_client::PyObject, container_name, blob_list) = 
     azureclusterlesshpc.create_blob_url(blob_client, container_name, blob_list)
 
-upload_bytes_to_container(blob_client::PyObject, container_name, blob_name, blob; verbose=true) = 
-    azureclusterlesshpc.upload_bytes_to_container(blob_client, container_name, blob_name, blob; verbose=verbose)
+create_blob_urls(blob_client::PyObject, container_name, blob_list; shared=false) = 
+    azureclusterlesshpc.create_blob_urls(blob_client, container_name, blob_list, shared=shared)
+
+upload_bytes_to_container(blob_client::PyObject, container_name, blob_name, blob; verbose=true, compression=nothing) = 
+    azureclusterlesshpc.upload_bytes_to_container(blob_client, container_name, blob_name, blob; verbose=verbose,
+        compression=compression)
+
+# Upload (part of) a file from a memory map
+upload_file_range(blob_client::PyObject, container_name, blob_name, file_path; offset=0, length=nothing, verbose=true) = 
+    azureclusterlesshpc.upload_file_range(blob_client, container_name, blob_name, file_path; offset=offset, 
+        length=length, verbose=verbose)
+
+# Download blobs concurrently (into new buffers, given buffers/files or a directory)
+download_blobs(blob_client::PyObject, container_name, blob_names; max_workers=8, into=nothing, delete=false) = 
+    azureclusterlesshpc.download_blobs(blob_client, container_name, collect(blob_names); max_workers=max_workers, 
+        into=into, delete=delete)
 
 # Create containers given a list of container names
 create_blob_containers(blob_client::PyObject, container_name_list::Array{String, 1}) =
     azureclusterlesshpc.create_blob_containers(blob_client, container_name_list)
 
+# Delete container (and the upload cache entries of its blobs)
+delete_blob_container(blob_client::PyObject, container_name) =
+    azureclusterlesshpc.delete_blob_container(blob_client, container_name)
+
 
 create_batch_output_file(blob_client, storage_account_name, container_name, filename) =
     azureclusterlesshpc.create_batch_output_file(blob_client, storage_account_name, container_name, filename)
 
+create_output_file_builder(blob_client, storage_account_name, container_name) =
+    azureclusterlesshpc.create_output_file_builder(blob_client, storage_account_name, container_name)
+
 
 ###################################################################################################
 # Batch stuff
@@ -93,26 +126,26 @@ create_batch_output_file(blob_client, storage_account_name, container_name, file
 function create_pool(batch_service_client, pool_id, pool_vm_size, pool_node_count, node_os_publisher, 
     node_os_offer, node_os_sku; image_resource_id=nothing, enable_inter_node=false, resource_files=nothing,
     enable_auto_scale=false, auto_scale_formula=nothing, auto_scale_evaluation_interval_minutes=nothing,
-    container=nothing, container_registry=nothing, app_insights=nothing)
+    container=nothing, container_registry=nothing, app_insights=nothing, node_agent_sku_id=nothing)
 
     azureclusterlesshpc.create_pool(batch_service_client, pool_id, pool_vm_size, pool_node_count, node_os_publisher, 
         node_os_offer, node_os_sku, image_resource_id=image_resource_id, enable_inter_node=enable_inter_node, 
         resource_files=resource_files, enable_auto_scale=enable_auto_scale, auto_scale_formula=auto_scale_formula, 
         auto_scale_evaluation_interval_minutes=auto_scale_evaluation_interval_minutes, container=container,
-        container_registry=container_registry, app_insights=app_insights)
+        container_registry=container_registry, app_insights=app_insights, node_agent_sku_id=node_agent_sku_id)
 end
 
 # Create pool and resource file
 function create_pool_and_resource_file(clients, pool_id, pool_vm_size, pool_node_count, node_os_publisher, 
     node_os_offer, node_os_sku, file_name, container_name; image_resource_id=nothing, enable_inter_node=false,
     enable_auto_scale=false, auto_scale_formula=nothing, auto_scale_evaluation_interval_minutes=15, container=false,
-    container_registry=nothing, app_insights=nothing)
+    container_registry=nothing, app_insights=nothing, node_agent_sku_id=nothing)
 
     azureclusterlesshpc.create_pool_and_resource_file(clients, pool_id, pool_vm_size, pool_node_count, 
         node_os_publisher, node_os_offer, node_os_sku, file_name, container_name, image_resource_id=image_resource_id,
         enable_inter_node=enable_inter_node, enable_auto_scale=enable_auto_scale, auto_scale_formula=auto_scale_formula,
         auto_scale_evaluation_interval_minutes=auto_scale_evaluation_interval_minutes, container=container,
-        container_registry=container_registry, app_insights=app_insights)
+        container_registry=container_registry, app_insights=app_insights, node_agent_sku_id=node_agent_sku_id)
 end
 
 # Enable auto scaling for batch pool
@@ -138,14 +171,20 @@ create_batch_resource_from_file(blob_client, container, file; verbose=true) =
     azureclusterlesshpc.create_batch_resource_from_file(blob_client, container, file, verbose=verbose)
 
 
+# Create resource files from list of files (uploaded concurrently)
+create_batch_resources_from_files(blob_client, container, files; verbose=true) = 
+    azureclusterlesshpc.create_batch_resources_from_files(blob_client, container, files, verbose=verbose)
+
+
 # Create resource file from existing blob
 create_batch_resource_from_blob(blob_client, container, blob) = 
     azureclusterlesshpc.create_batch_resource_from_blob(blob_client, container, blob)
 
 
 # Create resource file from bytes
-create_batch_resource_from_bytes(blob_client, container, blob_name, blob; verbose=true) =
-    azureclusterlesshpc.create_batch_resource_from_bytes(blob_client, container, blob_name, blob, verbose=verbose)
+create_batch_resource_from_bytes(blob_client, container, blob_name, blob; verbose=true, compression=nothing) =
+    azureclusterlesshpc.create_batch_resource_from_bytes(blob_client, container, blob_name, blob, verbose=verbose,
+        compression=compression)
 
 
 # Create batch job
@@ -162,35 +201,92 @@ create_batch_task(; resource_files=nothing, environment_variables=nothing, appli
         num_nodes_per_task=num_nodes_per_task, docker_container=docker_container)
 
     
+# Submit tasks in chunks via concurrent add_collection calls
+submit_tasks(batch_client, job_id, tasks; max_workers=8, num_retries=3, verbose=true) =
+    azureclusterlesshpc.submit_tasks(batch_client, job_id, tasks, max_workers=max_workers, num_retries=num_retries,
+        verbose=verbose)
+
+
 # Create task constraints
 create_task_constraint(; max_wall_clock_time=nothing, retention_time=nothing, max_task_retry_count=0) = 
     azureclusterlesshpc.create_task_constraint(max_wall_clock_time=max_wall_clock_time, retention_time=retention_time, 
         max_task_retry_count=max_task_retry_count)
 
 
+# Polling policy of wait functions (intervals in seconds, set via parameter file)
+function create_polling_policy(params=__params__)
+    isnothing(params) && return nothing
+    return azureclusterlesshpc.PollingPolicy(min_interval=parse(Float64, params["_POLL_MIN_INTERVAL"]),
+        max_interval=parse(Float64, params["_POLL_MAX_INTERVAL"]), backoff=parse(Float64, params["_POLL_BACKOFF"]),
+        jitter=parse(Float64, params["_POLL_JITTER"]))
+end
+
+
+# Speculative copies of straggler tasks in wait functions (disabled if _SPECULATION_MULTIPLE is 0, set via parameter file)
+function configure_speculation(params=__params__)
+    isnothing(params) && return nothing
+    multiple = parse(Float64, params["_SPECULATION_MULTIPLE"])
+    multiple > 0 || return azureclusterlesshpc.configure_speculation(nothing)
+    return azureclusterlesshpc.configure_speculation(multiple=multiple, 
+        percentile=parse(Float64, params["_SPECULATION_PERCENTILE"]), 
+        min_samples=parse(Int, params["_SPECULATION_MIN_SAMPLES"]),
+        max_copies=parse(Int, params["_SPECULATION_MAX_COPIES"]))
+end
+
+
+# Completion notifications: tasks post a message to a storage queue of their job on exit (enabled via parameter file)
+function create_completion_queue(queue_client, job_id)
+    return azureclusterlesshpc.create_completion_queue(queue_client, azureclusterlesshpc.completion_queue_name(job_id))
+end
+
+function enable_completion_notifications(batch_client, job_id, queue_client; blob_client=nothing, container_name=nothing,
+    params=__params__)
+    return azureclusterlesshpc.enable_completion_notifications(batch_client, job_id, queue_client, 
+        azureclusterlesshpc.completion_queue_name(job_id), blob_client=blob_client, container_name=container_name,
+        interval=parse(Float64, params["_COMPLETION_QUEUE_INTERVAL"]), 
+        safety_interval=parse(Float64, params["_COMPLETION_QUEUE_SAFETY_INTERVAL"]))
+end
+
+disable_completion_notifications(batch_client, job_id; delete_queue=true) = 
+    azureclusterlesshpc.disable_completion_notifications(batch_client, job_id, delete_queue=delete_queue)
+
+
 # Wait for all tasks to complete
-wait_for_tasks_to_complete(batch_service_client, job_id;  task_timeout=60, fetch_timeout=60, verbose=true, num_restart=0) = 
+wait_for_tasks_to_complete(batch_service_client, job_id;  task_timeout=60, fetch_timeout=60, verbose=true, num_restart=0,
+    incremental=true, progress_callback=nothing, polling_policy=create_polling_policy()) = 
     azureclusterlesshpc.wait_for_tasks_to_complete(batch_service_client, job_id, task_timeout=task_timeout, 
-        fetch_timeout=fetch_timeout, verbose=verbose, num_restart=num_restart)
+        fetch_timeout=fetch_timeout, verbose=verbose, num_restart=num_restart, incremental=incremental,
+        progress_callback=progress_callback, polling_policy=polling_policy)
+
+
+# Wait for all tasks of several jobs to complete (jobs are monitored concurrently, returns one status per job)
+wait_for_all_tasks_to_complete(batch_service_clients, job_ids; task_timeout=60, fetch_timeout=60, verbose=true, 
+    num_restart=0, polling_policy=create_polling_policy()) = 
+    pycall(azureclusterlesshpc.aio.wait_for_all_sync, Vector{Any}, batch_service_clients, job_ids, 
+        task_timeout=task_timeout, fetch_timeout=fetch_timeout, verbose=verbose, num_restart=num_restart, 
+        polling_policy=polling_policy)
 
 
 # Wait for specified task to complete
-wait_for_task_to_complete(batch_service_client, job_id, task_id, timeout; verbose=true, num_restart=0) = 
+wait_for_task_to_complete(batch_service_client, job_id, task_id, timeout; verbose=true, num_restart=0,
+    polling_policy=create_polling_policy()) = 
     azureclusterlesshpc.wait_for_task_to_complete(batch_service_client, job_id, task_id, timeout, verbose=verbose,
-    num_restart=num_restart)
+    num_restart=num_restart, polling_policy=polling_policy)
     
 
 # Wait for one task from a list of tasks to complete
 wait_for_one_task_from_multi_pool(batch_service_client, job_id, task_id_list;
-    task_timeout=60, fetch_timeout=60, verbose=true, num_restart=0) = 
+    task_timeout=60, fetch_timeout=60, verbose=true, num_restart=0, polling_policy=create_polling_policy()) = 
     azureclusterlesshpc.wait_for_one_task_from_multi_pool(batch_service_client, job_id, task_id_list, 
-    task_timeout=task_timeout, fetch_timeout=fetch_timeout, verbose=verbose, num_restart=num_restart)
+    task_timeout=task_timeout, fetch_timeout=fetch_timeout, verbose=verbose, num_restart=num_restart,
+    polling_policy=polling_policy)
 
 
 wait_for_one_task_from_multi_jobs(batch_service_client, job_id_list, task_id_list;
-    task_timeout=60, fetch_timeout=60, verbose=true, num_restart=0) =
+    task_timeout=60, fetch_timeout=60, verbose=true, num_restart=0, polling_policy=create_polling_policy()) =
     azureclusterlesshpc.wait_for_one_task_from_multi_jobs(batch_service_client, job_id_list, task_id_list, 
-    task_timeout=task_timeout, fetch_timeout=fetch_timeout, verbose=verbose, num_restart=num_restart)
+    task_timeout=task_timeout, fetch_timeout=fetch_timeout, verbose=verbose, num_restart=num_restart,
+    polling_policy=polling_policy)
 
 # Create batch environment variable
 create_batch_env(name, value) = azureclusterlesshpc.create_batch_env(name, value)
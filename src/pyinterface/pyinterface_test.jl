@@ -34,8 +34,12 @@ end
 # Create containers given a list of container names
 create_blob_containers(blob_client::Nothing, container_name_list::Array{String, 1}) = nothing
 
+delete_blob_container(blob_client::Nothing, container_name) = nothing
+
 create_batch_output_file(blob_client::Nothing, storage_account_name, container_name, filename) = nothing
 
+create_output_file_builder(blob_client::Nothing, storage_account_name, container_name) = nothing
+
 ###################################################################################################
 # Batch stuff
 
@@ -67,6 +71,10 @@ resize_pool(batch_client::Nothing, pool_id, target_dedicated_nodes, target_low_p
 create_batch_resource_from_file(blob_client::Nothing, container, file) = [nothing]
 
 
+# Create resource files from list of files
+create_batch_resources_from_files(blob_client::Nothing, container, files; verbose=true) = [nothing for file in files]
+
+
 # Create resource file from existing blob
 create_batch_resource_from_blob(blob_client::Nothing, container, blob) = [nothing]
 
@@ -81,6 +89,9 @@ create_batch_job(batch_client::Nothing, job_id, pool_id; uses_task_dependencies=
 # Wait for all tasks to complete
 wait_for_tasks_to_complete(batch_service_client::Nothing, job_id, timeout, verbose=true, num_restart=0) = true
 
+# Wait for all tasks of several jobs to complete
+wait_for_all_tasks_to_complete(batch_service_clients::Array{Nothing,1}, job_ids; kwargs...) = Any[true for job_id in job_ids]
+
 # Wait for specified task to complete
 wait_for_task_to_complete(batch_service_client::Nothing, job_id, task_id, timeout, verbose=true) = true
 
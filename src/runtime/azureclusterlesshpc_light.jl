@@ -7,6 +7,8 @@ using Serialization
 export BlobRef, BatchFuture, BlobFuture, fetch!, remote_reduction#, fetchreduce_batch
 import Base.fetch
 
+include("compression.jl")
+
 
 #######################################################################################################################
 # Futures
@@ -22,23 +24,19 @@ end
 
 function fetch(arg::BatchFuture)
     if haskey(ENV, "AZ_BATCH_TASK_SHARED_DIR")
-        iostream = open(join([ENV["AZ_BATCH_TASK_SHARED_DIR"], "/", arg.blob.name]), "r")
+        data = deserialize_file(join([ENV["AZ_BATCH_TASK_SHARED_DIR"], "/", arg.blob.name]))
     else
-        iostream = open(arg.blob.name, "r")
+        data = deserialize_file(arg.blob.name)
     end
-    data = deserialize(iostream)
-    close(iostream)
     return data
 end
 
 function fetch!(arg::BatchFuture)
     if haskey(ENV, "AZ_BATCH_TASK_SHARED_DIR")
-        iostream = open(join([ENV["AZ_BATCH_TASK_SHARED_DIR"], "/", arg.blob.name]), "r")
+        arg.blob = deserialize_file(join([ENV["AZ_BATCH_TASK_SHARED_DIR"], "/", arg.blob.name]))
     else
-        iostream = open(arg.blob.name, "r")
+        arg.blob = deserialize_file(arg.blob.name)
     end
-    arg.blob = deserialize(iostream)
-    close(iostream)
     return arg.blob
 end
 
@@ -56,12 +54,10 @@ function fetch(arg::BlobFuture)
 
         # Fetch blob and add to collection
         if haskey(ENV, "AZ_BATCH_TASK_SHARED_DIR")
-            iostream = open(join([ENV["AZ_BATCH_TASK_SHARED_DIR"], "/", blob]), "r")
+            push!(out_files, deserialize_file(join([ENV["AZ_BATCH_TASK_SHARED_DIR"], "/", blob])))
         else
-            iostream = open(blob, "r")
+            push!(out_files, deserialize_file(blob))
         end
-        push!(out_files, deserialize(iostream))
-        close(iostream)
     end
     
     if num_files > 1
@@ -80,12 +76,10 @@ function fetch!(arg::BlobFuture)
 
         # Fetch blob and add to collection
         if haskey(ENV, "AZ_BATCH_TASK_SHARED_DIR")
-            iostream = open(join([ENV["AZ_BATCH_TASK_SHARED_DIR"], "/", blob]), "r")
+            push!(out_files, deserialize_file(join([ENV["AZ_BATCH_TASK_SHARED_DIR"], "/", blob])))
         else
-            iostream = open(blob, "r")
+            push!(out_files, deserialize_file(blob))
         end
-        push!(out_files, deserialize(iostream))
-        close(iostream)
     end
     
     if num_files > 1
@@ -14,9 +14,7 @@ end
 
 # Load packages first
 try
-    iostream = open(join([batchdir, "/packages.dat"]), "r")
-    package_expr = deserialize(iostream)
-    close(iostream)
+    package_expr = AzureClusterlessHPC.deserialize_file(join([batchdir, "/packages.dat"]))
     eval(package_expr)
 catch
     nothing
@@ -24,9 +22,7 @@ end
 
 # Load AST
 filename = ENV["FILENAME"]
-iostream = open(join([batchdir, "/", filename]), "r")
-ast = deserialize(iostream)
-close(iostream)
+ast = AzureClusterlessHPC.deserialize_file(join([batchdir, "/", filename]))
 
 # Execute
 eval(ast)
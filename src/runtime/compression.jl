@@ -0,0 +1,101 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+
+#######################################################################################################################
+# Payload compression
+
+# Serialized payloads (task expressions, broadcasts and task outputs) are compressed with zstd or lz4 if their
+# estimated size is at least min_size bytes. Values are serialized into and deserialized from the (de)compressor
+# stream, so the uncompressed payload is never held in memory. The codec is recognized from the magic number of
+# the frame, i.e. compressed and uncompressed payloads are read by the same functions.
+
+const ZSTD_MAGIC = UInt8[0x28, 0xb5, 0x2f, 0xfd]
+const LZ4_MAGIC = UInt8[0x04, 0x22, 0x4d, 0x18]
+
+# Codec packages are only loaded once a payload is compressed or decompressed, so batch workers do not need them
+# for uncompressed payloads (code using the loaded codecs runs via invokelatest)
+const CODEC_PACKAGES = Dict(
+    "zstd" => Base.PkgId(Base.UUID("6b39b394-51ab-5f42-8807-6242bab2b4c2"), "CodecZstd"),
+    "lz4" => Base.PkgId(Base.UUID("5ba52731-8f18-5e0d-9241-30f10d1ec561"), "CodecLz4"))
+const TRANSCODING_STREAMS = Base.PkgId(Base.UUID("3bb67fe8-82b1-5028-8e26-92a6c54297fa"), "TranscodingStreams")
+
+function codec_package(compression)
+    if ~haskey(CODEC_PACKAGES, compression)
+        throw(ArgumentError("Unknown compression $compression. Use \"zstd\", \"lz4\" or \"none\"."))
+    end
+    return Base.require(CODEC_PACKAGES[compression])
+end
+
+# Defaults of batch workers (set via the task environment)
+default_compression() = get(ENV, "COMPRESSION", "none")
+default_compression_level() = parse(Int, get(ENV, "COMPRESSION_LEVEL", "0"))
+default_compression_min_size() = parse(Int, get(ENV, "COMPRESSION_MIN_SIZE", "65536"))
+
+# Compressor stream (level 0 is the default level of the codec)
+function compressor_stream(io::IO, codec::Module, compression, level)
+    if compression == "zstd"
+        return level == 0 ? codec.ZstdCompressorStream(io) : codec.ZstdCompressorStream(io; level=level)
+    else
+        return codec.LZ4FrameCompressorStream(io; compressionlevel=level)
+    end
+end
+
+function serialize_compressed(io::IO, value, codec::Module, compression, level)
+    stream = compressor_stream(io, codec, compression, level)
+    serialize(stream, value)
+    write(stream, Base.root_module(TRANSCODING_STREAMS).TOKEN_END)
+    flush(stream)
+end
+
+# Serialize value to io. Returns the codec ("zstd", "lz4" or nothing if uncompressed)
+function serialize_payload(io::IO, value; compression=default_compression(), level=default_compression_level(),
+    min_size=default_compression_min_size())
+    if compression == "none" || Base.summarysize(value) < min_size
+        serialize(io, value)
+        return nothing
+    end
+    codec = codec_package(compression)
+    Base.invokelatest(serialize_compressed, io, value, codec, compression, level)
+    return compression
+end
+
+# Serialize value to bytes. Returns the bytes and the codec
+function serialize_payload(value; kwargs...)
+    iostream = IOBuffer()
+    encoding = serialize_payload(iostream, value; kwargs...)
+    return take!(iostream), encoding
+end
+
+serialize_file(filename, value; kwargs...) = open(iostream -> serialize_payload(iostream, value; kwargs...), filename, "w")
+
+# Codec of a payload from the magic number of its frame (io is not advanced)
+function payload_encoding(io::IO)
+    mark(io)
+    magic = read(io, 4)
+    reset(io)
+    magic == ZSTD_MAGIC && return "zstd"
+    magic == LZ4_MAGIC && return "lz4"
+    return nothing
+end
+
+function deserialize_compressed(io::IO, codec::Module, encoding)
+    if encoding == "zstd"
+        return deserialize(codec.ZstdDecompressorStream(io))
+    else
+        return deserialize(codec.LZ4FrameDecompressorStream(io))
+    end
+end
+
+function deserialize_payload(io::IO)
+    encoding = payload_encoding(io)
+    isnothing(encoding) && return deserialize(io)
+    codec = codec_package(encoding)
+    return Base.invokelatest(deserialize_compressed, io, codec, encoding)
+end
+
+deserialize_payload(bytes::AbstractVector{UInt8}) = deserialize_payload(IOBuffer(bytes))
+
+deserialize_file(filename) = open(deserialize_payload, filename, "r")
@@ -23,7 +23,8 @@ module TestCore
         # AzureClusterlessHPC core
         global azureclusterlesshpc_core = ["core/test_batch_controller.jl",
                         "core/test_batch_macros.jl",
-                        "core/test_batch_futures.jl"]
+                        "core/test_batch_futures.jl",
+                        "core/test_compression.jl"]
 
         # AzureClusterlessHPC python interface
         global azureclusterlesshpc_pyinterface = ["pyinterface/test_pyinterface.jl"]
@@ -197,7 +197,10 @@ filelist = []
 AzureClusterlessHPC.replace_return_with_serialization!(expr, filelist)
 linefilter!(expr)
 @test expr.args[2].head == :block
-@test expr.args[2].args[4].args[1] == :serialize
+@test expr.args[2].args[3].args[1] == :(AzureClusterlessHPC.serialize_file)
+@test expr.args[2].args[3].args[2] == filelist[1]
+@test expr.args[2].args[3].args[3] == :out1
+@test expr.args[2].args[4].args[2] == filelist[2]
 
 
 # Replace "return" for given function name
@@ -218,7 +221,27 @@ linefilter!(expr)
 @test length(filelist) == 2
 @test typeof(filelist[1]) == String
 @test expr.args[2].head == :block
-@test expr.args[2].args[4].args[1] == :serialize
+@test expr.args[2].args[3].args[1] == :(AzureClusterlessHPC.serialize_file)
+@test expr.args[2].args[3].args[2] == filelist[1]
+
+# Replace "return" with filenames that start with the given prefix
+expr = :(
+    function hello_world(arg1, arg2; kwargs...)
+        out1 = arg1 + arg2
+        out2 = arg1 - arg2
+        return out1, out2
+    end
+)
+filelist = []
+AzureClusterlessHPC.find_function_in_ast_and_replace_return!(expr, fname, filelist; prefix="task_1_")
+linefilter!(expr)
+
+@test length(filelist) == 2
+@test all(startswith.(filelist, "task_1_"))
+@test length(filelist[1]) == length("task_1_") + 12
+@test expr.args[2].args[3].args[1] == :(AzureClusterlessHPC.serialize_file)
+@test expr.args[2].args[3].args[2] == filelist[1]
+@test expr.args[2].args[4].args[2] == filelist[2]
 
 
 #######################################################################################################################
@@ -0,0 +1,52 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+try
+    AzureClusterlessHPC == Main.TestCore.AzureClusterlessHPC
+catch
+    using AzureClusterlessHPC, PyCall, Test, SyntaxTree, Random, Serialization
+end
+
+###################################################################################################
+# Payload compression
+
+A = repeat(Float32[1, 2, 3, 4], 64 * 1024)
+expr = :(x = sum($A))
+
+# Compressed round trip (codec detected from the frame header)
+for (compression, magic) in [("zstd", AzureClusterlessHPC.ZSTD_MAGIC), ("lz4", AzureClusterlessHPC.LZ4_MAGIC)]
+    bytes, codec = AzureClusterlessHPC.serialize_payload(A; compression=compression, level=0, min_size=0)
+    @test codec == compression
+    @test bytes[1:4] == magic
+    @test length(bytes) < sizeof(A)
+    @test AzureClusterlessHPC.deserialize_payload(bytes) == A
+
+    bytes, codec = AzureClusterlessHPC.serialize_payload(expr; compression=compression, level=1, min_size=0)
+    @test codec == compression
+    @test AzureClusterlessHPC.deserialize_payload(bytes) == expr
+end
+
+# Payloads below the minimum size are serialized without compression
+for compression in ["zstd", "lz4"]
+    bytes, codec = AzureClusterlessHPC.serialize_payload(A; compression=compression, level=0, 
+        min_size=Base.summarysize(A) + 1)
+    @test isnothing(codec)
+    _iostream = IOBuffer()
+    serialize(_iostream, A)
+    @test bytes == take!(_iostream)
+    @test AzureClusterlessHPC.deserialize_payload(bytes) == A
+end
+
+# Disabled compression and files
+bytes, codec = AzureClusterlessHPC.serialize_payload(A; compression="none", level=0, min_size=0)
+@test isnothing(codec)
+@test AzureClusterlessHPC.deserialize_payload(bytes) == A
+
+filename = tempname()
+@test AzureClusterlessHPC.serialize_file(filename, A; compression="zstd", level=0, min_size=0) == "zstd"
+@test AzureClusterlessHPC.deserialize_file(filename) == A
+rm(filename)
+
+@test_throws ArgumentError AzureClusterlessHPC.serialize_payload(A; compression="gzip", level=0, min_size=0)
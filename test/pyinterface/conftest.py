@@ -0,0 +1,74 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+# Tests of the Python interface run against the local stand-in of the Batch, Blob and Queue services (see
+# azureclusterlesshpc_local). Every test gets its own service, so task states and call counts are not shared.
+
+import os, sys, uuid
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'src', 'pyinterface'))
+import azureclusterlesshpc
+import azureclusterlesshpc_local
+
+
+class LocalSetup(object):
+
+    def __init__(self, clients, service, credentials):
+        self.clients = clients
+        self.service = service
+        self.credentials = credentials
+        self.batch_client = clients['batch_client']
+        self.blob_client = clients['blob_client']
+        self.queue_client = clients['queue_client']
+
+
+# Factory of local services: local_service(pool_id=..., job_ids=..., container_name=..., **options) creates the
+# clients, pool, jobs and container on a new service. Options of the service are applied after the setup.
+@pytest.fixture
+def local_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(azureclusterlesshpc, 'UPLOAD_CACHE_PATH', str(tmp_path / 'upload_cache.sqlite'))
+    monkeypatch.setattr(azureclusterlesshpc, '_upload_cache', None)
+    azureclusterlesshpc.configure_speculation(None)
+
+    def create(pool_id='TestPool', job_ids=('TestJob',), container_name='test', num_nodes=1, **options):
+        options = dict(options, name='test-{}'.format(uuid.uuid4().hex[:8]))
+        setup_options = dict(options, throttle_rate=0.0, add_error_rate=0.0)
+        credentials = {'_LOCAL_SERVICE': setup_options, '_STORAGE_ACCOUNT_NAME': 'test'}
+        clients = azureclusterlesshpc.create_clients(credentials, batch=True, blob=True, queue=True)
+        service = azureclusterlesshpc_local.get_local_service(setup_options)
+        if container_name is not None:
+            azureclusterlesshpc.create_blob_containers(clients['blob_client'], [container_name])
+        if pool_id is not None:
+            azureclusterlesshpc.create_pool(clients['batch_client'], pool_id, 'Standard_E2s_v3', num_nodes,
+                'canonical', 'ubuntuserver', '18.04')
+            for job_id in job_ids:
+                azureclusterlesshpc.create_batch_job(clients['batch_client'], job_id, pool_id, verbose=False)
+        service.options.update(options)
+        service.reset_stats()
+        return LocalSetup(clients, service, credentials)
+
+    yield create
+    azureclusterlesshpc.configure_speculation(None)
+    azureclusterlesshpc.clear_task_state_trackers()
+    azureclusterlesshpc_local.clear_local_services()
+
+
+# Fast polling for tests (the defaults poll at most every 30 s)
+@pytest.fixture
+def polling_policy():
+    return azureclusterlesshpc.PollingPolicy(min_interval=0.01, max_interval=0.05)
+
+
+def create_tasks(clients, num_tasks, container_name='test', prefix='task'):
+    builder = azureclusterlesshpc.create_output_file_builder(clients['blob_client'], 'test', container_name)
+    tasks = []
+    for i in range(num_tasks):
+        taskname = '{}_{}'.format(prefix, i)
+        tasks.append(azureclusterlesshpc.create_batch_task(
+            application_cmd='/bin/bash -c "julia application-cmd"',
+            output_files=builder.output_file_pattern('{}_'.format(taskname)),
+            taskname=taskname))
+    return tasks
@@ -0,0 +1,34 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import azureclusterlesshpc_aio
+from conftest import create_tasks
+
+
+def test_wait_for_all_sync(local_service, polling_policy):
+    succeeding = local_service(task_runtime=0.05)
+    failing = local_service(task_runtime=0.05, task_failure_rate=1.0)
+    for setup in (succeeding, failing):
+        azureclusterlesshpc_aio.submit_tasks_sync(setup.batch_client, 'TestJob', create_tasks(setup.clients, 3),
+            verbose=False)
+
+    progress = {}
+    result = azureclusterlesshpc_aio.wait_for_all_sync([succeeding.batch_client, failing.batch_client],
+        ['TestJob', 'TestJob'], fetch_timeout=1, verbose=False, polling_policy=polling_policy,
+        progress_callback=lambda job_id, counts: progress.setdefault(job_id, []).append(counts))
+
+    # One result per job (a tuple, not a list), in the order of the jobs
+    assert isinstance(result, tuple) and len(result) == 2
+    assert result[0] is True
+    assert sorted(result[1]) == ['task_0', 'task_1', 'task_2']
+    assert progress['TestJob'][-1]['active'] + progress['TestJob'][-1]['running'] == 0
+
+
+def test_wait_for_all_sync_timeout(local_service, polling_policy):
+    setup = local_service(schedule_delay=3600.0)
+    azureclusterlesshpc_aio.submit_tasks_sync(setup.batch_client, 'TestJob', create_tasks(setup.clients, 2),
+        verbose=False)
+    assert azureclusterlesshpc_aio.wait_for_all_sync([setup.batch_client], ['TestJob'], fetch_timeout=0.005,
+        verbose=False, polling_policy=polling_policy) == (False,)
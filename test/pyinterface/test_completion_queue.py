@@ -0,0 +1,109 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import base64, json, time
+import azureclusterlesshpc
+
+
+def post(setup, queue_name, task_id, exit_code=0, outputs=()):
+    message = {'job_id': 'TestJob', 'task_id': task_id, 'exit_code': exit_code, 'runtime': 1.0,
+        'outputs': list(outputs)}
+    setup.queue_client.put_message(queue_name, base64.b64encode(json.dumps(message).encode('utf-8')).decode('utf-8'))
+
+
+def queued(setup, queue_name):
+    return len(setup.service.queues['test'][queue_name])
+
+
+def create_completion_queue(setup, **kwargs):
+    queue_name = azureclusterlesshpc.completion_queue_name('TestJob')
+    azureclusterlesshpc.create_completion_queue(setup.queue_client, queue_name)
+    return queue_name, azureclusterlesshpc.CompletionQueue(setup.queue_client, queue_name,
+        blob_client=setup.blob_client, container_name='test', **kwargs)
+
+
+def test_messages_are_deleted_once_consumed(local_service):
+    setup = local_service(pool_id=None)
+    queue_name, completion_queue = create_completion_queue(setup, interval=0.05)
+    post(setup, queue_name, 'task_0', outputs=['task_0_out'])
+    post(setup, queue_name, 'task_1', exit_code=1, outputs=['task_1_out'])
+
+    # Failures are not held back, the message of the held notification stays in the queue
+    notifications, position = completion_queue.receive()
+    assert [notification['task_id'] for notification in notifications] == ['task_1'] and position == 1
+    assert list(completion_queue.held) and queued(setup, queue_name) == 2
+
+    # Held notifications are checked with backoff, not on every receive
+    setup.service.reset_stats()
+    for _ in range(5):
+        assert completion_queue.receive(position) == ([], 1)
+    assert setup.service.stats()['calls'].get('blob.exists', 0) <= 1
+
+    # Once the output exists, the notification follows at the next position
+    setup.blob_client.create_blob_from_bytes('test', 'task_0_out', b'output')
+    time.sleep(0.2)
+    notifications, position = completion_queue.receive(position)
+    assert [notification['task_id'] for notification in notifications] == ['task_0'] and position == 2
+    assert not completion_queue.existing
+
+    # Only consumed messages are deleted, and only once
+    completion_queue.consume(1)
+    assert queued(setup, queue_name) == 1
+    completion_queue.consume(2)
+    completion_queue.consume(2)
+    assert queued(setup, queue_name) == 0
+    assert [notification['task_id'] for notification in completion_queue.receive()[0]] == ['task_1', 'task_0']
+
+
+def test_released_and_excess_notifications_are_dropped(local_service):
+    setup = local_service(pool_id=None)
+    queue_name, completion_queue = create_completion_queue(setup, max_notifications=3)
+    for i in range(5):
+        post(setup, queue_name, 'task_{}'.format(i), exit_code=1)
+    post(setup, queue_name, 'task_5', outputs=['task_5_out'])
+
+    # The oldest notifications beyond max_notifications are dropped with their messages
+    notifications, position = completion_queue.receive()
+    assert [notification['task_id'] for notification in notifications] == ['task_2', 'task_3', 'task_4']
+    assert position == 5 and queued(setup, queue_name) == 4
+
+    # Released tasks are dropped (held or not), later positions stay valid
+    completion_queue.release({'task_3', 'task_5'})
+    assert not completion_queue.held and queued(setup, queue_name) == 2
+    assert [notification['task_id'] for notification in completion_queue.receive(4)[0]] == ['task_4']
+
+
+def test_messages_visible_again_are_not_duplicated(local_service):
+    setup = local_service(pool_id=None)
+    queue_name, completion_queue = create_completion_queue(setup, visibility_timeout=0)
+    post(setup, queue_name, 'task_0', exit_code=1)
+
+    for _ in range(3):
+        notifications, position = completion_queue.receive()
+        assert len(notifications) == 1 and position == 1
+
+    # The message is deleted with its latest pop receipt
+    completion_queue.consume(1)
+    assert queued(setup, queue_name) == 0
+
+
+def test_tracker_consumes_notifications(local_service):
+    setup = local_service(task_runtime=0.05)
+    queue_name = azureclusterlesshpc.completion_queue_name('TestJob')
+    queue_url = azureclusterlesshpc.create_completion_queue(setup.queue_client, queue_name)
+    completion_queue = azureclusterlesshpc.enable_completion_notifications(setup.batch_client, 'TestJob',
+        setup.queue_client, queue_name, interval=0.01, safety_interval=3600.0)
+    envs = azureclusterlesshpc.create_completion_envs(queue_url, [])
+    task = azureclusterlesshpc.create_batch_task(application_cmd='/bin/bash -c "julia application-cmd"',
+        taskname='task_0', environment_variables=envs)
+    azureclusterlesshpc.submit_tasks(setup.batch_client, 'TestJob', [task], verbose=False)
+
+    tracker = azureclusterlesshpc.get_task_state_tracker(setup.batch_client, 'TestJob')
+    expiration = time.time() + 10.0
+    while not tracker.completed and time.time() < expiration:
+        tracker.poll()
+        time.sleep(0.02)
+    assert list(tracker.completed) == ['task_0']
+    assert tracker.notification_position == 1 and queued(setup, queue_name) == 0
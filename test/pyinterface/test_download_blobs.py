@@ -0,0 +1,64 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import os
+import pytest
+import azureclusterlesshpc
+
+
+# Blob client that overwrites a blob once its first chunk was read
+class ModifyingBlobClient(object):
+
+    def __init__(self, blob_client, blob_name):
+        self.blob_client = blob_client
+        self.blob_name = blob_name
+
+    def get_blob_to_bytes(self, container_name, blob_name, **kwargs):
+        blob = self.blob_client.get_blob_to_bytes(container_name, blob_name, **kwargs)
+        if blob_name == self.blob_name:
+            self.blob_client.create_blob_from_bytes(container_name, blob_name, b'modified' * 4)
+        return blob
+
+    def __getattr__(self, name):
+        return getattr(self.blob_client, name)
+
+
+def test_ranged_reads(local_service, tmp_path):
+    setup = local_service(pool_id=None)
+    contents = {'empty': b'', 'small': b'abc', 'large': bytes(range(26))}
+    for blob_name, content in contents.items():
+        setup.blob_client.create_blob_from_bytes('test', blob_name, content)
+    blob_names = list(contents)
+
+    # The first chunk returns the size, the remaining chunks are read with ranged reads
+    results = azureclusterlesshpc.download_blobs(setup.blob_client, 'test', blob_names, chunk_size=4)
+    assert [bytes(result) for result in results] == list(contents.values())
+    calls = setup.service.stats()['calls']
+    assert calls['blob.get_blob_to_stream'] == 6
+
+    # Into files of a directory and into given buffers
+    results = azureclusterlesshpc.download_blobs(setup.blob_client, 'test', blob_names, into=str(tmp_path),
+        chunk_size=4)
+    assert results == [str(tmp_path / blob_name) for blob_name in blob_names]
+    assert [open(result, 'rb').read() for result in results] == list(contents.values())
+    buffers = [bytearray(len(content) + 2) for content in contents.values()]
+    results = azureclusterlesshpc.download_blobs(setup.blob_client, 'test', blob_names, into=buffers, chunk_size=4)
+    assert [bytes(result) for result in results] == list(contents.values())
+    assert bytes(buffers[2][:26]) == contents['large']
+
+
+def test_modified_blob_is_discarded(local_service, tmp_path):
+    setup = local_service(pool_id=None)
+    setup.blob_client.create_blob_from_bytes('test', 'changing', bytes(range(26)))
+    setup.blob_client.create_blob_from_bytes('test', 'stable', bytes(range(26)))
+    blob_client = ModifyingBlobClient(setup.blob_client, 'changing')
+
+    # Ranged reads of the modified blob fail the etag check: the blob is reported as missing (and not deleted)
+    with pytest.warns(UserWarning, match='Could not download blob changing'):
+        results = azureclusterlesshpc.download_blobs(blob_client, 'test', ['changing', 'stable'], chunk_size=4,
+            into=str(tmp_path), delete=True)
+    assert results == [None, str(tmp_path / 'stable')]
+    assert not os.path.exists(str(tmp_path / 'changing'))
+    assert setup.blob_client.exists('test', 'changing') and not setup.blob_client.exists('test', 'stable')
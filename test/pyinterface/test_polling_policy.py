@@ -0,0 +1,76 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import asyncio, datetime, time
+import azure.batch.models as batchmodels
+import pytest
+import azureclusterlesshpc
+from azureclusterlesshpc_local import batch_error
+
+
+class Throttled(object):
+
+    def __init__(self, failures, status_code=429, retry_after=0.0):
+        self.failures = failures
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise batch_error(self.status_code, 'TooManyRequests', 'The server is busy.', retry_after=self.retry_after)
+        return value
+
+
+def test_throttled_calls_are_retried(polling_policy):
+    func = Throttled(3)
+    assert polling_policy.call(func, 'result') == 'result'
+    assert func.calls == 4
+
+
+def test_retries_are_limited(polling_policy):
+    polling_policy.max_retries = 2
+    func = Throttled(10)
+    with pytest.raises(batchmodels.BatchErrorException):
+        polling_policy.call(func, 'result')
+    assert func.calls == 3
+
+    # Other errors are not retried
+    func = Throttled(1, status_code=404)
+    with pytest.raises(batchmodels.BatchErrorException):
+        polling_policy.call(func, 'result')
+    assert func.calls == 1
+
+
+def test_retries_end_at_deadline(polling_policy):
+    polling_policy.max_retries = None
+    func = Throttled(10, retry_after=0.05)
+    deadline = datetime.datetime.now() + datetime.timedelta(seconds=0.12)
+    with pytest.raises(batchmodels.BatchErrorException):
+        polling_policy.call_until(deadline, func, 'result')
+    assert 2 <= func.calls <= 3
+    assert datetime.datetime.now() < deadline + datetime.timedelta(seconds=0.05)
+
+
+def test_async_calls_honour_retry_limit(polling_policy):
+    polling_policy.max_retries = 1
+    func = Throttled(1)
+    assert asyncio.run(azureclusterlesshpc.aio.call(func, 'result', polling_policy=polling_policy)) == 'result'
+    func = Throttled(2)
+    with pytest.raises(batchmodels.BatchErrorException):
+        asyncio.run(azureclusterlesshpc.aio.call(func, 'result', polling_policy=polling_policy))
+    assert func.calls == 2
+
+
+def test_wait_honours_timeout_of_throttled_service(local_service, polling_policy):
+    setup = local_service(throttle_rate=1.0, retry_after=0.1)
+    polling_policy.max_retries = None
+    tstart = time.time()
+    with pytest.raises(batchmodels.BatchErrorException):
+        azureclusterlesshpc.wait_for_tasks_to_complete(setup.batch_client, 'TestJob', fetch_timeout=0.01,
+            verbose=False, polling_policy=polling_policy)
+    assert time.time() - tstart < 0.6 + 0.2
+    assert setup.service.stats()['throttled']['task.list'] > 1
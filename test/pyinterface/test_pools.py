@@ -0,0 +1,51 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import azureclusterlesshpc
+
+
+def pool_configuration(setup, pool_id):
+    return setup.service.pools[pool_id]['parameter'].virtual_machine_configuration
+
+
+def test_node_agent_sku_of_custom_images(local_service):
+    setup = local_service(pool_id=None)
+    image = '/subscriptions/sub/resourceGroups/group/providers/Microsoft.Compute/images/custom'
+
+    # Explicit node agent sku: no lookup of the supported images
+    azureclusterlesshpc.create_pool(setup.batch_client, 'ExplicitPool', 'Standard_E2s_v3', 1, 'canonical',
+        '0001-com-ubuntu-server-focal', '20_04', image_resource_id=image, node_agent_sku_id='batch.node.ubuntu 20.04')
+    assert 'account.list_supported_images' not in setup.service.stats()['calls']
+    configuration = pool_configuration(setup, 'ExplicitPool')
+    assert configuration.node_agent_sku_id == 'batch.node.ubuntu 20.04'
+    assert configuration.image_reference.virtual_machine_image_id == image
+
+    # Without it, the sku of the OS parameters is looked up (once)
+    for pool_id in ['LookupPool1', 'LookupPool2']:
+        azureclusterlesshpc.create_pool(setup.batch_client, pool_id, 'Standard_E2s_v3', 1, 'canonical',
+            '0001-com-ubuntu-server-focal', '20_04', image_resource_id=image)
+        configuration = pool_configuration(setup, pool_id)
+        assert configuration.node_agent_sku_id == 'batch.node.ubuntu 20.04'
+        assert configuration.image_reference.virtual_machine_image_id == image
+    assert setup.service.stats()['calls']['account.list_supported_images'] == 1
+
+
+def test_create_pools_and_wait_for_ready_and_timed_out_pools(local_service, polling_policy):
+    ready = local_service(pool_id=None)
+    slow = local_service(pool_id=None, allocation_time=3600.0)
+    specs = [dict(clients=setup.clients, pool_id=pool_id, pool_vm_size='Standard_E2s_v3', pool_node_count=2,
+        node_os_publisher='canonical', node_os_offer='ubuntuserver', node_os_sku='18.04')
+        for (setup, pool_id) in [(ready, 'ReadyPool'), (slow, 'SlowPool')]]
+
+    assert azureclusterlesshpc.create_pools(specs) == ['created', 'created']
+    assert azureclusterlesshpc.create_pools(specs[:1]) == ['exists']
+
+    # The ready pool is not polled anymore once it is ready, the other one until the timeout
+    status = azureclusterlesshpc.wait_for_pools_ready([ready.batch_client, slow.batch_client],
+        ['ReadyPool', 'SlowPool'], min_idle_nodes=2, timeout=0.005, verbose=False, polling_policy=polling_policy)
+    assert status['ReadyPool'] == {'allocation_state': 'steady', 'nodes': 2, 'ready': 2, 'start_task_failed': 0}
+    assert status['SlowPool'] == {'allocation_state': 'resizing', 'nodes': 2, 'ready': 0, 'start_task_failed': 0}
+    assert ready.service.stats()['calls']['pool.get'] == 1
+    assert slow.service.stats()['calls']['pool.get'] > 1
@@ -0,0 +1,58 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import datetime, time
+import azure.storage.blob as azureblob
+import azureclusterlesshpc
+
+
+# Blob client that counts the generated SAS tokens
+class CountingBlobClient(object):
+
+    def __init__(self, blob_client):
+        self.blob_client = blob_client
+        self.generated = 0
+
+    def generate_container_shared_access_signature(self, *args, **kwargs):
+        self.generated += 1
+        return self.blob_client.generate_container_shared_access_signature(*args, **kwargs)
+
+    def generate_blob_shared_access_signature(self, *args, **kwargs):
+        self.generated += 1
+        return self.blob_client.generate_blob_shared_access_signature(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.blob_client, name)
+
+
+def test_tokens_are_regenerated_before_expiry(local_service):
+    setup = local_service(pool_id=None)
+    blob_client = CountingBlobClient(setup.blob_client)
+    sas_cache = azureclusterlesshpc.SasCache(ttl=datetime.timedelta(seconds=2.0),
+        refresh_margin=datetime.timedelta(seconds=1.5))
+    read = azureblob.BlobPermissions.READ
+
+    # Tokens are cached per container, blob and permission
+    token = sas_cache.get(blob_client, 'test', None, read)
+    assert sas_cache.get(blob_client, 'test', None, read) == token
+    sas_cache.get(blob_client, 'test', 'blob', read)
+    sas_cache.get(blob_client, 'test', None, azureblob.BlobPermissions.WRITE)
+    assert blob_client.generated == 3
+
+    # ... until they expire within the refresh margin
+    time.sleep(0.6)
+    sas_cache.get(blob_client, 'test', None, read)
+    assert blob_client.generated == 4
+
+    sas_cache.clear()
+    sas_cache.get(blob_client, 'test', None, read)
+    assert blob_client.generated == 5
+
+
+def test_container_sas_url_grants_write(local_service, monkeypatch):
+    setup = local_service(pool_id=None)
+    monkeypatch.setattr(azureclusterlesshpc, '_sas_cache', azureclusterlesshpc.SasCache())
+    url = azureclusterlesshpc.get_container_sas_url(setup.blob_client, 'test', 'test', azureblob.BlobPermissions.READ)
+    assert url.startswith('https://test.blob.core.windows.net/test?') and 'sp=w&' in url
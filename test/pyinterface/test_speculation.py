@@ -0,0 +1,101 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import time
+import azure.batch.models as batchmodels
+import azureclusterlesshpc
+from conftest import create_tasks
+
+
+def test_original_task_id():
+    assert azureclusterlesshpc.original_task_id('task_1') == 'task_1'
+    assert azureclusterlesshpc.original_task_id('task_1__copy2') == 'task_1'
+    assert azureclusterlesshpc.original_task_id('task__copy1__copy12') == 'task__copy1'
+    assert azureclusterlesshpc.original_task_id('task__copyfile_1') == 'task__copyfile_1'
+    assert azureclusterlesshpc.original_task_id('task__copy') == 'task__copy'
+    assert azureclusterlesshpc.original_task_id('__copy1') == '__copy1'
+
+
+def test_straggler_threshold():
+    policy = azureclusterlesshpc.SpeculationPolicy(multiple=2.0, percentile=0.5, min_samples=3)
+    assert policy.threshold([1.0, 2.0]) is None
+    assert policy.threshold([1.0, 2.0, 3.0, 4.0]) == 6.0
+
+
+# Complete short tasks (to collect runtimes) and start a straggler that runs for an hour
+def start_straggler(setup, polling_policy):
+    azureclusterlesshpc.submit_tasks(setup.batch_client, 'TestJob', create_tasks(setup.clients, 4), verbose=False)
+    assert azureclusterlesshpc.wait_for_tasks_to_complete(setup.batch_client, 'TestJob', fetch_timeout=1,
+        verbose=False, polling_policy=polling_policy, speculation=False) is True
+    setup.service.options['task_runtime'] = 3600.0
+    azureclusterlesshpc.submit_tasks(setup.batch_client, 'TestJob', create_tasks(setup.clients, 1, prefix='slow'),
+        verbose=False)
+    with setup.service.lock:
+        setup.service.advance()
+    setup.service.options['task_runtime'] = 0.05     # copies are fast
+    time.sleep(0.2)
+
+
+def test_copies_of_stragglers_are_submitted(local_service, polling_policy):
+    setup = local_service(task_runtime=0.05, num_nodes=2)
+    policy = azureclusterlesshpc.configure_speculation(multiple=2.0, min_samples=3)
+    start_straggler(setup, polling_policy)
+
+    tracker = azureclusterlesshpc.get_task_state_tracker(setup.batch_client, 'TestJob')
+    tracker.poll()
+    assert set(tracker.running) == {'slow_0'}
+    assert tracker.speculate(policy, verbose=False) == ['slow_0__copy1']
+    assert 'slow_0__copy1' in setup.service.jobs['TestJob']['tasks']
+
+    # At most max_copies copies per task
+    assert tracker.speculate(policy, verbose=False) == []
+
+
+def test_no_copies_without_idle_nodes_or_definitions(local_service, polling_policy):
+    setup = local_service(task_runtime=0.05, num_nodes=1)
+    policy = azureclusterlesshpc.configure_speculation(multiple=2.0, min_samples=3)
+    start_straggler(setup, polling_policy)
+    tracker = azureclusterlesshpc.get_task_state_tracker(setup.batch_client, 'TestJob')
+    tracker.poll()
+    assert tracker.speculate(policy, verbose=False) == []
+
+    # Tasks submitted without a policy are not registered
+    azureclusterlesshpc.clear_task_state_trackers()
+    tracker = azureclusterlesshpc.get_task_state_tracker(setup.batch_client, 'TestJob')
+    tracker.poll()
+    assert tracker.speculate(azureclusterlesshpc.SpeculationPolicy(multiple=2.0, min_samples=3, idle_only=False),
+        verbose=False) == []
+
+
+def test_single_task_wait_completes_with_copy(local_service, polling_policy):
+    setup = local_service(task_runtime=0.05, num_nodes=2)
+    azureclusterlesshpc.configure_speculation(multiple=2.0, min_samples=3)
+    start_straggler(setup, polling_policy)
+
+    tstart = time.time()
+    assert azureclusterlesshpc.wait_for_task_to_complete(setup.batch_client, 'TestJob', 'slow_0', 1, verbose=False,
+        polling_policy=polling_policy) is True
+    assert time.time() - tstart < 5.0
+
+    # The original task is terminated once the copy has won
+    tracker = azureclusterlesshpc.get_task_state_tracker(setup.batch_client, 'TestJob')
+    tracker.poll()
+    tracker.terminate_losers()
+    tasks = setup.service.jobs['TestJob']['tasks']
+    assert tasks['slow_0__copy1']['result'] == batchmodels.TaskExecutionResult.success
+    assert tasks['slow_0']['state'] == batchmodels.TaskState.completed
+    assert tasks['slow_0']['failure'][0] == 'TaskEnded'
+
+
+def test_job_wait_reports_copies_under_original(local_service, polling_policy):
+    setup = local_service(task_runtime=0.05, num_nodes=2)
+    azureclusterlesshpc.configure_speculation(multiple=2.0, min_samples=3)
+    start_straggler(setup, polling_policy)
+
+    counts = []
+    assert azureclusterlesshpc.wait_for_tasks_to_complete(setup.batch_client, 'TestJob', fetch_timeout=1,
+        verbose=False, polling_policy=polling_policy, progress_callback=lambda job_id, c: counts.append(c)) is True
+    assert counts[-1] == {'active': 0, 'running': 0, 'completed': 5, 'failed': 0}
+    assert 'slow_0__copy1' in setup.service.jobs['TestJob']['tasks']
@@ -0,0 +1,38 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import azureclusterlesshpc_stats
+
+
+def test_only_service_calls_are_instrumented(local_service):
+    setup = local_service(pool_id=None)
+    metrics = azureclusterlesshpc_stats.Metrics()
+    blob_client = azureclusterlesshpc_stats.InstrumentedClient(
+        azureclusterlesshpc_stats.unwrap_client(setup.blob_client), 'blob', metrics=metrics)
+
+    # URLs and shared access signatures are built locally
+    blob_client.make_blob_url('test', 'input.bin')
+    blob_client.make_container_url('test')
+    blob_client.generate_blob_shared_access_signature('test', 'input.bin', permission='r', expiry='2030-01-01')
+    blob_client.generate_container_shared_access_signature('test', permission='w', expiry='2030-01-01')
+    assert metrics.get_stats()['operations'] == {}
+
+    blob_client.create_blob_from_bytes('test', 'input.bin', b'payload')
+    blob_client.get_blob_to_bytes('test', 'input.bin')
+    operations = metrics.get_stats()['operations']
+    assert sorted(operations) == ['blob.create_blob_from_bytes', 'blob.get_blob_to_bytes']
+    assert operations['blob.create_blob_from_bytes']['bytes_sent'] == 7
+    assert operations['blob.get_blob_to_bytes']['bytes_received'] == 7
+
+
+def test_batch_operations_are_named_after_their_group(local_service):
+    setup = local_service()
+    metrics = azureclusterlesshpc_stats.Metrics()
+    batch_client = azureclusterlesshpc_stats.InstrumentedClient(
+        azureclusterlesshpc_stats.unwrap_client(setup.batch_client), None, metrics=metrics)
+    list(batch_client.task.list('TestJob'))
+    batch_client.job.get('TestJob')
+    assert sorted(metrics.get_stats()['operations']) == ['job.get', 'task.list']
+    assert metrics.get_stats()['total']['calls'] == 2
@@ -0,0 +1,65 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import json
+import azure.batch.models as batchmodels
+import azureclusterlesshpc
+import azureclusterlesshpc_local
+from conftest import create_tasks
+
+
+def task_size(task):
+    return len(json.dumps(task.serialize()))
+
+
+def test_chunks_by_number_and_size(local_service):
+    setup = local_service(pool_id=None)
+    tasks = create_tasks(setup.clients, 250)
+
+    chunks = azureclusterlesshpc.split_tasks_into_chunks(tasks)
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+    # Chunks stay below the size limit and keep the order of the tasks
+    max_size = 5 * task_size(tasks[0])
+    chunks = azureclusterlesshpc.split_tasks_into_chunks(tasks, max_size=max_size)
+    assert all(sum(task_size(task) for task in chunk) <= max_size for chunk in chunks)
+    assert all(len(chunk) >= 4 for chunk in chunks)
+    assert [task.id for chunk in chunks for task in chunk] == [task.id for task in tasks]
+
+    # A task larger than the limit gets a chunk of its own
+    chunks = azureclusterlesshpc.split_tasks_into_chunks(tasks[:3], max_size=1)
+    assert [len(chunk) for chunk in chunks] == [1, 1, 1]
+
+
+def test_too_large_collection_is_split(local_service, monkeypatch):
+    setup = local_service()
+    tasks = create_tasks(setup.clients, 10)
+    monkeypatch.setattr(azureclusterlesshpc_local, 'MAX_COLLECTION_SIZE', 3 * task_size(tasks[0]))
+
+    report = azureclusterlesshpc.add_task_collection(setup.batch_client, 'TestJob', tasks, {})
+    assert sorted(report) == sorted(task.id for task in tasks)
+    assert all(task_report['status'] == 'success' for task_report in report.values())
+    assert sorted(setup.service.jobs['TestJob']['tasks']) == sorted(task.id for task in tasks)
+    # 10 -> 5 + 5 -> 2 + 3 + 2 + 3 -> 1 + 2 + 1 + 2 (rejected calls included)
+    assert setup.service.stats()['calls']['task.add_collection'] == 11
+
+
+def test_server_errors_are_retried(local_service):
+    setup = local_service(add_error_rate=0.5, seed=1)
+    tasks = create_tasks(setup.clients, 20)
+
+    report = azureclusterlesshpc.submit_tasks(setup.batch_client, 'TestJob', tasks, verbose=False)
+    assert all(task_report['status'] == 'success' for task_report in report.values())
+    assert any(task_report['attempts'] > 1 for task_report in report.values())
+    assert len(setup.service.jobs['TestJob']['tasks']) == 20
+
+    # Without retries, the failed tasks are reported (and not added)
+    tasks = create_tasks(setup.clients, 20, prefix='other')
+    report = azureclusterlesshpc.submit_tasks(setup.batch_client, 'TestJob', tasks, num_retries=0, verbose=False)
+    failed = [task_id for task_id, task_report in report.items()
+        if task_report['status'] == batchmodels.TaskAddStatus.server_error.value]
+    assert 0 < len(failed) < 20
+    assert all(report[task_id]['error'] == 'ServerBusy' and report[task_id]['attempts'] == 1 for task_id in failed)
+    assert not set(failed) & set(setup.service.jobs['TestJob']['tasks'])
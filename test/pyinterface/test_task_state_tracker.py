@@ -0,0 +1,130 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import datetime, time
+import azure.batch.models as batchmodels
+import azureclusterlesshpc
+from conftest import create_tasks
+
+
+def poll_until(tracker, condition, timeout=10.0):
+    changed = []
+    expiration = time.time() + timeout
+    while time.time() < expiration:
+        changed += tracker.poll()
+        if condition(tracker.counts()):
+            return changed
+        time.sleep(0.02)
+    raise AssertionError('Tracker did not reach the expected state: {}'.format(tracker.counts()))
+
+
+# Move a task of the stand-in to a new state with the given transition time (outside of the simulated schedule)
+def set_task_state(service, job_id, task_id, state, transition_time):
+    with service.lock:
+        task = service.jobs[job_id]['tasks'][task_id]
+        service.drop_running(job_id, task_id)
+        task['generation'] += 1
+        task.update(state=state, state_transition_time=transition_time)
+        if state == batchmodels.TaskState.completed:
+            task.update(start_time=transition_time, end_time=transition_time, exit_code=0,
+                result=batchmodels.TaskExecutionResult.success)
+
+
+def test_incremental_state_transitions(local_service):
+    setup = local_service(task_runtime=0.2, schedule_delay=0.1)
+    azureclusterlesshpc.submit_tasks(setup.batch_client, 'TestJob', create_tasks(setup.clients, 4), verbose=False)
+    tracker = azureclusterlesshpc.TaskStateTracker(setup.batch_client, 'TestJob', all_states=True)
+
+    # First poll lists all tasks (no high water mark yet)
+    assert tracker.list_options().filter is None
+    changed = tracker.poll()
+    assert sorted(task.id for task in changed) == ['task_{}'.format(i) for i in range(4)]
+    assert tracker.counts() == {'active': 4, 'running': 0, 'completed': 0, 'failed': 0}
+
+    # Tasks go through running to completed and each transition is reported once
+    changed = poll_until(tracker, lambda counts: counts['completed'] == 4)
+    completed = [task.id for task in changed if task.state == batchmodels.TaskState.completed]
+    assert sorted(completed) == ['task_{}'.format(i) for i in range(4)]
+    assert tracker.poll() == []
+    assert len(tracker.durations) == 4
+    assert tracker.failed() == []
+
+
+def test_listing_overlaps_by_high_water_margin(local_service):
+    setup = local_service(schedule_delay=3600.0)
+    azureclusterlesshpc.submit_tasks(setup.batch_client, 'TestJob', create_tasks(setup.clients, 3), verbose=False)
+    tracker = azureclusterlesshpc.TaskStateTracker(setup.batch_client, 'TestJob', all_states=True)
+    tracker.poll()
+    high_water = tracker.high_water
+    assert high_water is not None
+
+    # The filter starts one margin before the latest transition that was seen
+    start = high_water - tracker.high_water_margin
+    assert tracker.list_options().filter == 'stateTransitionTime ge {}'.format(
+        azureclusterlesshpc._format_odata_datetime(start))
+
+    # A transition that becomes visible late (but within the margin) is picked up, one before the margin is not
+    now = time.time()
+    set_task_state(setup.service, 'TestJob', 'task_0', batchmodels.TaskState.completed,
+        high_water.timestamp() - tracker.high_water_margin.total_seconds() / 2)
+    set_task_state(setup.service, 'TestJob', 'task_1', batchmodels.TaskState.completed,
+        high_water.timestamp() - 2 * tracker.high_water_margin.total_seconds())
+    changed = tracker.poll()
+    assert [task.id for task in changed] == ['task_0']
+    assert tracker.high_water == high_water
+    assert set(tracker.completed) == {'task_0'}
+
+    # Tasks listed again within the overlap are not reported twice
+    assert tracker.poll() == []
+
+    # Later transitions advance the high water mark
+    set_task_state(setup.service, 'TestJob', 'task_2', batchmodels.TaskState.running, now + 1.0)
+    assert [task.id for task in tracker.poll()] == ['task_2']
+    assert tracker.high_water == datetime.datetime.fromtimestamp(now + 1.0, datetime.timezone.utc)
+    assert set(tracker.running) == {'task_2'}
+
+
+def test_shared_tracker_is_reused(local_service, polling_policy):
+    setup = local_service(task_runtime=0.05)
+    azureclusterlesshpc.submit_tasks(setup.batch_client, 'TestJob', create_tasks(setup.clients, 5), verbose=False)
+
+    tracker = azureclusterlesshpc.get_task_state_tracker(setup.batch_client, 'TestJob', all_states=True)
+    assert azureclusterlesshpc.get_task_state_tracker(setup.batch_client, 'TestJob', all_states=True) is tracker
+    assert azureclusterlesshpc.get_task_state_tracker(setup.batch_client, 'OtherJob', all_states=True) is not tracker
+
+    assert azureclusterlesshpc.wait_for_tasks_to_complete(setup.batch_client, 'TestJob', fetch_timeout=1,
+        verbose=False, polling_policy=polling_policy) is True
+
+    # A second wait continues from the state of the first one: one listing of the state changes since then
+    setup.service.reset_stats()
+    assert azureclusterlesshpc.wait_for_tasks_to_complete(setup.batch_client, 'TestJob', fetch_timeout=1,
+        verbose=False, polling_policy=polling_policy) is True
+    assert setup.service.stats()['calls'] == {'task.list': 1}
+    assert tracker.list_options().filter.startswith('stateTransitionTime ge ')
+
+    # Clearing the trackers starts over
+    azureclusterlesshpc.clear_task_state_trackers('TestJob')
+    assert azureclusterlesshpc.get_task_state_tracker(setup.batch_client, 'TestJob', all_states=True) is not tracker
+
+
+def test_shared_tracker_reports_earlier_failures(local_service, polling_policy):
+    setup = local_service(task_runtime=0.05, task_failure_rate=1.0)
+    azureclusterlesshpc.submit_tasks(setup.batch_client, 'TestJob', create_tasks(setup.clients, 3), verbose=False)
+    failed = ['task_0', 'task_1', 'task_2']
+
+    result = azureclusterlesshpc.wait_for_tasks_to_complete(setup.batch_client, 'TestJob', fetch_timeout=1,
+        verbose=False, polling_policy=polling_policy)
+    assert sorted(result) == failed
+
+    # A later wait on the same job reports the same failures
+    result = azureclusterlesshpc.wait_for_tasks_to_complete(setup.batch_client, 'TestJob', fetch_timeout=1,
+        verbose=False, polling_policy=polling_policy)
+    assert sorted(result) == failed
+
+    # ... and restarts them if it allows retries
+    result = azureclusterlesshpc.wait_for_tasks_to_complete(setup.batch_client, 'TestJob', fetch_timeout=1,
+        verbose=False, num_restart=1, polling_policy=polling_policy)
+    assert sorted(result) == failed
+    assert [task['retry_count'] for task in setup.service.jobs['TestJob']['tasks'].values()] == [1, 1, 1]
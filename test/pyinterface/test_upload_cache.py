@@ -0,0 +1,89 @@
+#  ------------------------------------------------------------------------------------------
+#  Copyright (c) Microsoft Corporation. All rights reserved.
+#  Licensed under the MIT License (MIT). See LICENSE in the repo root for license information.
+#  ------------------------------------------------------------------------------------------
+
+import hashlib
+import azureclusterlesshpc
+
+
+def uploads(service):
+    calls = service.stats()['calls']
+    return sum(count for (operation, count) in calls.items() if operation.startswith('blob.create_blob_from'))
+
+
+def test_unchanged_files_are_skipped(local_service, tmp_path):
+    setup = local_service(pool_id=None)
+    path = tmp_path / 'input.bin'
+    path.write_bytes(b'x' * 1000)
+
+    azureclusterlesshpc.upload_files_to_blob(setup.blob_client, 'test', [str(path)], verbose=False)
+    azureclusterlesshpc.upload_files_to_blob(setup.blob_client, 'test', [str(path)], verbose=False)
+    assert uploads(setup.service) == 1
+    assert setup.blob_client.get_blob_properties('test', 'input.bin').metadata == \
+        {'sha256': hashlib.sha256(b'x' * 1000).hexdigest()}
+
+    # Modified files are uploaded again
+    path.write_bytes(b'y' * 1001)
+    azureclusterlesshpc.upload_files_to_blob(setup.blob_client, 'test', [str(path)], verbose=False)
+    assert uploads(setup.service) == 2
+
+
+def test_deleted_container_invalidates_cache(local_service, tmp_path):
+    setup = local_service(pool_id=None)
+    path = tmp_path / 'input.bin'
+    path.write_bytes(b'x' * 1000)
+    azureclusterlesshpc.upload_files_to_blob(setup.blob_client, 'test', [str(path)], verbose=False)
+
+    azureclusterlesshpc.delete_blob_container(setup.blob_client, 'test')
+    azureclusterlesshpc.create_blob_containers(setup.blob_client, ['test'])
+    azureclusterlesshpc.upload_files_to_blob(setup.blob_client, 'test', [str(path)], verbose=False)
+    assert uploads(setup.service) == 2
+    assert setup.blob_client.exists('test', 'input.bin')
+
+
+def test_expired_entries_are_validated(local_service, tmp_path):
+    setup = local_service(pool_id=None)
+    cache = azureclusterlesshpc.get_upload_cache(str(tmp_path / 'cache.sqlite'))
+    cache.validation_ttl = 0
+    sha256 = hashlib.sha256(b'payload').hexdigest()
+    azureclusterlesshpc.upload_bytes_to_container(setup.blob_client, 'test', 'payload.bin', b'payload', verbose=False)
+    cache.add(setup.blob_client, 'test', 'payload.bin', sha256)
+
+    # The uncached upload has no hash, so the entry does not match the blob
+    assert not cache.contains(setup.blob_client, 'test', 'payload.bin', sha256)
+    setup.blob_client.set_blob_metadata('test', 'payload.bin', metadata={'sha256': sha256})
+    cache.add(setup.blob_client, 'test', 'payload.bin', sha256)
+    assert cache.contains(setup.blob_client, 'test', 'payload.bin', sha256)
+
+    # Blobs deleted outside of the cache are detected after the validation interval
+    setup.blob_client.delete_blob('test', 'payload.bin')
+    assert not cache.contains(setup.blob_client, 'test', 'payload.bin', sha256)
+
+
+def test_bytes_uploads_are_not_cached_by_default(local_service):
+    setup = local_service(pool_id=None)
+    for _ in range(2):
+        azureclusterlesshpc.upload_bytes_to_container(setup.blob_client, 'test', 'task_1.dat', b'ast', verbose=False)
+        azureclusterlesshpc.create_batch_resource_from_bytes(setup.blob_client, 'test', 'task_2.dat', b'ast',
+            verbose=False)
+    azureclusterlesshpc.aio.upload_many_sync(setup.blob_client, 'test', [('task_3.dat', b'ast')], verbose=False)
+    assert uploads(setup.service) == 5
+    assert setup.blob_client.get_blob_properties('test', 'task_1.dat').metadata == {}
+
+    # Opt-in caching of buffers
+    for _ in range(2):
+        azureclusterlesshpc.upload_bytes_to_container(setup.blob_client, 'test', 'static.dat', b'static',
+            verbose=False, use_cache=True)
+    assert uploads(setup.service) == 6
+
+
+def test_codec_is_stored_in_metadata(local_service):
+    setup = local_service(pool_id=None)
+    azureclusterlesshpc.create_batch_resource_from_bytes(setup.blob_client, 'test', 'task_1.dat', b'\x28\xb5\x2f\xfd',
+        verbose=False, compression='zstd')
+    azureclusterlesshpc.upload_bytes_to_container(setup.blob_client, 'test', 'static.dat', b'\x04\x22\x4d\x18',
+        verbose=False, use_cache=True, compression='lz4')
+    assert setup.blob_client.get_blob_properties('test', 'task_1.dat').metadata == {'compression': 'zstd'}
+    assert setup.blob_client.get_blob_properties('test', 'static.dat').metadata == \
+        {'sha256': hashlib.sha256(b'\x04\x22\x4d\x18').hexdigest(), 'compression': 'lz4'}